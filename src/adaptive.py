@@ -0,0 +1,106 @@
+import numpy as np
+from huffman import (
+    build_code_lengths,
+    canonical_codes,
+    encode_symbols,
+    build_symbol_decoder,
+    decode_symbol_at,
+)
+
+FIRST_BLOCK_SIZE = 256
+# Small lookup tables keep the frequent codebook rebuilds cheap
+DECODE_TABLE_BITS = 11
+
+
+def block_schedule(block_size):
+    # Rebuild often while the statistics are still poor, then every block_size
+    # symbols. The encoder and the decoder follow the same schedule.
+    size = min(FIRST_BLOCK_SIZE, block_size)
+    while True:
+        yield size
+        size = min(size * 2, block_size)
+
+
+def codes_from_counts(counts):
+    return canonical_codes(build_code_lengths(dict(enumerate(counts.tolist()))))
+
+
+class AdaptiveHuffmanEncoder:
+    def __init__(self, alphabet_size=256, block_size=8192):
+        self.alphabet_size = alphabet_size
+        self.schedule = block_schedule(block_size)
+        self.remaining = next(self.schedule)
+        self.counts = np.ones(alphabet_size, dtype=np.int64)
+        self.codes = codes_from_counts(self.counts)
+        self.pending_bits = np.zeros(0, dtype=np.uint8)
+        self.nbits = 0
+
+    def encode(self, symbols):
+        symbols = np.asarray(symbols, dtype=np.int64).ravel()
+        bit_chunks = [self.pending_bits]
+        while symbols.size:
+            piece, symbols = symbols[: self.remaining], symbols[self.remaining :]
+            payload, nbits = encode_symbols(piece, self.codes)
+            bit_chunks.append(np.unpackbits(np.frombuffer(payload, np.uint8))[:nbits])
+            self.nbits += nbits
+            self.counts += np.bincount(piece, minlength=self.alphabet_size)
+            self.remaining -= piece.size
+            if self.remaining == 0:
+                self.codes = codes_from_counts(self.counts)
+                self.remaining = next(self.schedule)
+
+        # Emit every complete byte right away and keep the leftover bits
+        bits = np.concatenate(bit_chunks)
+        complete = bits.size - bits.size % 8
+        self.pending_bits = bits[complete:]
+        return np.packbits(bits[:complete]).tobytes()
+
+    def flush(self):
+        data = np.packbits(self.pending_bits).tobytes()
+        self.pending_bits = np.zeros(0, dtype=np.uint8)
+        return data, self.nbits
+
+
+class AdaptiveHuffmanDecoder:
+    def __init__(self, alphabet_size=256, block_size=8192):
+        self.alphabet_size = alphabet_size
+        self.schedule = block_schedule(block_size)
+        self.remaining = next(self.schedule)
+        self.counts = np.ones(alphabet_size, dtype=np.int64)
+        self.block = []
+        self.buffer = bytearray()
+        self.position = 0
+        self.dropped_bits = 0
+        self.set_codes(codes_from_counts(self.counts))
+
+    def set_codes(self, codes):
+        self.max_length = max(length for _, length in codes.values())
+        self.decoder = build_symbol_decoder(codes, DECODE_TABLE_BITS)
+
+    def decode(self, data, nbits=None):
+        # Without nbits only symbols whose longest possible code is already
+        # buffered are decoded; passing the total nbits drains the stream
+        self.buffer.extend(data)
+        decoded = []
+        while True:
+            if nbits is None:
+                if 8 * len(self.buffer) - self.position < self.max_length:
+                    break
+            elif self.dropped_bits + self.position >= nbits:
+                break
+            symbol, length = decode_symbol_at(self.buffer, self.position, self.decoder)
+            self.position += length
+            decoded.append(symbol)
+            self.block.append(symbol)
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.counts += np.bincount(self.block, minlength=self.alphabet_size)
+                self.set_codes(codes_from_counts(self.counts))
+                self.block = []
+                self.remaining = next(self.schedule)
+
+        consumed = self.position >> 3
+        del self.buffer[:consumed]
+        self.position -= consumed * 8
+        self.dropped_bits += consumed * 8
+        return decoded
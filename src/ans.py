@@ -0,0 +1,103 @@
+import numpy as np
+
+# 32-bit rANS state renormalized with 16-bit words, so every symbol emits or
+# reads at most one word
+STATE_LOWER_BOUND = 1 << 16
+WORD_BITS = 16
+WORD_MASK = (1 << WORD_BITS) - 1
+
+
+def scale_bits_for(alphabet_size):
+    scale_bits = 12
+    while (1 << scale_bits) < 4 * alphabet_size and scale_bits < 16:
+        scale_bits += 1
+    return scale_bits
+
+
+def normalize_frequencies(frequencies, scale_bits):
+    # Quantize the histogram so it sums to 2^scale_bits with no symbol at zero
+    symbols = sorted(frequencies)
+    counts = np.array([frequencies[s] for s in symbols], dtype=np.float64)
+    total = 1 << scale_bits
+    if len(symbols) > total:
+        raise ValueError("Alphabet too large for the rANS probability scale")
+    normalized = np.maximum(np.round(counts * total / counts.sum()), 1).astype(np.int64)
+    # Rounding up rare symbols can overshoot the total by more than the
+    # largest count can absorb, so the excess is spread over the largest ones
+    excess = int(normalized.sum()) - total
+    while excess > 0:
+        largest = np.argsort(-normalized, kind="stable")[:excess]
+        largest = largest[normalized[largest] > 1]
+        normalized[largest] -= 1
+        excess -= largest.size
+    normalized[np.argmax(normalized)] -= excess
+    return dict(zip(symbols, normalized.tolist()))
+
+
+def lane_count(count, max_lanes=1024, symbols_per_lane=1024):
+    return int(min(max(count // symbols_per_lane, 1), max_lanes))
+
+
+def build_tables(normalized):
+    symbols = np.array(sorted(normalized), dtype=np.int64)
+    freqs = np.array([normalized[s] for s in symbols], dtype=np.uint64)
+    starts = np.concatenate(([0], np.cumsum(freqs)[:-1])).astype(np.uint64)
+    return symbols, freqs, starts
+
+
+def rans_encode(symbols, normalized, scale_bits, lanes):
+    table_symbols, freqs, starts = build_tables(normalized)
+    indices = np.searchsorted(table_symbols, np.asarray(symbols).ravel())
+    steps = -(-indices.size // lanes)
+
+    # Symbol i belongs to lane i % lanes; all lanes advance in lockstep and
+    # the symbols are encoded backwards so the decoder runs forwards
+    states = np.full(lanes, STATE_LOWER_BOUND, dtype=np.uint64)
+    words = []
+    scale = np.uint64(scale_bits)
+    word_bits = np.uint64(WORD_BITS)
+    bound = np.uint64((STATE_LOWER_BOUND >> scale_bits) << WORD_BITS)
+    for step in range(steps - 1, -1, -1):
+        step_indices = indices[step * lanes : (step + 1) * lanes]
+        active = step_indices.size
+        x = states[:active]
+        f = freqs[step_indices]
+        emit = x >= bound * f
+        words.append((x[emit] & np.uint64(WORD_MASK)).astype(np.uint16))
+        x[emit] >>= word_bits
+        states[:active] = ((x // f) << scale) + (x % f) + starts[step_indices]
+
+    words.reverse()
+    stream = np.concatenate(words) if words else np.zeros(0, np.uint16)
+    return states.astype(np.uint32), stream
+
+
+def rans_decode(states, stream, normalized, scale_bits, count):
+    table_symbols, freqs, starts = build_tables(normalized)
+    slot_to_index = np.repeat(np.arange(freqs.size), freqs.astype(np.int64))
+    lanes = states.size
+    steps = -(-count // lanes)
+
+    states = states.astype(np.uint64)
+    stream = stream.astype(np.uint64)
+    decoded = np.empty(count, dtype=np.int64)
+    scale = np.uint64(scale_bits)
+    slot_mask = np.uint64((1 << scale_bits) - 1)
+    word_bits = np.uint64(WORD_BITS)
+    position = 0
+    for step in range(steps):
+        active = min(lanes, count - step * lanes)
+        x = states[:active]
+        index = slot_to_index[x & slot_mask]
+        decoded[step * lanes : step * lanes + active] = index
+        x = freqs[index] * (x >> scale) + (x & slot_mask) - starts[index]
+        # Lanes that fell below the bound read the next word, in lane order
+        need = x < np.uint64(STATE_LOWER_BOUND)
+        needed = int(need.sum())
+        x[need] = (x[need] << word_bits) | stream[position : position + needed]
+        position += needed
+        states[:active] = x
+
+    if position != stream.size:
+        raise ValueError("Decoded data does not match the expected image size")
+    return table_symbols[decoded]
@@ -0,0 +1,347 @@
+import numpy as np
+from huffman import canonical_codes, decode_symbols
+from container import add_section, write_container, read_container
+from utils import native_image
+
+ALPHABET_SIZE = 256
+BATCH_MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+# Decoding reads 56 bits per lane at a time, so no code may be longer
+MAX_CODE_LENGTH = 56
+ABSENT = np.int64(1) << 62
+
+
+def batch_native_image(image):
+    image = native_image(image)
+    if image.mode == "P":
+        return image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image
+
+
+def batch_symbols(images):
+    # Flattens a batch into one array holding every channel of every image in
+    # turn; each channel is a lane with its own codebook
+    if isinstance(images, np.ndarray):
+        if images.ndim == 3:
+            images = images[..., None]
+        if images.dtype != np.uint8 or images.shape[3] not in BATCH_MODES:
+            raise ValueError("Stacked batches are uint8 with 1 to 4 channels")
+        count, height, width, channels = images.shape
+        symbols = images.transpose(0, 3, 1, 2).reshape(-1)
+        sizes = [[width, height]] * count
+        return BATCH_MODES[channels], sizes, symbols.astype(np.int64)
+
+    if not len(images):
+        raise ValueError("A batch needs at least one image")
+    # The header holds a single mode, so images are never converted to it
+    images = [batch_native_image(image) for image in images]
+    modes = sorted({image.mode for image in images})
+    for mode in modes:
+        if mode not in BATCH_MODES.values():
+            raise ValueError(
+                f"Batches hold 8-bit L, LA, RGB or RGBA images, not {mode}"
+            )
+    if len(modes) > 1:
+        raise ValueError(
+            f"Every image of a batch must have the same mode, not {', '.join(modes)}"
+        )
+    arrays = [np.asarray(image, dtype=np.uint8) for image in images]
+    sizes = [[array.shape[1], array.shape[0]] for array in arrays]
+    symbols = np.concatenate(
+        [
+            array.reshape(array.shape[0], array.shape[1], -1).transpose(2, 0, 1).ravel()
+            for array in arrays
+        ]
+    )
+    return modes[0], sizes, symbols.astype(np.int64)
+
+
+def batch_code_lengths(histograms):
+    # Two-queue Huffman construction run on every lane at once: leaves sorted
+    # by count, merged nodes queued in the order they are made
+    lanes, alphabet = histograms.shape
+    present = histograms > 0
+    leaf_counts = present.sum(axis=1)
+    weights = np.where(present, histograms, ABSENT)
+    order = np.argsort(weights, axis=1, kind="stable")
+    leaf_weights = np.take_along_axis(weights, order, 1)
+    leaf_weights = np.hstack([leaf_weights, np.full((lanes, 1), ABSENT)])
+
+    merges = alphabet - 1
+    node_weights = np.full((lanes, merges + 1), ABSENT)
+    node_parents = np.zeros((lanes, merges), dtype=np.int64)
+    leaf_parents = np.zeros((lanes, alphabet), dtype=np.int64)
+    next_leaf = np.zeros(lanes, dtype=np.int64)
+    next_node = np.zeros(lanes, dtype=np.int64)
+
+    for step in range(int(leaf_counts.max()) - 1):
+        active = np.flatnonzero(step < leaf_counts - 1)
+        weight = np.zeros(active.size, dtype=np.int64)
+        for _ in range(2):
+            leaf = next_leaf[active]
+            node = next_node[active]
+            leaf_weight = leaf_weights[active, leaf]
+            node_weight = np.where(
+                node < step, node_weights[active, np.minimum(node, merges)], ABSENT
+            )
+            take_leaf = leaf_weight <= node_weight
+            weight += np.where(take_leaf, leaf_weight, node_weight)
+            leaf_parents[active[take_leaf], leaf[take_leaf]] = step
+            node_parents[active[~take_leaf], node[~take_leaf]] = step
+            next_leaf[active] += take_leaf
+            next_node[active] += ~take_leaf
+        node_weights[active, step] = weight
+
+    # Depths from the root (the last merge) down; parents come after children
+    depths = np.zeros((lanes, merges), dtype=np.int64)
+    for node in range(int(leaf_counts.max()) - 3, -1, -1):
+        inner = np.flatnonzero(node < leaf_counts - 2)
+        depths[inner, node] = depths[inner, node_parents[inner, node]] + 1
+
+    sorted_lengths = np.take_along_axis(depths, leaf_parents, 1) + 1
+    sorted_lengths[np.arange(alphabet)[None, :] >= leaf_counts[:, None]] = 0
+    lengths = np.zeros((lanes, alphabet), dtype=np.int64)
+    lengths[np.arange(lanes)[:, None], order] = sorted_lengths
+    return lengths
+
+
+def canonical_tables(lengths):
+    # Canonical codes of every lane, in the (length, symbol) order that
+    # canonical_codes uses, with the tables that decode them
+    lanes, alphabet = lengths.shape
+    max_length = int(lengths.max())
+    order = np.argsort(
+        np.where(lengths > 0, lengths, max_length + 1), axis=1, kind="stable"
+    )
+    counts = np.bincount(
+        (np.arange(lanes)[:, None] * (max_length + 2) + lengths).ravel(),
+        minlength=lanes * (max_length + 2),
+    ).reshape(lanes, max_length + 2)
+    counts[:, 0] = 0
+    first_codes = np.zeros((lanes, max_length + 2), dtype=np.int64)
+    for length in range(2, max_length + 2):
+        first_codes[:, length] = (
+            first_codes[:, length - 1] + counts[:, length - 1]
+        ) << 1
+    first_indices = np.cumsum(counts, axis=1) - counts
+
+    sorted_lengths = np.take_along_axis(lengths, order, 1)
+    ranks = np.arange(alphabet)[None, :] - np.take_along_axis(
+        first_indices, sorted_lengths, 1
+    )
+    codes = np.zeros_like(lengths)
+    codes[np.arange(lanes)[:, None], order] = (
+        np.take_along_axis(first_codes, sorted_lengths, 1) + ranks
+    )
+    # Left-justified end of the codes of each length: a code has the first
+    # length whose limit lies above the next MAX_CODE_LENGTH bits
+    shifts = MAX_CODE_LENGTH - np.arange(1, max_length + 1)
+    limits = (first_codes + counts)[:, 1 : max_length + 1] << shifts
+    return codes, (order, first_codes, first_indices, limits)
+
+
+def pack_codes(values, lengths):
+    # Codes are at most 56 bits, so each one touches at most two 64-bit
+    # words; the parts landing in the same word are OR-ed together
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    words = np.zeros(int(ends[-1]) // 64 + 2, dtype=np.uint64)
+    word = starts >> 6
+    shifts = 64 - (starts & 63) - lengths
+    values = values.astype(np.uint64)
+    heads = np.where(
+        shifts >= 0,
+        values << np.minimum(np.maximum(shifts, 0), 63).astype(np.uint64),
+        values >> np.maximum(-shifts, 0).astype(np.uint64),
+    )
+    runs = np.flatnonzero(np.diff(word, prepend=-1))
+    words[word[runs]] = np.bitwise_or.reduceat(heads, runs)
+    spills = np.flatnonzero(shifts < 0)
+    words[word[spills] + 1] |= values[spills] << (64 + shifts[spills]).astype(np.uint64)
+    return words.astype(">u8").tobytes()[: (int(ends[-1]) + 7) // 8]
+
+
+def pack_lanes(values, lengths, lane_sizes):
+    # Lanes follow each other, each padded to a whole byte so that it can be
+    # found from the bit lengths in the jump table
+    ends = np.cumsum(lane_sizes)
+    nbits = np.add.reduceat(lengths, ends - lane_sizes)
+    values = np.insert(values, ends, 0)
+    lengths = np.insert(lengths, ends, -nbits % 8)
+    return pack_codes(values, lengths), nbits
+
+
+def lane_offsets(nbits):
+    return np.concatenate([[0], np.cumsum(-(-nbits // 8))])
+
+
+def lockstep_decode(payload, starts, sizes, tables):
+    # Every lane decodes one symbol per step, like decode_lockstep, but with
+    # its own canonical code; a single table is shared by every lane
+    lanes = np.argsort(-sizes, kind="stable")
+    # Lanes are sorted by size, so the active ones are always a prefix
+    steps_active = np.searchsorted(-sizes[lanes], -np.arange(sizes.max()))
+    order, first_codes, first_indices, limits = (
+        np.broadcast_to(table, (sizes.size, table.shape[1]))[lanes] for table in tables
+    )
+    rows = np.arange(sizes.size) * first_codes.shape[1]
+    symbol_rows = np.arange(sizes.size) * order.shape[1]
+    order, first_codes, first_indices = (
+        order.ravel(),
+        first_codes.ravel(),
+        first_indices.ravel(),
+    )
+
+    buffer = np.zeros(len(payload) // 8 + 2, dtype=">u8")
+    buffer.view(np.uint8)[: len(payload)] = np.frombuffer(payload, np.uint8)
+    words = buffer.astype(np.uint64)
+    positions = starts[lanes].astype(np.int64)
+    outputs = (np.cumsum(sizes) - sizes)[lanes]
+    decoded = np.empty(int(sizes.sum()), dtype=order.dtype)
+    for step, active in enumerate(steps_active.tolist()):
+        position = positions[:active]
+        word = position >> 6
+        offset = (position & 63).astype(np.uint64)
+        window = (words[word] << offset) | (
+            (words[word + 1] >> np.uint64(1)) >> (np.uint64(63) - offset)
+        )
+        window = (window >> np.uint64(64 - MAX_CODE_LENGTH)).astype(np.int64)
+        length = (limits[:active] <= window[:, None]).sum(axis=1) + 1
+        flat = rows[:active] + length
+        index = first_indices[flat] + (window >> (MAX_CODE_LENGTH - length))
+        index -= first_codes[flat]
+        decoded[outputs[:active] + step] = order[symbol_rows[:active] + index]
+        position += length
+
+    used = np.empty_like(positions)
+    used[lanes] = positions - starts[lanes]
+    return decoded, used
+
+
+def encode_batch(images):
+    # Many small images in one container: one pass for all histograms, all
+    # codebooks built together, and a jump table locating every channel
+    mode, sizes, symbols = batch_symbols(images)
+    lane_sizes = np.repeat([width * height for width, height in sizes], len(mode))
+    lanes = np.repeat(np.arange(lane_sizes.size), lane_sizes)
+    histograms = np.bincount(
+        lanes * ALPHABET_SIZE + symbols, minlength=lane_sizes.size * ALPHABET_SIZE
+    ).reshape(-1, ALPHABET_SIZE)
+    lengths = batch_code_lengths(histograms)
+    if lengths.max() > MAX_CODE_LENGTH:
+        raise ValueError("Codes are too long for batch decoding")
+    codes, _ = canonical_tables(lengths)
+    payload, nbits = pack_lanes(
+        codes[lanes, symbols], lengths[lanes, symbols], lane_sizes
+    )
+
+    # The code lengths are lanes of their own, coded with one shared code
+    flat_lengths = lengths.ravel()
+    length_code = batch_code_lengths(
+        np.bincount(flat_lengths, minlength=MAX_CODE_LENGTH + 1)[None, :]
+    )
+    length_codes, _ = canonical_tables(length_code)
+    codebooks, codebook_nbits = pack_lanes(
+        length_codes[0, flat_lengths],
+        length_code[0, flat_lengths],
+        np.full(len(lengths), ALPHABET_SIZE),
+    )
+
+    sections = []
+    header = {
+        "kind": "batch",
+        "mode": mode,
+        "sizes": sizes,
+        "length_code": add_section(sections, length_code.astype(np.uint8).tobytes()),
+        "codebook_jump_table": add_section(
+            sections, codebook_nbits.astype("<u2").tobytes()
+        ),
+        "codebooks": add_section(sections, codebooks),
+        "jump_table": add_section(sections, nbits.astype("<u4").tobytes()),
+        "data": add_section(sections, payload),
+    }
+    return write_container(header, sections)
+
+
+def load_batch_lengths(header, sections, lanes):
+    # Code lengths of the given lanes, decoded side by side
+    length_code = np.frombuffer(sections[header["length_code"]], np.uint8)
+    _, tables = canonical_tables(length_code.astype(np.int64)[None, :])
+    nbits = np.frombuffer(sections[header["codebook_jump_table"]], "<u2")
+    nbits = nbits.astype(np.int64)
+    lengths, used = lockstep_decode(
+        sections[header["codebooks"]],
+        lane_offsets(nbits)[lanes] * 8,
+        np.full(len(lanes), ALPHABET_SIZE),
+        tables,
+    )
+    if not np.array_equal(used, nbits[lanes]):
+        raise ValueError("Corrupt codebooks in the batch")
+    return lengths.astype(np.int64).reshape(-1, ALPHABET_SIZE)
+
+
+def read_batch(data):
+    header, sections = read_container(data)
+    if header.get("kind") != "batch":
+        raise ValueError("Not a batch container")
+    nbits = np.frombuffer(sections[header["jump_table"]], "<u4").astype(np.int64)
+    return header, sections, nbits
+
+
+def batch_image(mode, size, planes):
+    from PIL import Image
+
+    width, height = size
+    pixels = np.stack(planes, axis=-1).reshape(height, width, len(mode))
+    if mode == "L":
+        pixels = pixels[..., 0]
+    return Image.fromarray(pixels.astype(np.uint8), mode)
+
+
+def decode_batch(data):
+    header, sections, nbits = read_batch(data)
+    mode = header["mode"]
+    channels = len(mode)
+    lane_sizes = np.repeat(
+        [width * height for width, height in header["sizes"]], channels
+    )
+    lengths = load_batch_lengths(header, sections, np.arange(lane_sizes.size))
+    _, tables = canonical_tables(lengths)
+    decoded, used = lockstep_decode(
+        sections[header["data"]], lane_offsets(nbits)[:-1] * 8, lane_sizes, tables
+    )
+    if not np.array_equal(used, nbits):
+        raise ValueError("Decoded data does not match the expected image size")
+    starts = np.cumsum(lane_sizes) - lane_sizes
+    return [
+        batch_image(
+            mode,
+            size,
+            [
+                decoded[starts[lane] : starts[lane] + lane_sizes[lane]]
+                for lane in range(image * channels, (image + 1) * channels)
+            ],
+        )
+        for image, size in enumerate(header["sizes"])
+    ]
+
+
+def decode_batch_image(data, index):
+    # One image of a batch, found through the jump table
+    header, sections, nbits = read_batch(data)
+    mode = header["mode"]
+    width, height = header["sizes"][index]
+    lanes = np.arange(index * len(mode), (index + 1) * len(mode))
+    offsets = lane_offsets(nbits)
+    payload = sections[header["data"]]
+    planes = []
+    for lane, lengths in zip(lanes, load_batch_lengths(header, sections, lanes)):
+        symbols = np.flatnonzero(lengths)
+        codes = canonical_codes(dict(zip(symbols.tolist(), lengths[symbols].tolist())))
+        symbols = decode_symbols(
+            payload[offsets[lane] : offsets[lane + 1]],
+            int(nbits[lane]),
+            codes,
+            width * height,
+        )
+        planes.append(np.array(symbols, dtype=np.int64))
+    return batch_image(mode, [width, height], planes)
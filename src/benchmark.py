@@ -0,0 +1,753 @@
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+import zlib
+import numpy as np
+from PIL import Image
+from codec import (
+    encode_image,
+    decode_image,
+    available_level,
+    encode_channel,
+    decode_channel,
+    encode_grouped_channel,
+    decode_grouped_channel,
+    encode_context_channel,
+    decode_context_channel,
+    encode_tiled_channel,
+    decode_tiled_channel,
+    encode_lz77_channel,
+    decode_lz77_channel,
+    CHANNEL_CODERS,
+)
+import kernels
+from huffman import (
+    count_frequencies,
+    calculate_entropy,
+    calculate_efficiency,
+    calculate_sampling_penalty,
+    build_codes,
+    build_huffman_tree,
+    build_code_lengths,
+    canonical_codes,
+    encode_symbols,
+    decode_symbols,
+    walk_tree,
+    pack_tuples,
+)
+from container import read_container, section_offsets
+from sequence import encode_sequence, decode_sequence, load_frames
+from sampling import approximate_frequencies, SAMPLE_METHODS
+from adaptive import AdaptiveHuffmanEncoder, AdaptiveHuffmanDecoder
+from batch import encode_batch, decode_batch
+from prediction import PREDICTORS, apply_prediction
+from utils import split_image_channels
+from streaming import decode_to_file
+
+
+def load_images(paths, max_pixels):
+    for path in paths:
+        image = Image.open(path).convert("RGB")
+        # Pure Python decoders are slow, so large images are scaled down
+        if image.size[0] * image.size[1] > max_pixels:
+            scale = math.sqrt(max_pixels / (image.size[0] * image.size[1]))
+            image.thumbnail((int(image.size[0] * scale), int(image.size[1] * scale)))
+        yield os.path.basename(path), image
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def channel_symbols(image):
+    return [
+        np.asarray(channel, dtype=np.int64).ravel()
+        for channel in split_image_channels(image)
+    ]
+
+
+def two_pass_round_trip(symbols):
+    sections = []
+    entry, encode_time = timed(encode_channel, symbols, sections, {})
+    decoded, decode_time = timed(decode_channel, entry, sections, {})
+    nbits = sum(len(section) for section in sections) * 8
+    return decoded, nbits, encode_time, decode_time
+
+
+def adaptive_round_trip(symbols, row_length):
+    # Pixels are fed one row at a time, as they would arrive from a stream
+    def encode():
+        encoder = AdaptiveHuffmanEncoder()
+        chunks = [
+            encoder.encode(symbols[start : start + row_length])
+            for start in range(0, symbols.size, row_length)
+        ]
+        tail, nbits = encoder.flush()
+        return chunks + [tail], nbits
+
+    def decode(chunks, nbits):
+        decoder = AdaptiveHuffmanDecoder()
+        decoded = []
+        for chunk in chunks[:-1]:
+            decoded.extend(decoder.decode(chunk))
+        decoded.extend(decoder.decode(chunks[-1], nbits))
+        return decoded
+
+    (chunks, nbits), encode_time = timed(encode)
+    decoded, decode_time = timed(decode, chunks, nbits)
+    return decoded, nbits, encode_time, decode_time
+
+
+def benchmark_adaptive(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        total_pixels = image.size[0] * image.size[1]
+        megabytes = total_pixels * 3 / 1e6
+        results = {"two-pass": [0, 0, 0], "adaptive": [0, 0, 0]}
+        for symbols in channel_symbols(image):
+            for label, round_trip in (
+                ("two-pass", two_pass_round_trip),
+                ("adaptive", lambda s: adaptive_round_trip(s, image.size[0])),
+            ):
+                decoded, nbits, encode_time, decode_time = round_trip(symbols)
+                if not np.array_equal(decoded, symbols):
+                    raise ValueError(f"{label} round trip failed on {name}")
+                results[label][0] += nbits
+                results[label][1] += encode_time
+                results[label][2] += decode_time
+
+        for label, (nbits, encode_time, decode_time) in results.items():
+            print(
+                f"{name} {label}: {nbits / total_pixels:.4f} bits/pixel, "
+                f"encode {megabytes / encode_time:.2f} MB/s, "
+                f"decode {megabytes / decode_time:.2f} MB/s"
+            )
+
+
+def benchmark_backends(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        total_pixels = image.size[0] * image.size[1]
+        megabytes = total_pixels * 3 / 1e6
+        options = {"width": image.size[0]}
+        for backend in args.backends:
+            encode, decode = CHANNEL_CODERS[backend]
+            nbits = encode_time = decode_time = 0
+            for symbols in channel_symbols(image):
+                sections = []
+                entry, elapsed = timed(encode, symbols, sections, options)
+                encode_time += elapsed
+                decoded, elapsed = timed(decode, entry, sections, options)
+                decode_time += elapsed
+                if not np.array_equal(decoded, symbols):
+                    raise ValueError(f"{backend} round trip failed on {name}")
+                nbits += sum(len(section) for section in sections) * 8
+            print(
+                f"{name} {backend}: {nbits / total_pixels:.4f} bits/pixel, "
+                f"encode {megabytes / encode_time:.2f} MB/s, "
+                f"decode {megabytes / decode_time:.2f} MB/s"
+            )
+
+
+def benchmark_streams(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        megabytes = image.size[0] * image.size[1] * 3 / 1e6
+        for streams in args.streams:
+            options = {"streams": streams, "workers": args.workers}
+            decode_time = 0
+            for symbols in channel_symbols(image):
+                sections = []
+                entry = encode_channel(symbols, sections, options)
+                decoded, elapsed = timed(decode_channel, entry, sections, options)
+                decode_time += elapsed
+                if not np.array_equal(decoded, symbols):
+                    raise ValueError(f"{streams} streams round trip failed on {name}")
+            print(
+                f"{name} {streams} streams: decode {megabytes / decode_time:.2f} MB/s"
+            )
+
+
+def benchmark_grouped(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        total_pixels = image.size[0] * image.size[1] * 3
+        for group_size in args.group_sizes:
+            options = {"group_size": group_size}
+            nbits = decode_time = entropy = 0
+            for symbols in channel_symbols(image):
+                entropy += (
+                    calculate_entropy(count_frequencies(symbols), symbols.size)
+                    * symbols.size
+                )
+                sections = []
+                if group_size == 1:
+                    entry = encode_channel(symbols, sections, options)
+                    decoded, elapsed = timed(decode_channel, entry, sections, options)
+                else:
+                    entry = encode_grouped_channel(symbols, sections, options)
+                    decoded, elapsed = timed(
+                        decode_grouped_channel, entry, sections, options
+                    )
+                decode_time += elapsed
+                if not np.array_equal(decoded, symbols):
+                    raise ValueError(f"Groups of {group_size} failed on {name}")
+                nbits += sum(len(section) for section in sections) * 8
+            # Efficiency is measured per value against the order-0 entropy, so
+            # grouped symbols can go past 1 by exploiting neighbouring values
+            print(
+                f"{name} groups of {group_size}: "
+                f"{nbits / total_pixels:.4f} bits/value, "
+                f"entropy {entropy / total_pixels:.4f}, "
+                f"efficiency {entropy / nbits:.4f}, "
+                f"decode {total_pixels / decode_time / 1e6:.2f} Mvalues/s"
+            )
+
+
+def benchmark_contexts(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        total_pixels = image.size[0] * image.size[1]
+        for contexts in args.contexts:
+            options = {"contexts": contexts, "width": image.size[0]}
+            header_bytes = data_bytes = 0
+            for symbols in channel_symbols(image):
+                sections = []
+                if contexts == 1:
+                    entry = encode_channel(symbols, sections, options)
+                    decoded = decode_channel(entry, sections, options)
+                else:
+                    entry = encode_context_channel(symbols, sections, options)
+                    decoded = decode_context_channel(entry, sections, options)
+                if not np.array_equal(decoded, symbols):
+                    raise ValueError(f"{contexts} contexts round trip failed on {name}")
+                data_bytes += len(sections[entry["data"]])
+                header_bytes += sum(len(section) for section in sections)
+            header_bytes -= data_bytes
+            total_bytes = header_bytes + data_bytes
+            print(
+                f"{name} {contexts} contexts: {total_bytes} bytes "
+                f"({total_bytes * 8 / total_pixels:.4f} bits/pixel), "
+                f"codebooks {header_bytes} bytes, bitstream {data_bytes} bytes"
+            )
+
+
+def benchmark_tiles(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        total_pixels = image.size[0] * image.size[1]
+        for codebooks in args.codebooks:
+            options = {
+                "tile_codebooks": codebooks,
+                "codebook_tile_size": args.tile_size,
+                "width": image.size[0],
+            }
+            nbits = 0
+            for symbols in channel_symbols(image):
+                sections = []
+                entry = encode_tiled_channel(symbols, sections, options)
+                decoded = decode_tiled_channel(entry, sections, options)
+                if not np.array_equal(decoded, symbols):
+                    raise ValueError(
+                        f"{codebooks} codebooks round trip failed on {name}"
+                    )
+                nbits += sum(len(section) for section in sections) * 8
+            print(
+                f"{name} {codebooks} codebooks: {nbits / total_pixels:.4f} bits/pixel"
+            )
+
+
+def synthetic_image(megapixels):
+    # Gradients plus noise, so both modes see a realistic spread of values
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = int(megapixels * 1e6 // width)
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+    pixels += (np.arange(width, dtype=np.uint16) * 192 // width).astype(np.uint8)[
+        None, :, None
+    ]
+    pixels[..., 1] += (np.arange(height, dtype=np.uint16) * 192 // height).astype(
+        np.uint8
+    )[:, None]
+    return pixels
+
+
+def benchmark_histogram(args):
+    pixels = synthetic_image(args.megapixels)
+    print(f"Synthetic image: {pixels.shape[1]}x{pixels.shape[0]}")
+    for label, symbols in (
+        ("channel", pixels[..., 0].ravel()),
+        ("tuple", pack_tuples(pixels)),
+    ):
+        expected, baseline = timed(count_frequencies, symbols)
+        for workers in args.workers:
+            frequencies, elapsed = timed(count_frequencies, symbols, workers)
+            if frequencies != expected:
+                raise ValueError(f"{label} histogram with {workers} workers differs")
+            print(
+                f"{label} {workers} workers: {elapsed:.3f} s "
+                f"({symbols.size / elapsed / 1e6:.1f} Mpixels/s, "
+                f"speedup {baseline / elapsed:.2f})"
+            )
+
+
+def benchmark_sampling(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        channels = channel_symbols(image)
+        exact = [count_frequencies(symbols) for symbols in channels]
+        for rate in args.rates:
+            bits = penalty = count_time = 0
+            for symbols, frequencies in zip(channels, exact):
+                approximate, elapsed = timed(
+                    approximate_frequencies,
+                    symbols,
+                    rate,
+                    args.method,
+                    image.size[0],
+                )
+                count_time += elapsed
+                code_map = build_codes(build_huffman_tree(approximate), "", {})
+                _, average_length, _ = calculate_efficiency(frequencies, code_map)
+                bits += average_length
+                penalty += calculate_sampling_penalty(frequencies, code_map)
+            print(
+                f"{name} rate {rate}: {bits:.4f} bits/pixel, "
+                f"penalty {penalty:.4f} bits/pixel, histogram {count_time:.4f} s"
+            )
+
+
+def benchmark_progressive(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        for levels in args.levels:
+            data = encode_image(image, predictor=args.predictor, levels=levels)
+            _, full_time = timed(decode_image, data)
+            header, _ = read_container(data)
+            # The first preview only needs the file up to the end of level 0
+            prefix = data[: section_offsets(data)[header["pyramid"]["level_ends"][0]]]
+            preview, preview_time = timed(
+                lambda: decode_image(prefix, level=available_level(prefix))
+            )
+            print(
+                f"{name} {levels} levels: {len(data)} bytes, "
+                f"first preview {preview.size[0]}x{preview.size[1]} from "
+                f"{len(prefix) / len(data):.1%} of the file in {preview_time:.3f} s, "
+                f"full decode {full_time:.3f} s"
+            )
+
+
+def benchmark_sequence(args):
+    paths = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            paths.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".tif"))
+            )
+        else:
+            paths.append(path)
+    frames = list(load_frames(paths))
+
+    independent, encode_time = timed(
+        lambda: [encode_image(frame, predictor=args.predictor) for frame in frames]
+    )
+    _, decode_time = timed(lambda: [decode_image(data) for data in independent])
+    total = sum(len(data) for data in independent)
+    print(
+        f"independent: {total} bytes, encode {len(frames) / encode_time:.2f} "
+        f"frames/s, decode {len(frames) / decode_time:.2f} frames/s"
+    )
+
+    data, encode_time = timed(
+        encode_sequence, frames, args.keyframe_interval, args.min_gain, args.predictor
+    )
+    decoded, decode_time = timed(lambda: list(decode_sequence(data)))
+    for frame, restored in zip(frames, decoded):
+        if not np.array_equal(np.asarray(frame), np.asarray(restored)):
+            raise ValueError("Sequence round trip failed")
+    print(
+        f"sequence: {len(data)} bytes ({len(data) / total:.1%}), "
+        f"encode {len(frames) / encode_time:.2f} frames/s, "
+        f"decode {len(frames) / decode_time:.2f} frames/s"
+    )
+
+
+def benchmark_near_lossless(args):
+    failures = []
+    for name, image in load_images(args.images, args.max_pixels):
+        original = np.asarray(image, dtype=np.int64)
+        for max_error in args.max_errors:
+            # A max error of 0 is the lossless baseline
+            data, encode_time = timed(
+                lambda: encode_image(image, args.predictor, max_error=max_error)
+            )
+            restored, decode_time = timed(decode_image, data)
+            error = int(np.abs(np.asarray(restored, dtype=np.int64) - original).max())
+            print(
+                f"{name} max error {max_error}: {len(data)} bytes "
+                f"({len(data) * 8 / original[..., 0].size:.4f} bits/pixel), "
+                f"encode {encode_time:.3f} s, decode {decode_time:.3f} s, "
+                f"largest error {error}"
+            )
+            if error > max_error:
+                failures.append(f"{name} differs by {error} with max error {max_error}")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("Every image stays within its error bound")
+
+
+def benchmark_lz77(args):
+    for name, image in load_images(args.images, args.max_pixels):
+        channels = [
+            (
+                symbols
+                if args.predictor is None
+                else apply_prediction(
+                    symbols.reshape(image.size[1], -1), args.predictor
+                )[0].ravel()
+            )
+            for symbols in channel_symbols(image)
+        ]
+        raw = [symbols.astype(np.uint8).tobytes() for symbols in channels]
+        for level in args.zlib_levels:
+            compressed, encode_time = timed(
+                lambda: [zlib.compress(data, level) for data in raw]
+            )
+            _, decode_time = timed(
+                lambda: [zlib.decompress(data) for data in compressed]
+            )
+            print(
+                f"{name} zlib level {level}: {sum(map(len, compressed))} bytes, "
+                f"encode {encode_time:.3f} s, decode {decode_time:.3f} s"
+            )
+        for effort in args.efforts:
+            options = {"lz_window": args.window, "lz_effort": effort}
+            sections = []
+            entries, encode_time = timed(
+                lambda: [
+                    encode_lz77_channel(symbols, sections, options)
+                    for symbols in channels
+                ]
+            )
+            restored, decode_time = timed(
+                lambda: [
+                    decode_lz77_channel(entry, sections, options) for entry in entries
+                ]
+            )
+            for symbols, values in zip(channels, restored):
+                if not np.array_equal(symbols, values):
+                    raise ValueError("LZ77 round trip failed")
+            print(
+                f"{name} lz77 effort {effort}: {sum(map(len, sections))} bytes, "
+                f"encode {encode_time:.3f} s, decode {decode_time:.3f} s"
+            )
+
+
+def peak_memory_job(function, *args):
+    import resource
+
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, elapsed
+
+
+def decode_and_save(path, output):
+    with open(path, "rb") as f:
+        decode_image(f.read()).save(output)
+
+
+def in_fresh_process(function, *args):
+    # Each measurement gets its own process, so peaks do not carry over
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(1) as pool:
+        return pool.submit(peak_memory_job, function, *args).result()
+
+
+def benchmark_streaming(args):
+    with tempfile.TemporaryDirectory() as directory:
+        container = os.path.join(directory, "image.huf")
+        output = os.path.join(directory, "restored.png")
+        for name, image in load_images(args.images, args.max_pixels):
+            with open(container, "wb") as f:
+                f.write(encode_image(image, args.predictor))
+            baseline, _ = in_fresh_process(os.path.exists, container)
+            print(f"{name} {image.size[0]}x{image.size[1]}, imports {baseline:.0f} MB")
+            peak, elapsed = in_fresh_process(decode_and_save, container, output)
+            print(f"  whole image: peak {peak:.0f} MB, {elapsed:.2f} s")
+            for strip_height in args.strip_heights:
+                peak, elapsed = in_fresh_process(
+                    decode_to_file, container, output, strip_height
+                )
+                print(
+                    f"  strips of {strip_height} rows: peak {peak:.0f} MB, "
+                    f"{elapsed:.2f} s"
+                )
+
+
+def engine_round_trip(symbols, enabled):
+    kernels.ENABLED = enabled
+    try:
+        codes = canonical_codes(build_code_lengths(count_frequencies(symbols)))
+        (payload, nbits), encode_time = timed(encode_symbols, symbols, codes)
+        decoded, decode_time = timed(
+            decode_symbols, payload, nbits, codes, symbols.size
+        )
+        huffman_tree = build_huffman_tree(count_frequencies(symbols))
+        code_map = build_codes(huffman_tree, "", {})
+        bits = "".join(code_map[symbol] for symbol in symbols.tolist())
+        walked, walk_time = timed(walk_tree, bits, huffman_tree)
+    finally:
+        kernels.ENABLED = kernels.JIT_AVAILABLE
+    outputs = (payload, nbits, np.asarray(decoded).tolist(), walked)
+    return outputs, (encode_time, decode_time, walk_time)
+
+
+def benchmark_jit(args):
+    if not kernels.JIT_AVAILABLE:
+        print(
+            "Numba is not available, so the kernels run as plain Python: only "
+            f"their results are checked, on the first {args.uncompiled_symbols} "
+            "values of each channel"
+        )
+    failures = []
+    for name, image in load_images(args.images, args.max_pixels):
+        for label, symbols in (
+            ("channel", channel_symbols(image)[0]),
+            ("tuples", pack_tuples(np.asarray(image))),
+        ):
+            if not kernels.JIT_AVAILABLE:
+                symbols = symbols[: args.uncompiled_symbols]
+            if kernels.JIT_AVAILABLE:
+                # The first call compiles the kernels, or loads them from cache
+                engine_round_trip(symbols[:1000], True)
+            python, python_times = engine_round_trip(symbols, False)
+            jit, jit_times = engine_round_trip(symbols, True)
+            if python != jit:
+                failures.append(f"{name} {label}")
+            print(
+                f"{name} {label}: "
+                + ", ".join(
+                    f"{step} {before:.3f} s -> {after:.3f} s "
+                    f"({before / max(after, 1e-9):.1f}x)"
+                    for step, before, after in zip(
+                        ("encode", "decode", "tree walk"), python_times, jit_times
+                    )
+                )
+            )
+    if failures:
+        for failure in failures:
+            print(f"FAIL: kernels and pure Python differ on {failure}")
+        sys.exit(1)
+    print("Kernels and pure Python give identical results")
+
+
+def small_images(images, count, size):
+    # Random size x size crops of the given images, as a stand-in for a set
+    # of thumbnails or dataset tiles
+    rng = np.random.default_rng(0)
+    sources = [image for _, image in images]
+    crops = []
+    while len(crops) < count:
+        image = sources[len(crops) % len(sources)]
+        left = int(rng.integers(0, max(image.size[0] - size, 0) + 1))
+        top = int(rng.integers(0, max(image.size[1] - size, 0) + 1))
+        crops.append(image.crop((left, top, left + size, top + size)))
+    return crops
+
+
+def benchmark_batch(args):
+    images = small_images(
+        load_images(args.images, args.max_pixels), args.count, args.size
+    )
+    stacked = np.stack([np.asarray(image) for image in images])
+    looped, loop_encode = timed(lambda: [encode_image(image) for image in images])
+    _, loop_decode = timed(lambda: [decode_image(data) for data in looped])
+    batch, batch_encode = timed(encode_batch, images)
+    decoded, batch_decode = timed(decode_batch, batch)
+    _, stacked_encode = timed(encode_batch, stacked)
+    if not all(
+        np.array_equal(np.asarray(image), np.asarray(result))
+        for image, result in zip(images, decoded)
+    ):
+        print("FAIL: the batch does not decode to its images")
+        sys.exit(1)
+
+    print(f"{args.count} images of {args.size}x{args.size}:")
+    for label, size, encode_time, decode_time in (
+        ("one call per image", sum(map(len, looped)), loop_encode, loop_decode),
+        ("batch of images", len(batch), batch_encode, batch_decode),
+        ("batch from an array", len(batch), stacked_encode, batch_decode),
+    ):
+        print(
+            f"  {label}: {size} bytes, encode {args.count / encode_time:.0f} "
+            f"images/s ({encode_time / args.count * 1e6:.0f} us each), decode "
+            f"{args.count / decode_time:.0f} images/s "
+            f"({decode_time / args.count * 1e6:.0f} us each)"
+        )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Huffman codec benchmarks")
+    parser.add_argument(
+        "--max-pixels",
+        type=int,
+        default=1_000_000,
+        help="Scale larger images down to about this many pixels",
+    )
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+
+    adaptive = benchmarks.add_parser(
+        "adaptive", help="Compare one-pass adaptive coding with the two-pass path"
+    )
+    adaptive.add_argument("images", nargs="+")
+    adaptive.set_defaults(handler=benchmark_adaptive)
+
+    backends = benchmarks.add_parser(
+        "backends", help="Compare the entropy coding backends on each image"
+    )
+    backends.add_argument("images", nargs="+")
+    backends.add_argument(
+        "--backends",
+        nargs="+",
+        choices=sorted(CHANNEL_CODERS),
+        default=["huffman", "rans"],
+    )
+    backends.set_defaults(handler=benchmark_backends)
+
+    streams = benchmarks.add_parser(
+        "streams", help="Compare decode speed for interleaved substream counts"
+    )
+    streams.add_argument("images", nargs="+")
+    streams.add_argument("--streams", nargs="+", type=int, default=[1, 4, 64, 256])
+    streams.add_argument("--workers", type=int, default=None)
+    streams.set_defaults(handler=benchmark_streams)
+
+    grouped = benchmarks.add_parser(
+        "grouped", help="Compare single values with grouped (extended) symbols"
+    )
+    grouped.add_argument("images", nargs="+")
+    grouped.add_argument("--group-sizes", nargs="+", type=int, default=[1, 2, 3])
+    grouped.set_defaults(handler=benchmark_grouped)
+
+    contexts = benchmarks.add_parser(
+        "contexts", help="Report compressed size for each number of contexts"
+    )
+    contexts.add_argument("images", nargs="+")
+    contexts.add_argument("--contexts", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    contexts.set_defaults(handler=benchmark_contexts)
+
+    tiles = benchmarks.add_parser(
+        "tiles", help="Report compressed size for each number of tile codebooks"
+    )
+    tiles.add_argument("images", nargs="+")
+    tiles.add_argument("--codebooks", nargs="+", type=int, default=[1, 4, 8, 16])
+    tiles.add_argument("--tile-size", type=int, default=64)
+    tiles.set_defaults(handler=benchmark_tiles)
+
+    progressive = benchmarks.add_parser(
+        "progressive", help="Compare time to first preview with full decoding"
+    )
+    progressive.add_argument("images", nargs="+")
+    progressive.add_argument("--levels", nargs="+", type=int, default=[2, 3, 4])
+    progressive.add_argument(
+        "--predictor", choices=("auto",) + PREDICTORS, default="auto"
+    )
+    progressive.set_defaults(handler=benchmark_progressive)
+
+    sequence = benchmarks.add_parser(
+        "sequence", help="Compare sequence mode with coding every frame on its own"
+    )
+    sequence.add_argument(
+        "inputs", nargs="+", help="Directories of frames or multi-frame files"
+    )
+    sequence.add_argument("--keyframe-interval", type=int, default=30)
+    sequence.add_argument("--min-gain", type=float, default=0.01)
+    sequence.add_argument("--predictor", choices=("auto",) + PREDICTORS, default="auto")
+    sequence.set_defaults(handler=benchmark_sequence)
+
+    near_lossless = benchmarks.add_parser(
+        "near-lossless", help="Check the error bound and size of near-lossless coding"
+    )
+    near_lossless.add_argument("images", nargs="+")
+    near_lossless.add_argument(
+        "--max-errors", nargs="+", type=int, default=[0, 1, 2, 4]
+    )
+    near_lossless.add_argument(
+        "--predictor", choices=("auto",) + PREDICTORS, default="auto"
+    )
+    near_lossless.set_defaults(handler=benchmark_near_lossless)
+
+    lz77 = benchmarks.add_parser(
+        "lz77", help="Compare LZ77 + Huffman with zlib on the same channel bytes"
+    )
+    lz77.add_argument("images", nargs="+")
+    lz77.add_argument("--efforts", nargs="+", type=int, default=[1, 4, 16])
+    lz77.add_argument("--window", type=int, default=32768)
+    lz77.add_argument("--zlib-levels", nargs="+", type=int, default=[1, 6, 9])
+    lz77.add_argument("--predictor", choices=("auto",) + PREDICTORS, default=None)
+    lz77.set_defaults(handler=benchmark_lz77)
+
+    streaming = benchmarks.add_parser(
+        "streaming", help="Compare peak memory of strip decoding with whole images"
+    )
+    streaming.add_argument("images", nargs="+")
+    streaming.add_argument(
+        "--strip-heights", nargs="+", type=int, default=[16, 64, 256]
+    )
+    streaming.add_argument(
+        "--predictor", choices=("auto",) + PREDICTORS, default="auto"
+    )
+    streaming.set_defaults(handler=benchmark_streaming)
+
+    jit = benchmarks.add_parser(
+        "jit", help="Check the JIT kernels against pure Python and report speedups"
+    )
+    jit.add_argument("images", nargs="+")
+    jit.add_argument(
+        "--uncompiled-symbols",
+        type=int,
+        default=20000,
+        help="Values per channel checked when Numba is not installed",
+    )
+    jit.set_defaults(handler=benchmark_jit)
+
+    batch = benchmarks.add_parser(
+        "batch", help="Compare the batched API with one call per small image"
+    )
+    batch.add_argument("images", nargs="+")
+    batch.add_argument("--count", type=int, default=1000)
+    batch.add_argument("--size", type=int, default=32)
+    batch.set_defaults(handler=benchmark_batch)
+
+    sampling = benchmarks.add_parser(
+        "sampling", help="Report the cost of codebooks built from sampled pixels"
+    )
+    sampling.add_argument("images", nargs="+")
+    sampling.add_argument(
+        "--rates", nargs="+", type=float, default=[0.001, 0.01, 0.1, 1]
+    )
+    sampling.add_argument("--method", choices=SAMPLE_METHODS, default="stride")
+    sampling.set_defaults(handler=benchmark_sampling)
+
+    histogram = benchmarks.add_parser(
+        "histogram", help="Scale frequency counting over worker processes"
+    )
+    histogram.add_argument("--megapixels", type=float, default=100)
+    histogram.add_argument(
+        "--workers",
+        nargs="+",
+        type=int,
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    histogram.set_defaults(handler=benchmark_histogram)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.handler(args)
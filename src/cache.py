@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import shutil
+
+# Bump to invalidate every cached result after a change to the codec or the
+# rendered artifacts
+CACHE_VERSION = 2
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class ResultCache:
+    def __init__(self, root, max_bytes=1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+        version_path = os.path.join(root, "VERSION")
+        version = None
+        if os.path.exists(version_path):
+            with open(version_path) as f:
+                version = f.read().strip()
+        if version != str(CACHE_VERSION):
+            self.clear()
+            with open(version_path, "w") as f:
+                f.write(str(CACHE_VERSION))
+
+    def key(self, image, **params):
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_VERSION}:{image.mode}:{image.size}".encode())
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        digest.update(image.tobytes())
+        # Palette images with the same indices differ only in their palette
+        if image.mode == "P":
+            digest.update(bytes(image.getpalette() or []))
+            digest.update(repr(image.info.get("transparency")).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        path = os.path.join(self.root, key)
+        if not os.path.isdir(path):
+            self.misses += 1
+            return None
+        # The entry's modification time doubles as its last access time
+        os.utime(path)
+        self.hits += 1
+        return path
+
+    def put_directory(self, key, source_path):
+        path = os.path.join(self.root, key)
+        shutil.rmtree(path, ignore_errors=True)
+        shutil.copytree(source_path, path)
+        os.utime(path)
+        self.evict()
+        return path
+
+    def put_files(self, key, files):
+        path = os.path.join(self.root, key)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        for name, data in files.items():
+            with open(os.path.join(path, name), "wb") as f:
+                f.write(data)
+        os.utime(path)
+        self.evict()
+        return path
+
+    def entries(self):
+        return [
+            os.path.join(self.root, name)
+            for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        ]
+
+    def evict(self):
+        entries = sorted(self.entries(), key=os.path.getmtime)
+        sizes = {path: directory_size(path) for path in entries}
+        total = sum(sizes.values())
+        # Drop least recently used entries, but never the one just written
+        for path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+
+    def clear(self):
+        for path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def save_frequencies(path, frequencies_by_channel):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                name: sorted(frequencies.items())
+                for name, frequencies in frequencies_by_channel.items()
+            },
+            f,
+        )
+
+
+def load_frequencies(path):
+    with open(path) as f:
+        return {name: dict(pairs) for name, pairs in json.load(f).items()}
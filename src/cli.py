@@ -0,0 +1,520 @@
+import argparse
+import json
+import os
+import sys
+from PIL import Image
+from codec import (
+    encode_image,
+    decode_image,
+    verify_image,
+    release_codebooks,
+    CHANNEL_CODERS,
+)
+from prediction import PREDICTORS
+from cache import ResultCache
+from container import read_container
+from sequence import encode_sequence, decode_sequence, read_frame, load_frames
+from streaming import decode_to_file
+from codebooks import CodebookStore
+from sampling import SAMPLE_METHODS
+from extended import MAX_GROUP_SIZE
+from tiles import MAX_TILE_CODEBOOKS
+from static_codebooks import (
+    StaticCodebooks,
+    train_static_codebooks,
+    save_static_codebooks,
+    evaluate_static_codebooks,
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+def bounded_int(low, high=None):
+    def parse(text):
+        value = int(text)
+        if value < low or (high is not None and value > high):
+            if high is None:
+                raise argparse.ArgumentTypeError(f"must be at least {low}")
+            raise argparse.ArgumentTypeError(f"must be between {low} and {high}")
+        return value
+
+    return parse
+
+
+def open_codebook_store(args):
+    if args.codebook_store is None:
+        return None
+    return CodebookStore(args.codebook_store, max_loss=args.max_codebook_loss)
+
+
+def open_static_codebooks(args):
+    if args.static_codebooks is None:
+        return None
+    return StaticCodebooks(args.static_codebooks)
+
+
+def list_images(directory):
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def codec_params(args):
+    return {
+        "predictor": args.predictor,
+        "tile_size": args.tile_size,
+        "mode": args.mode,
+        "streams": args.streams,
+        "group_size": args.group_size,
+        "contexts": args.contexts,
+        "tile_codebooks": args.tile_codebooks,
+        "codebook_tile_size": args.codebook_tile_size,
+        "sample_rate": args.sample_rate,
+        "sample_method": args.sample_method,
+        "levels": args.levels,
+        "max_error": args.max_error,
+        "lz_window": args.lz_window,
+        "lz_effort": args.lz_effort,
+    }
+
+
+def encode_command(args):
+    print("Loading image...")
+    image = Image.open(args.image)
+    print("Encoding image...")
+    data = encode_image(
+        image,
+        codebook_store=open_codebook_store(args),
+        static_codebooks=open_static_codebooks(args),
+        workers=args.workers,
+        **codec_params(args),
+    )
+    with open(args.output, "wb") as f:
+        f.write(data)
+    bits_per_pixel = len(data) * 8 / (image.size[0] * image.size[1])
+    print(f"Encoded size: {len(data)} bytes ({bits_per_pixel:.4f} bits/pixel)")
+    print(f"Encoded image saved as {args.output}")
+
+
+def decode_command(args):
+    print("Decoding image...")
+    if args.stream:
+        if args.level is not None:
+            raise SystemExit("--stream decodes full images only")
+        decode_to_file(
+            args.container,
+            args.output,
+            args.strip_height,
+            codebook_store=open_codebook_store(args),
+            static_codebooks=open_static_codebooks(args),
+        )
+        print(f"Restored image streamed to {args.output}")
+        return
+    with open(args.container, "rb") as f:
+        image = decode_image(
+            f.read(),
+            codebook_store=open_codebook_store(args),
+            static_codebooks=open_static_codebooks(args),
+            workers=args.workers,
+            level=args.level,
+        )
+    image.save(args.output)
+    print(f"Restored image saved as {args.output}")
+
+
+def batch_command(args):
+    cache = ResultCache(args.cache_dir, max_bytes=args.cache_size * (1 << 20))
+    os.makedirs(args.output_dir, exist_ok=True)
+    codebook_store = open_codebook_store(args)
+    static_codebooks = open_static_codebooks(args)
+    params = codec_params(args)
+
+    for image_path in list_images(args.input_dir):
+        name = os.path.basename(image_path)
+        image = Image.open(image_path)
+        key = cache.key(
+            image,
+            codebook_store=args.codebook_store,
+            static_codebooks=static_codebooks and static_codebooks.set_id,
+            **params,
+        )
+        cached_path = cache.get(key)
+        if cached_path is not None:
+            with open(os.path.join(cached_path, "encoded_image.huf"), "rb") as f:
+                data = f.read()
+            status = "cached"
+        else:
+            data = encode_image(
+                image,
+                codebook_store=codebook_store,
+                static_codebooks=static_codebooks,
+                **params,
+            )
+            stats = {"bytes": len(data), "size": list(image.size)}
+            cache.put_files(
+                key,
+                {
+                    "encoded_image.huf": data,
+                    "stats.json": json.dumps(stats).encode("utf-8"),
+                },
+            )
+            status = "encoded"
+
+        output_path = os.path.join(args.output_dir, os.path.splitext(name)[0] + ".huf")
+        with open(output_path, "wb") as f:
+            f.write(data)
+        bits_per_pixel = len(data) * 8 / (image.size[0] * image.size[1])
+        print(f"{name}: {status}, {len(data)} bytes ({bits_per_pixel:.4f} bits/pixel)")
+
+    print(f"Cache hits: {cache.hits}, misses: {cache.misses}")
+    if codebook_store is not None:
+        print(
+            f"Codebooks reused: {codebook_store.reused}, built: {codebook_store.built}"
+        )
+
+
+def train_command(args):
+    image_paths = list_images(args.corpus_dir)
+    predictors = [None if name == "raw" else name for name in args.transforms]
+    codebooks = train_static_codebooks(image_paths, predictors)
+    save_static_codebooks(codebooks, args.output)
+    print(f"Static codebooks saved as {args.output}")
+
+    static_codebooks = StaticCodebooks(args.output)
+    for predictor in predictors:
+        print(f"Efficiency against the per-image optimum ({predictor or 'raw'}):")
+        evaluate_static_codebooks(static_codebooks, image_paths, predictor)
+
+
+def sequence_paths(inputs):
+    paths = []
+    for path in inputs:
+        paths.extend(list_images(path) if os.path.isdir(path) else [path])
+    return paths
+
+
+def encode_sequence_command(args):
+    print("Encoding sequence...")
+    data = encode_sequence(
+        load_frames(sequence_paths(args.inputs)),
+        keyframe_interval=args.keyframe_interval,
+        min_gain=args.min_gain,
+        predictor=args.predictor,
+    )
+    with open(args.output, "wb") as f:
+        f.write(data)
+    header, _ = read_container(data)
+    codebooks = {
+        entry["codebook"] for frame in header["frames"] for entry in frame["channels"]
+    }
+    print(
+        f"Encoded {len(header['frames'])} frames with {len(codebooks)} codebooks: "
+        f"{len(data)} bytes"
+    )
+    print(f"Encoded sequence saved as {args.output}")
+
+
+def decode_sequence_command(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.frame is not None:
+        frames = [(args.frame, read_frame(args.container, args.frame))]
+    else:
+        with open(args.container, "rb") as f:
+            frames = enumerate(decode_sequence(f.read()))
+    for number, image in frames:
+        image.save(os.path.join(args.output_dir, f"frame_{number:05d}.png"))
+    print(f"Frames saved in {args.output_dir}")
+
+
+def verify_command(args):
+    failed = 0
+    for path in args.containers:
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            problems = verify_image(
+                data,
+                deep=args.deep,
+                codebook_store=open_codebook_store(args),
+                static_codebooks=open_static_codebooks(args),
+                workers=args.workers,
+            )
+        except ValueError as error:
+            problems = [str(error)]
+        if problems:
+            failed += 1
+            print(f"{path}: FAILED ({'; '.join(problems)})")
+        else:
+            print(f"{path}: OK")
+    if failed:
+        sys.exit(1)
+
+
+def release_command(args):
+    codebook_store = CodebookStore(args.codebook_store)
+    for path in args.containers:
+        with open(path, "rb") as f:
+            release_codebooks(f.read(), codebook_store)
+        print(f"{path}: released")
+
+
+def add_codec_arguments(parser):
+    parser.add_argument(
+        "--predictor",
+        choices=("auto",) + PREDICTORS,
+        default=None,
+        help="Code prediction residuals instead of raw values",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=None,
+        help="Choose the predictor per square tile instead of per row",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=sorted(CHANNEL_CODERS),
+        default="huffman",
+        help="Entropy coding mode for each channel",
+    )
+    parser.add_argument(
+        "--streams",
+        type=int,
+        default=1,
+        help="Split each channel into interleaved substreams that decode independently",
+    )
+    parser.add_argument(
+        "--group-size",
+        type=bounded_int(1, MAX_GROUP_SIZE),
+        default=2,
+        help="Number of consecutive values coded as one symbol in grouped mode",
+    )
+    parser.add_argument(
+        "--contexts",
+        type=bounded_int(1),
+        default=8,
+        help="Number of neighbourhood contexts, each with its own codebook",
+    )
+    parser.add_argument(
+        "--tile-codebooks",
+        type=bounded_int(1, MAX_TILE_CODEBOOKS),
+        default=8,
+        help="Number of shared codebooks the tiles choose from in tiled mode",
+    )
+    parser.add_argument(
+        "--codebook-tile-size",
+        type=bounded_int(1),
+        default=64,
+        help="Size of the square tiles that pick a codebook in tiled mode",
+    )
+    parser.add_argument(
+        "--sample-rate",
+        type=float,
+        default=None,
+        help="Build huffman codebooks from this fraction of the pixels",
+    )
+    parser.add_argument(
+        "--sample-method",
+        choices=SAMPLE_METHODS,
+        default="stride",
+        help="How pixels are picked for --sample-rate",
+    )
+    parser.add_argument(
+        "--levels",
+        type=int,
+        default=0,
+        help="Store this many halved resolution levels for progressive decoding",
+    )
+    parser.add_argument(
+        "--max-error",
+        type=int,
+        default=0,
+        help="Near-lossless coding: no pixel differs from the original by more",
+    )
+    parser.add_argument(
+        "--lz-window",
+        type=int,
+        default=32768,
+        help="How far back lz77 mode looks for repeated runs of values",
+    )
+    parser.add_argument(
+        "--lz-effort",
+        type=int,
+        default=4,
+        help="Earlier matches lz77 mode tries at each position",
+    )
+    add_codebook_arguments(parser)
+
+
+def add_codebook_arguments(parser):
+    parser.add_argument(
+        "--codebook-store",
+        default=None,
+        help="Directory of shared codebooks to reuse across similar images",
+    )
+    parser.add_argument(
+        "--max-codebook-loss",
+        type=float,
+        default=0.05,
+        help="Largest bits/pixel loss accepted to reuse a stored codebook",
+    )
+    parser.add_argument(
+        "--static-codebooks",
+        default=None,
+        help="File of pre-trained codebooks used instead of per-image ones",
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Huffman image codec")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    encode = commands.add_parser("encode", help="Encode an image into a container")
+    encode.add_argument("image")
+    encode.add_argument("output")
+    add_codec_arguments(encode)
+    encode.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Count pixel frequencies of large images in this many worker processes",
+    )
+    encode.set_defaults(handler=encode_command)
+
+    decode = commands.add_parser("decode", help="Restore an image from a container")
+    decode.add_argument("container")
+    decode.add_argument("output")
+    add_codebook_arguments(decode)
+    decode.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Decode interleaved substreams in this many worker processes",
+    )
+    decode.add_argument(
+        "--level",
+        type=int,
+        default=None,
+        help="Decode only this resolution level of a progressive container",
+    )
+    decode.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write rows to a .png, .ppm/.pgm/.pam or .npy file as they decode",
+    )
+    decode.add_argument(
+        "--strip-height",
+        type=int,
+        default=256,
+        help="Rows decoded at a time with --stream",
+    )
+    decode.set_defaults(handler=decode_command)
+
+    batch = commands.add_parser("batch", help="Encode every image in a directory")
+    batch.add_argument("input_dir")
+    batch.add_argument("output_dir")
+    add_codec_arguments(batch)
+    batch.add_argument(
+        "--cache-dir",
+        default=os.path.join("huffman_rgb_project", "cache"),
+        help="Directory of the content-addressed result cache",
+    )
+    batch.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Maximum size of the result cache in MiB",
+    )
+    batch.set_defaults(handler=batch_command)
+
+    train = commands.add_parser("train", help="Train static codebooks on a corpus")
+    train.add_argument("corpus_dir")
+    train.add_argument("output")
+    train.add_argument(
+        "--transforms",
+        nargs="+",
+        choices=("raw", "auto") + PREDICTORS,
+        default=["raw"],
+        help="Transforms to train a codebook set for",
+    )
+    train.set_defaults(handler=train_command)
+
+    encode_sequence = commands.add_parser(
+        "encode-sequence",
+        help="Encode frames against the previous frame into one container",
+    )
+    encode_sequence.add_argument(
+        "inputs", nargs="+", help="Directories of frames or multi-frame files"
+    )
+    encode_sequence.add_argument("output")
+    encode_sequence.add_argument(
+        "--keyframe-interval",
+        type=bounded_int(1),
+        default=30,
+        help="Frames between keyframes, which decode without earlier frames",
+    )
+    encode_sequence.add_argument(
+        "--min-gain",
+        type=float,
+        default=0.01,
+        help="Smallest share of bits a new codebook must save to replace the old one",
+    )
+    encode_sequence.add_argument(
+        "--predictor",
+        choices=("auto",) + PREDICTORS,
+        default="auto",
+        help="Spatial predictor for keyframes",
+    )
+    encode_sequence.set_defaults(handler=encode_sequence_command)
+
+    decode_sequence = commands.add_parser(
+        "decode-sequence", help="Restore the frames of a sequence container"
+    )
+    decode_sequence.add_argument("container")
+    decode_sequence.add_argument("output_dir")
+    decode_sequence.add_argument(
+        "--frame",
+        type=int,
+        default=None,
+        help="Seek to and decode only this frame",
+    )
+    decode_sequence.set_defaults(handler=decode_sequence_command)
+
+    verify = commands.add_parser(
+        "verify", help="Check containers against their stored checksums"
+    )
+    verify.add_argument("containers", nargs="+")
+    verify.add_argument(
+        "--deep",
+        action="store_true",
+        help="Also decode every channel and compare the pixel checksums",
+    )
+    verify.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Decode channels for --deep in this many worker processes",
+    )
+    add_codebook_arguments(verify)
+    verify.set_defaults(handler=verify_command)
+
+    release = commands.add_parser(
+        "release",
+        help="Drop the shared codebook references of containers about to be deleted",
+    )
+    release.add_argument("containers", nargs="+")
+    release.add_argument("--codebook-store", required=True)
+    release.set_defaults(handler=release_command)
+
+    return parser
+
+
+def run():
+    args = build_parser().parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    run()
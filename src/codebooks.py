@@ -0,0 +1,190 @@
+import hashlib
+import os
+import uuid
+import numpy as np
+from collections import Counter
+from huffman import build_code_lengths, encoded_bits
+from container import pack_code_lengths, unpack_code_lengths
+
+SIGNATURE_BINS = 16
+
+
+def histogram_signature(frequencies, alphabet_size=256):
+    # Coarse shape of the histogram: the share of each of 16 bins on a 0-15 scale
+    bins = np.zeros(SIGNATURE_BINS)
+    for symbol, freq in frequencies.items():
+        bins[min(symbol * SIGNATURE_BINS // alphabet_size, SIGNATURE_BINS - 1)] += freq
+    levels = np.minimum(bins / max(bins.sum(), 1) * 16, 15).astype(int)
+    return "".join(f"{level:x}" for level in levels)
+
+
+def signature_distance(a, b):
+    return sum(abs(int(x, 16) - int(y, 16)) for x, y in zip(a, b))
+
+
+def smoothed_frequencies(frequencies, alphabet_size):
+    # Laplace smoothing gives every symbol of the alphabet a code so the
+    # codebook can be reused for images with slightly different histograms
+    smoothed = Counter({symbol: 1 for symbol in range(alphabet_size)})
+    smoothed.update(frequencies)
+    return smoothed
+
+
+class CodebookStore:
+    def __init__(
+        self, root, max_codebooks=64, max_pinned=1024, max_loss=0.05, max_candidates=8
+    ):
+        self.root = root
+        self.max_codebooks = max_codebooks
+        self.max_pinned = max_pinned
+        self.max_loss = max_loss
+        self.max_candidates = max_candidates
+        self.codebooks = {}
+        self.reused = 0
+        self.built = 0
+        os.makedirs(root, exist_ok=True)
+
+    def entries(self):
+        # Codebooks are stored as <signature>-<id>.cb so several batch workers
+        # can share the directory
+        entries = {}
+        for name in os.listdir(self.root):
+            if name.endswith(".cb"):
+                signature, codebook_id = name[:-3].split("-")
+                entries[codebook_id] = signature
+        return entries
+
+    def path(self, codebook_id, signature):
+        return os.path.join(self.root, f"{signature}-{codebook_id}.cb")
+
+    def load(self, codebook_id):
+        if codebook_id not in self.codebooks:
+            signature = self.entries().get(codebook_id)
+            if signature is None:
+                raise KeyError(f"Codebook {codebook_id} is not in the store")
+            with open(self.path(codebook_id, signature), "rb") as f:
+                self.codebooks[codebook_id] = unpack_code_lengths(f.read())
+        return self.codebooks[codebook_id]
+
+    def touch(self, codebook_id, signature):
+        try:
+            os.utime(self.path(codebook_id, signature))
+        except FileNotFoundError:
+            pass
+
+    def add(self, code_lengths, signature):
+        data = pack_code_lengths(code_lengths)
+        codebook_id = hashlib.sha256(data).hexdigest()[:16]
+        temporary_path = self.path(codebook_id, signature) + f".{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+        os.replace(temporary_path, self.path(codebook_id, signature))
+        self.codebooks[codebook_id] = code_lengths
+        self.evict()
+        return codebook_id
+
+    def pin_paths(self, codebook_id):
+        prefix = f"{codebook_id}."
+        return [
+            os.path.join(self.root, name)
+            for name in os.listdir(self.root)
+            if name.startswith(prefix) and name.endswith(".pin")
+        ]
+
+    def pinned(self):
+        return {
+            name.split(".")[0]
+            for name in os.listdir(self.root)
+            if name.endswith(".pin")
+        }
+
+    def pin(self, codebook_id, signature):
+        # Every container referring to a codebook holds one <id>.<token>.pin
+        # file, and pinned codebooks are never evicted; False if the codebook
+        # was evicted before the pin landed
+        pin_path = os.path.join(self.root, f"{codebook_id}.{uuid.uuid4().hex}.pin")
+        with open(pin_path, "w"):
+            pass
+        if os.path.exists(self.path(codebook_id, signature)):
+            return True
+        os.remove(pin_path)
+        return False
+
+    def release(self, codebook_id):
+        # Drops one reference, for a container that was deleted; a codebook
+        # with no references left is evicted like any other
+        for pin_path in self.pin_paths(codebook_id):
+            try:
+                os.remove(pin_path)
+            except FileNotFoundError:
+                continue
+            self.evict()
+            return
+        raise KeyError(f"Codebook {codebook_id} is not pinned")
+
+    def evict(self):
+        # Only codebooks no container refers to count towards max_codebooks
+        pinned = self.pinned()
+        entries = self.entries()
+        paths = {
+            codebook_id: self.path(codebook_id, signature)
+            for codebook_id, signature in entries.items()
+            if codebook_id not in pinned
+        }
+        oldest = sorted(paths, key=lambda c: os.path.getmtime(paths[c]))
+        for codebook_id in oldest[: max(len(oldest) - self.max_codebooks, 0)]:
+            # The file is moved aside before the pin is checked again, so a
+            # worker pinning it meanwhile either sees it gone or gets it back
+            evicted_path = paths[codebook_id] + f".{os.getpid()}.evicted"
+            try:
+                os.replace(paths[codebook_id], evicted_path)
+            except FileNotFoundError:
+                continue
+            if self.pin_paths(codebook_id):
+                os.replace(evicted_path, paths[codebook_id])
+                continue
+            os.remove(evicted_path)
+            self.codebooks.pop(codebook_id, None)
+
+    def select(self, frequencies, alphabet_size=256):
+        signature = histogram_signature(frequencies, alphabet_size)
+        code_lengths = build_code_lengths(frequencies)
+        total = sum(frequencies.values())
+        new_bits = encoded_bits(frequencies, code_lengths)
+        new_bits += len(pack_code_lengths(code_lengths)) * 8
+
+        # Only the stored codebooks with the closest signatures are costed exactly
+        entries = self.entries()
+        candidates = sorted(
+            entries, key=lambda c: signature_distance(signature, entries[c])
+        )[: self.max_candidates]
+        best_id, best_bits = None, float("inf")
+        for codebook_id in candidates:
+            try:
+                bits = encoded_bits(frequencies, self.load(codebook_id))
+            except (KeyError, FileNotFoundError):
+                continue
+            if bits < best_bits:
+                best_id, best_bits = codebook_id, bits
+
+        # At most max_pinned codebooks are pinned; past that, images embed
+        # their own codebooks until containers are released
+        pinned = self.pinned()
+        if (
+            best_id is not None
+            and (best_bits - new_bits) / total <= self.max_loss
+            and (best_id in pinned or len(pinned) < self.max_pinned)
+            and self.pin(best_id, entries[best_id])
+        ):
+            self.touch(best_id, entries[best_id])
+            self.reused += 1
+            return best_id, self.codebooks[best_id]
+
+        # The image keeps its optimal codebook, while a smoothed copy is stored
+        # for the images that follow
+        self.built += 1
+        self.add(
+            build_code_lengths(smoothed_frequencies(frequencies, alphabet_size)),
+            signature,
+        )
+        return None, code_lengths
@@ -0,0 +1,716 @@
+import zlib
+import numpy as np
+from PIL import Image
+from huffman import (
+    count_frequencies,
+    build_code_lengths,
+    canonical_codes,
+    encode_symbols,
+    decode_symbols,
+    encode_interleaved,
+    decode_interleaved,
+)
+from container import (
+    add_section,
+    write_container,
+    read_container,
+    verify_sections,
+    pack_code_lengths,
+    unpack_code_lengths,
+    pack_symbol_table,
+    unpack_symbol_table,
+)
+from prediction import (
+    apply_prediction,
+    reconstruct,
+    quantization_range,
+    quantize_prediction,
+)
+from rle import run_length_encode, run_length_decode
+from lz77 import lz77_encode, lz77_decode
+from adaptive import AdaptiveHuffmanEncoder, AdaptiveHuffmanDecoder
+from ans import (
+    scale_bits_for,
+    normalize_frequencies,
+    lane_count,
+    rans_encode,
+    rans_decode,
+)
+from extended import group_symbols, ungroup_symbols, check_group_size
+from context import encode_with_contexts, decode_with_contexts
+from tiles import encode_tiles, decode_tiles, check_tile_options
+from sampling import approximate_frequencies
+from pyramid import (
+    zigzag,
+    unzigzag,
+    max_levels,
+    level_sizes,
+    decompose,
+    recompose_level,
+)
+from static_codebooks import CHANNEL_NAMES
+from utils import (
+    split_image_channels,
+    merge_image_channels,
+    native_image,
+    mode_bit_depth,
+)
+
+ADAPTIVE_BLOCK_SIZE = 8192
+
+
+def encode_channel(symbols, sections, options):
+    static_codebook = options.get("static_codebook")
+    codebook_store = options.get("codebook_store")
+    entry = {"count": int(symbols.size)}
+    if static_codebook is not None:
+        # Static codebooks need no histogram pass over the image
+        entry["static_codebook"], codes = static_codebook
+    else:
+        if options.get("sample_rate") is not None:
+            frequencies = approximate_frequencies(
+                symbols,
+                options["sample_rate"],
+                options.get("sample_method", "stride"),
+                options.get("width"),
+                options.get("alphabet_size", 256),
+            )
+        else:
+            frequencies = count_frequencies(symbols, options.get("workers"))
+        if codebook_store is None:
+            code_lengths = build_code_lengths(frequencies)
+            codebook_id = None
+        else:
+            codebook_id, code_lengths = codebook_store.select(
+                frequencies, options.get("alphabet_size", 256)
+            )
+        if codebook_id is None:
+            entry["codebook"] = add_section(sections, pack_code_lengths(code_lengths))
+        else:
+            entry["codebook_id"] = codebook_id
+        codes = canonical_codes(code_lengths)
+
+    streams = options.get("streams", 1)
+    if streams > 1:
+        # The jump table holds the bit length of every substream, so each one
+        # can be located and decoded on its own
+        payloads, nbits = encode_interleaved(symbols, codes, streams)
+        entry["streams"] = streams
+        entry["jump_table"] = add_section(
+            sections, np.array(nbits, dtype="<u8").tobytes()
+        )
+        entry["data"] = add_section(sections, b"".join(payloads))
+    else:
+        payload, entry["nbits"] = encode_symbols(symbols, codes)
+        entry["data"] = add_section(sections, payload)
+    return entry
+
+
+def load_code_lengths(entry, sections, options):
+    if "codebook" in entry:
+        return unpack_code_lengths(sections[entry["codebook"]])
+    if "static_codebook" in entry:
+        if options.get("static_codebooks") is None:
+            raise ValueError("The container refers to static codebooks")
+        return options["static_codebooks"].load(entry["static_codebook"])
+    if options.get("codebook_store") is None:
+        raise ValueError("The container refers to a shared codebook store")
+    return options["codebook_store"].load(entry["codebook_id"])
+
+
+def decode_channel(entry, sections, options):
+    codes = canonical_codes(load_code_lengths(entry, sections, options))
+    data = sections[entry["data"]]
+    if "streams" in entry:
+        nbits = np.frombuffer(sections[entry["jump_table"]], "<u8").tolist()
+        offsets = np.cumsum([0] + [-(-n // 8) for n in nbits])
+        payloads = [data[offsets[i] : offsets[i + 1]] for i in range(len(nbits))]
+        return decode_interleaved(
+            payloads, nbits, codes, entry["count"], options.get("workers")
+        )
+    return np.array(
+        decode_symbols(data, entry["nbits"], codes, entry["count"]), dtype=np.int64
+    )
+
+
+def encode_rle_channel(symbols, sections, options):
+    values, run_lengths = run_length_encode(symbols)
+    return {
+        "values": encode_channel(values, sections, options),
+        "runs": encode_channel(run_lengths - 1, sections, {}),
+        "count": int(symbols.size),
+    }
+
+
+def decode_rle_channel(entry, sections, options):
+    values = decode_channel(entry["values"], sections, options)
+    run_lengths = decode_channel(entry["runs"], sections, {}) + 1
+    return run_length_decode(values, run_lengths)
+
+
+def encode_lz77_channel(symbols, sections, options):
+    tokens, literals, distance_codes, extras = lz77_encode(
+        symbols, options.get("lz_window", 32768), options.get("lz_effort", 4)
+    )
+    # Literals and lengths share one canonical table, distances get their own
+    entry = {
+        "literals": literals,
+        "extras": add_section(sections, extras),
+        "count": int(symbols.size),
+    }
+    if tokens.size:
+        entry["tokens"] = encode_channel(tokens, sections, {})
+    if distance_codes.size:
+        entry["distances"] = encode_channel(distance_codes, sections, {})
+    return entry
+
+
+def decode_lz77_channel(entry, sections, options):
+    tokens = distance_codes = np.zeros(0, dtype=np.int64)
+    if "tokens" in entry:
+        tokens = decode_channel(entry["tokens"], sections, {})
+    if "distances" in entry:
+        distance_codes = decode_channel(entry["distances"], sections, {})
+    return lz77_decode(
+        tokens,
+        entry["literals"],
+        distance_codes,
+        sections[entry["extras"]],
+        entry["count"],
+    )
+
+
+def encode_adaptive_channel(symbols, sections, options):
+    alphabet_size = options.get("alphabet_size", 256)
+    encoder = AdaptiveHuffmanEncoder(alphabet_size, ADAPTIVE_BLOCK_SIZE)
+    payload = encoder.encode(symbols)
+    tail, nbits = encoder.flush()
+    return {
+        "alphabet_size": alphabet_size,
+        "block_size": ADAPTIVE_BLOCK_SIZE,
+        "data": add_section(sections, payload + tail),
+        "nbits": nbits,
+        "count": int(symbols.size),
+    }
+
+
+def decode_adaptive_channel(entry, sections, options):
+    decoder = AdaptiveHuffmanDecoder(
+        entry.get("alphabet_size", 256), entry["block_size"]
+    )
+    return np.array(
+        decoder.decode(sections[entry["data"]], entry["nbits"]), dtype=np.int64
+    )
+
+
+def encode_rans_channel(symbols, sections, options):
+    frequencies = count_frequencies(symbols)
+    scale_bits = scale_bits_for(len(frequencies))
+    normalized = normalize_frequencies(frequencies, scale_bits)
+    states, stream = rans_encode(
+        symbols, normalized, scale_bits, lane_count(symbols.size)
+    )
+    return {
+        "scale_bits": scale_bits,
+        "frequencies": add_section(sections, pack_symbol_table(normalized, "<u4")),
+        "states": add_section(sections, states.astype("<u4").tobytes()),
+        "data": add_section(sections, stream.astype("<u2").tobytes()),
+        "count": int(symbols.size),
+    }
+
+
+def decode_rans_channel(entry, sections, options):
+    normalized = unpack_symbol_table(sections[entry["frequencies"]], "<u4")
+    return rans_decode(
+        np.frombuffer(sections[entry["states"]], "<u4"),
+        np.frombuffer(sections[entry["data"]], "<u2"),
+        normalized,
+        entry["scale_bits"],
+        entry["count"],
+    )
+
+
+def encode_grouped_channel(symbols, sections, options):
+    group_size = options.get("group_size", 2)
+    extended = group_symbols(symbols, group_size)
+    return {
+        "group_size": group_size,
+        "symbols": encode_channel(
+            extended, sections, {"streams": options.get("streams", 1)}
+        ),
+        "count": int(symbols.size),
+    }
+
+
+def decode_grouped_channel(entry, sections, options):
+    extended = decode_channel(entry["symbols"], sections, options)
+    return ungroup_symbols(extended, entry["group_size"])
+
+
+def encode_context_channel(symbols, sections, options):
+    values = symbols.reshape(-1, options["width"])
+    thresholds, code_lengths, payload, nbits = encode_with_contexts(
+        values, options.get("contexts", 8)
+    )
+    return {
+        "thresholds": thresholds,
+        "codebooks": [
+            [bucket, add_section(sections, pack_code_lengths(lengths))]
+            for bucket, lengths in code_lengths.items()
+        ],
+        "data": add_section(sections, payload),
+        "nbits": nbits,
+        "count": int(symbols.size),
+    }
+
+
+def decode_context_channel(entry, sections, options):
+    code_lengths = {
+        bucket: unpack_code_lengths(sections[index])
+        for bucket, index in entry["codebooks"]
+    }
+    return decode_with_contexts(
+        sections[entry["data"]],
+        entry["nbits"],
+        entry["thresholds"],
+        code_lengths,
+        options["width"],
+        entry["count"],
+    )
+
+
+def encode_tiled_channel(symbols, sections, options):
+    values = symbols.reshape(-1, options["width"])
+    tile_size = options.get("codebook_tile_size", 64)
+    choices, code_lengths, payloads, nbits = encode_tiles(
+        values, tile_size, options.get("tile_codebooks", 8)
+    )
+    return {
+        "tile_size": tile_size,
+        "choices": add_section(sections, choices.tobytes()),
+        "codebooks": [
+            add_section(sections, pack_code_lengths(lengths))
+            for lengths in code_lengths
+        ],
+        "jump_table": add_section(sections, np.array(nbits, dtype="<u8").tobytes()),
+        "data": add_section(sections, b"".join(payloads)),
+        "count": int(symbols.size),
+    }
+
+
+def decode_tiled_channel(entry, sections, options):
+    nbits = np.frombuffer(sections[entry["jump_table"]], "<u8").tolist()
+    offsets = np.cumsum([0] + [-(-n // 8) for n in nbits])
+    data = sections[entry["data"]]
+    return decode_tiles(
+        np.frombuffer(sections[entry["choices"]], np.uint8),
+        [unpack_code_lengths(sections[index]) for index in entry["codebooks"]],
+        [data[offsets[i] : offsets[i + 1]] for i in range(len(nbits))],
+        nbits,
+        (entry["count"] // options["width"], options["width"]),
+        entry["tile_size"],
+    )
+
+
+# Channel coders take the codec-wide options: codebook_store, static_codebook
+# (static_codebooks when decoding), streams, group_size, contexts,
+# tile_codebooks, codebook_tile_size, sample_rate, sample_method, workers, the
+# alphabet size (256, or 65536 for 16-bit images) and the image width
+CHANNEL_CODERS = {
+    "huffman": (encode_channel, decode_channel),
+    "rle": (encode_rle_channel, decode_rle_channel),
+    "lz77": (encode_lz77_channel, decode_lz77_channel),
+    "adaptive": (encode_adaptive_channel, decode_adaptive_channel),
+    "rans": (encode_rans_channel, decode_rans_channel),
+    "grouped": (encode_grouped_channel, decode_grouped_channel),
+    "context": (encode_context_channel, decode_context_channel),
+    "tiled": (encode_tiled_channel, decode_tiled_channel),
+}
+
+
+def encode_image(
+    image,
+    predictor=None,
+    tile_size=None,
+    mode="huffman",
+    codebook_store=None,
+    static_codebooks=None,
+    streams=1,
+    group_size=2,
+    contexts=8,
+    tile_codebooks=8,
+    codebook_tile_size=64,
+    sample_rate=None,
+    sample_method="stride",
+    levels=0,
+    workers=None,
+    max_error=0,
+    lz_window=32768,
+    lz_effort=4,
+):
+    if static_codebooks is not None and mode != "huffman":
+        raise ValueError("Static codebooks are only available in huffman mode")
+    if streams > 1 and mode not in ("huffman", "grouped"):
+        raise ValueError("Interleaved streams need the huffman or grouped mode")
+    if sample_rate is not None and mode != "huffman":
+        raise ValueError("Sampled histograms are only available in huffman mode")
+    if mode == "grouped":
+        check_group_size(group_size)
+    if mode == "tiled":
+        check_tile_options(codebook_tile_size, tile_codebooks)
+    if lz_window < 1 or lz_effort < 1:
+        raise ValueError("The LZ77 window and effort must be at least 1")
+    if contexts < 1:
+        raise ValueError("The number of contexts must be at least 1")
+    image = native_image(image)
+    if static_codebooks is not None and image.mode != "RGB":
+        # Static codebooks are trained on 8-bit RGB channels; converting other
+        # modes would lose alpha, palettes or bit depth
+        raise ValueError(
+            f"Static codebooks only code 8-bit RGB images, not {image.mode}"
+        )
+    if levels and image.mode == "P":
+        raise ValueError("Palette indices cannot be averaged into resolution levels")
+    if max_error < 0:
+        raise ValueError("The maximum error cannot be negative")
+    if max_error and image.mode == "P":
+        raise ValueError(
+            "Palette images cannot be coded near-losslessly: their values are "
+            "palette indices, not intensities"
+        )
+    if max_error and levels:
+        raise ValueError(
+            "Near-lossless coding cannot be combined with resolution levels"
+        )
+    modulus = 1 << mode_bit_depth(image.mode)
+    levels = min(levels, max_levels((image.size[1], image.size[0])))
+    header = {"mode": image.mode, "size": list(image.size), "channels": []}
+    sections = []
+    if image.mode == "P":
+        palette_mode = image.palette.mode
+        header["palette"] = add_section(sections, bytes(image.getpalette(palette_mode)))
+        header["palette_mode"] = palette_mode
+        transparency = image.info.get("transparency")
+        if transparency is not None:
+            header["transparency"] = (
+                list(transparency) if isinstance(transparency, bytes) else transparency
+            )
+
+    options = {
+        "codebook_store": codebook_store,
+        "streams": streams,
+        "group_size": group_size,
+        "contexts": contexts,
+        "tile_codebooks": tile_codebooks,
+        "codebook_tile_size": codebook_tile_size,
+        "sample_rate": sample_rate,
+        "sample_method": sample_method,
+        "workers": workers,
+        "alphabet_size": modulus,
+        "lz_window": lz_window,
+        "lz_effort": lz_effort,
+    }
+    planes = []
+    checksums = []
+    details = {}
+    for index, channel in enumerate(split_image_channels(image)):
+        pixels = np.asarray(channel, dtype=np.int64)
+        # Identical channels, as in grey images saved as RGB, are coded once
+        same = next(
+            (i for i, plane in enumerate(planes) if np.array_equal(plane, pixels)),
+            None,
+        )
+        planes.append(pixels)
+        if same is not None:
+            header["channels"].append({"same_as": same})
+            checksums.append(checksums[same])
+            continue
+
+        if levels:
+            pixels, details[index] = decompose(pixels, levels)
+        channel_options = dict(options, width=pixels.shape[1])
+        if static_codebooks is not None:
+            channel_options["static_codebook"] = static_codebooks.lookup(
+                predictor, CHANNEL_NAMES[index]
+            )
+        decoded = planes[index]
+        if max_error:
+            entry, decoded = encode_near_lossless_plane(
+                pixels,
+                sections,
+                mode,
+                predictor,
+                tile_size,
+                modulus,
+                max_error,
+                channel_options,
+            )
+        else:
+            entry = encode_plane(
+                pixels, sections, mode, predictor, tile_size, modulus, channel_options
+            )
+        header["channels"].append(entry)
+        # Near-lossless planes decode to their reconstruction, not the original
+        checksums.append(plane_checksum(decoded, modulus))
+
+    if levels:
+        # Every level only needs the sections before it, so a prefix of the
+        # file decodes to a smaller image
+        header["pyramid"] = {
+            "sizes": level_sizes([image.size[1], image.size[0]], levels),
+            "level_ends": [len(sections)],
+        }
+        header["details"] = []
+        for level in range(levels):
+            header["details"].append(
+                [
+                    (
+                        {"same_as": entry["same_as"]}
+                        if "same_as" in entry
+                        else [
+                            encode_channel(zigzag(band).ravel(), sections, {})
+                            for band in details[index][level]
+                        ]
+                    )
+                    for index, entry in enumerate(header["channels"])
+                ]
+            )
+            header["pyramid"]["level_ends"].append(len(sections))
+
+    if max_error:
+        header["max_error"] = max_error
+    # Checksums of the decoded pixels let verify_image confirm a decode
+    header["pixel_checksums"] = checksums
+    return write_container(header, sections)
+
+
+def encode_plane(pixels, sections, mode, predictor, tile_size, modulus, options):
+    entry = {"coder": mode}
+    if predictor is not None:
+        pixels, choices = apply_prediction(pixels, predictor, tile_size, modulus)
+        entry["predictor"] = {
+            "tile_size": tile_size,
+            "choices": add_section(sections, choices.tobytes()),
+        }
+    encode, _ = CHANNEL_CODERS[mode]
+    entry.update(encode(pixels.ravel(), sections, options))
+    return entry
+
+
+def encode_near_lossless_plane(
+    pixels, sections, mode, predictor, tile_size, modulus, max_error, options
+):
+    # Predictors are still chosen on the original pixels, but the residuals
+    # are taken against the reconstruction the decoder will see
+    _, choices = apply_prediction(pixels, predictor or "none", tile_size, modulus)
+    symbols, decoded = quantize_prediction(
+        pixels, choices, tile_size, modulus, max_error
+    )
+    entry = {
+        "coder": mode,
+        "predictor": {
+            "tile_size": tile_size,
+            "choices": add_section(sections, choices.tobytes()),
+            "max_error": max_error,
+        },
+    }
+    encode, _ = CHANNEL_CODERS[mode]
+    options = dict(options, alphabet_size=quantization_range(modulus, max_error))
+    entry.update(encode(symbols.ravel(), sections, options))
+    return entry, decoded
+
+
+def decode_plane(entry, sections, options, size, modulus):
+    height, width = size
+    _, decode = CHANNEL_CODERS[entry["coder"]]
+    pixels = decode(entry, sections, dict(options, width=width)).reshape(height, width)
+    if "predictor" in entry:
+        pixels = reconstruct(
+            pixels,
+            predictor_choices(entry, sections, height),
+            entry["predictor"]["tile_size"],
+            modulus,
+            entry["predictor"].get("max_error", 0),
+        )
+    return pixels
+
+
+def predictor_choices(entry, sections, height):
+    tile_size = entry["predictor"]["tile_size"]
+    choices = np.frombuffer(sections[entry["predictor"]["choices"]], np.uint8)
+    if tile_size is not None:
+        choices = choices.reshape(-(-height // tile_size), -1)
+    return choices
+
+
+def available_level(data):
+    # Highest resolution level a possibly truncated progressive file holds
+    header, sections = read_container(data, partial=True)
+    if "pyramid" not in header:
+        raise ValueError("Container has no resolution levels")
+    complete = next(
+        (i for i, section in enumerate(sections) if section is None), len(sections)
+    )
+    levels = [
+        level
+        for level, end in enumerate(header["pyramid"]["level_ends"])
+        if end <= complete
+    ]
+    if not levels:
+        raise ValueError("Not enough data for a preview")
+    return levels[-1]
+
+
+def level_sizes_of(header):
+    width, height = header["size"]
+    return header.get("pyramid", {}).get("sizes", [[height, width]])
+
+
+def decode_options(header, codebook_store, static_codebooks, workers):
+    return {
+        "codebook_store": codebook_store,
+        "static_codebooks": static_codebooks,
+        "workers": workers,
+        "alphabet_size": 1 << mode_bit_depth(header["mode"]),
+    }
+
+
+def decode_channel_plane(header, sections, options, index, level):
+    sizes = level_sizes_of(header)
+    modulus = options["alphabet_size"]
+    pixels = decode_plane(
+        header["channels"][index], sections, options, sizes[0], modulus
+    )
+    for detail_level, size in enumerate(sizes[1 : level + 1]):
+        band_size = [-(-size[0] // 2), -(-size[1] // 2)]
+        pixels = recompose_level(
+            pixels,
+            [
+                unzigzag(decode_channel(band, sections, {})).reshape(band_size)
+                for band in header["details"][detail_level][index]
+            ],
+            size,
+        )
+    return pixels
+
+
+def plane_checksum(pixels, modulus):
+    dtype = "<u2" if modulus > 256 else "u1"
+    return zlib.crc32(np.ascontiguousarray(pixels, dtype=dtype).tobytes())
+
+
+def decode_image(
+    data, codebook_store=None, static_codebooks=None, workers=None, level=None
+):
+    # With a level, only that resolution of a progressive file is decoded, and
+    # data may be a prefix of the file
+    header, sections = read_container(data, partial=level is not None)
+    if header.get("kind") == "sequence":
+        raise ValueError("Sequence containers are decoded with decode_sequence")
+    if header.get("kind") == "batch":
+        raise ValueError("Batch containers are decoded with decode_batch")
+    if level is not None and "pyramid" not in header:
+        raise ValueError("Container has no resolution levels")
+    sizes = level_sizes_of(header)
+    if level is None:
+        level = len(sizes) - 1
+    options = decode_options(header, codebook_store, static_codebooks, workers)
+
+    planes = []
+    for index, entry in enumerate(header["channels"]):
+        if "same_as" in entry:
+            planes.append(planes[entry["same_as"]])
+        else:
+            planes.append(decode_channel_plane(header, sections, options, index, level))
+    height, width = sizes[level]
+
+    if header["mode"] == "P":
+        image = Image.frombytes(
+            "P", (width, height), planes[0].astype(np.uint8).tobytes()
+        )
+        image.putpalette(sections[header["palette"]], header["palette_mode"])
+        transparency = header.get("transparency")
+        if transparency is not None:
+            image.info["transparency"] = (
+                bytes(transparency) if isinstance(transparency, list) else transparency
+            )
+        return image
+    dtype = np.uint16 if options["alphabet_size"] > 256 else np.uint8
+    return merge_image_channels(
+        *[Image.fromarray(plane.astype(dtype)) for plane in planes],
+        mode=header["mode"],
+    )
+
+
+def referenced_codebooks(entry):
+    # IDs of the shared codebooks a header refers to, nested entries included
+    if isinstance(entry, list):
+        return [
+            codebook_id for item in entry for codebook_id in referenced_codebooks(item)
+        ]
+    if not isinstance(entry, dict):
+        return []
+    codebook_ids = [entry["codebook_id"]] if "codebook_id" in entry else []
+    return codebook_ids + referenced_codebooks(list(entry.values()))
+
+
+def release_codebooks(data, codebook_store):
+    # Called when a container is deleted, so that the shared codebooks only it
+    # referred to can be evicted again
+    header, _ = read_container(data)
+    for codebook_id in referenced_codebooks(header.get("channels", [])):
+        codebook_store.release(codebook_id)
+
+
+def verify_channel(data, index, codebook_store=None, static_codebooks=None):
+    header, sections = read_container(data)
+    options = decode_options(header, codebook_store, static_codebooks, None)
+    try:
+        pixels = decode_channel_plane(
+            header, sections, options, index, len(level_sizes_of(header)) - 1
+        )
+    except (ValueError, KeyError) as error:
+        return f"channel {index} does not decode: {error}"
+    if plane_checksum(pixels, options["alphabet_size"]) != (
+        header["pixel_checksums"][index]
+    ):
+        return f"channel {index} pixels do not match their checksum"
+    return None
+
+
+def verify_image(
+    data, deep=False, codebook_store=None, static_codebooks=None, workers=None
+):
+    # The quick check only hashes the stored sections; the deep check also
+    # decodes every channel, in parallel, and compares pixel checksums
+    problems = [f"section {index} is corrupt" for index in verify_sections(data)]
+    if problems or not deep:
+        return problems
+    header, _ = read_container(data)
+    if "pixel_checksums" not in header:
+        raise ValueError("Container has no pixel checksums")
+
+    indices = [
+        index
+        for index, entry in enumerate(header["channels"])
+        if "same_as" not in entry
+    ]
+    if len(indices) == 1 or workers == 1:
+        results = [
+            verify_channel(data, index, codebook_store, static_codebooks)
+            for index in indices
+        ]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(
+                pool.map(
+                    verify_channel,
+                    [data] * len(indices),
+                    indices,
+                    [codebook_store] * len(indices),
+                    [static_codebooks] * len(indices),
+                )
+            )
+    return problems + [result for result in results if result is not None]
@@ -0,0 +1,100 @@
+import json
+import struct
+import zlib
+import numpy as np
+
+MAGIC = b"HUFC"
+VERSION = 1
+
+
+def add_section(sections, data):
+    sections.append(bytes(data))
+    return len(sections) - 1
+
+
+def write_container(header, sections):
+    header = dict(
+        header,
+        version=VERSION,
+        sections=[len(s) for s in sections],
+        checksums=[zlib.crc32(s) for s in sections],
+    )
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return b"".join(
+        [MAGIC, struct.pack("<I", len(header_bytes)), header_bytes, *sections]
+    )
+
+
+def read_container(data, partial=False):
+    # data may also be a memoryview of a memory-mapped file, so that sections
+    # are slices of it rather than copies
+    if data[:4] != MAGIC:
+        raise ValueError("Not a Huffman container")
+    (header_length,) = struct.unpack_from("<I", data, 4)
+    if len(data) < 8 + header_length:
+        raise ValueError("Container header is incomplete")
+    header = json.loads(bytes(data[8 : 8 + header_length]).decode("utf-8"))
+    if header.get("version") != VERSION:
+        raise ValueError(f"Unsupported container version: {header.get('version')}")
+
+    # A partial container is a prefix of a file; only the sections it holds
+    # completely are returned, the rest are None
+    sections = []
+    offset = 8 + header_length
+    for length in header["sections"]:
+        complete = offset + length <= len(data)
+        sections.append(data[offset : offset + length] if complete else None)
+        offset += length
+    if not partial and offset != len(data):
+        raise ValueError("Container size does not match its section table")
+    return header, sections
+
+
+def verify_sections(data):
+    # CRC32 of every section against the header, without decoding anything
+    header, sections = read_container(data)
+    if "checksums" not in header:
+        raise ValueError("Container has no checksums")
+    return [
+        index
+        for index, (section, checksum) in enumerate(zip(sections, header["checksums"]))
+        if zlib.crc32(section) != checksum
+    ]
+
+
+def section_offsets(data):
+    # Byte offset where each section ends, so a reader knows how much of a
+    # file it needs
+    (header_length,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8 : 8 + header_length].decode("utf-8"))
+    return (8 + header_length + np.cumsum([0] + header["sections"])).tolist()
+
+
+def pack_symbol_table(values_by_symbol, value_dtype):
+    symbols = np.array(sorted(values_by_symbol), dtype=np.uint64)
+    values = np.array(
+        [values_by_symbol[s] for s in sorted(values_by_symbol)], dtype=value_dtype
+    )
+    # Store symbols with the narrowest integer type that holds the alphabet
+    width = 1
+    while symbols.size and int(symbols.max()) >> (8 * width):
+        width *= 2
+    symbols = symbols.astype(f"<u{width}")
+    return struct.pack("<IB", len(values), width) + symbols.tobytes() + values.tobytes()
+
+
+def unpack_symbol_table(data, value_dtype):
+    count, width = struct.unpack_from("<IB", data, 0)
+    symbols = np.frombuffer(data, dtype=f"<u{width}", count=count, offset=5)
+    values = np.frombuffer(
+        data, dtype=value_dtype, count=count, offset=5 + count * width
+    )
+    return dict(zip(symbols.tolist(), values.tolist()))
+
+
+def pack_code_lengths(code_lengths):
+    return pack_symbol_table(code_lengths, np.uint8)
+
+
+def unpack_code_lengths(data):
+    return unpack_symbol_table(data, np.uint8)
@@ -0,0 +1,78 @@
+import numpy as np
+from bisect import bisect_left
+from huffman import (
+    build_code_lengths,
+    canonical_codes,
+    encode_symbols,
+    build_symbol_decoder,
+    decode_symbol_at,
+)
+from prediction import neighbours
+
+# Context switches happen on every symbol, so decode tables stay small
+DECODE_TABLE_BITS = 11
+
+
+def activity(values):
+    # Causal gradient: how much the left and up neighbours differ from the
+    # upper-left one
+    a, b, c = neighbours(values)
+    return np.abs(a - c) + np.abs(b - c)
+
+
+def context_thresholds(activities, contexts):
+    # Quantiles split the pixels into buckets of similar size
+    quantiles = np.quantile(
+        activities, np.arange(1, contexts) / contexts, method="lower"
+    )
+    return sorted(set(int(q) for q in quantiles))
+
+
+def encode_with_contexts(values, contexts):
+    values = np.asarray(values, dtype=np.int64)
+    activities = activity(values)
+    thresholds = context_thresholds(activities, contexts)
+    buckets = np.searchsorted(thresholds, activities.ravel(), side="left")
+
+    # A single histogram pass counts every (context, value) pair at once
+    alphabet_size = int(values.max()) + 1
+    combined = buckets * alphabet_size + values.ravel()
+    histogram = np.bincount(combined, minlength=(len(thresholds) + 1) * alphabet_size)
+    histogram = histogram.reshape(-1, alphabet_size)
+
+    code_lengths = {}
+    combined_codes = {}
+    for bucket, counts in enumerate(histogram):
+        present = np.nonzero(counts)[0]
+        if present.size == 0:
+            continue
+        code_lengths[bucket] = build_code_lengths(
+            dict(zip(present.tolist(), counts[present].tolist()))
+        )
+        for symbol, code in canonical_codes(code_lengths[bucket]).items():
+            combined_codes[bucket * alphabet_size + symbol] = code
+
+    payload, nbits = encode_symbols(combined, combined_codes)
+    return thresholds, code_lengths, payload, nbits
+
+
+def decode_with_contexts(payload, nbits, thresholds, code_lengths, width, count):
+    decoders = {
+        bucket: build_symbol_decoder(canonical_codes(lengths), DECODE_TABLE_BITS)
+        for bucket, lengths in code_lengths.items()
+    }
+    decoded = [0] * count
+    position = 0
+    for index in range(count):
+        x = index % width
+        up = index - width
+        a = decoded[index - 1] if x else 0
+        b = decoded[up] if up >= 0 else 0
+        c = decoded[up - 1] if x and up >= 0 else 0
+        bucket = bisect_left(thresholds, abs(a - c) + abs(b - c))
+        decoded[index], length = decode_symbol_at(payload, position, decoders[bucket])
+        position += length
+
+    if position != nbits:
+        raise ValueError("Decoded data does not match the expected image size")
+    return np.array(decoded, dtype=np.int64)
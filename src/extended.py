@@ -0,0 +1,61 @@
+import numpy as np
+
+VALUE_BITS = 8
+# Symbols below this are single values; above it, packed groups of values
+GROUP_BASE = 1 << VALUE_BITS
+# A packed group plus GROUP_BASE has to fit in an int64
+MAX_GROUP_SIZE = 64 // VALUE_BITS - 1
+
+
+def check_group_size(group_size):
+    if not 1 <= group_size <= MAX_GROUP_SIZE:
+        raise ValueError(f"The group size must be between 1 and {MAX_GROUP_SIZE}")
+
+
+def group_symbols(symbols, group_size=2, max_groups=4096, min_count=4):
+    check_group_size(group_size)
+    symbols = np.asarray(symbols, dtype=np.int64).ravel()
+    if symbols.size and symbols.max() >= GROUP_BASE:
+        raise ValueError("Grouped coding needs 8-bit values")
+
+    # Only groups aligned on multiples of group_size are considered, which
+    # keeps the parse vectorized
+    aligned = symbols.size - symbols.size % group_size
+    packed = np.zeros(aligned // group_size, dtype=np.int64)
+    for offset in range(group_size):
+        packed = (packed << VALUE_BITS) | symbols[offset:aligned:group_size]
+
+    values, counts = np.unique(packed, return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:max_groups]
+    frequent = np.sort(values[order][counts[order] >= min_count])
+    is_group = np.isin(packed, frequent)
+
+    # Rare groups fall back to their single values
+    lengths = np.where(is_group, 1, group_size)
+    lengths = np.append(lengths, np.ones(symbols.size - aligned, dtype=np.int64))
+    starts = np.cumsum(lengths) - lengths
+    extended = np.empty(int(lengths.sum()), dtype=np.int64)
+    group_starts = starts[: packed.size]
+    extended[group_starts[is_group]] = GROUP_BASE + packed[is_group]
+    for offset in range(group_size):
+        extended[group_starts[~is_group] + offset] = symbols[offset:aligned:group_size][
+            ~is_group
+        ]
+    extended[starts[packed.size :]] = symbols[aligned:]
+    return extended
+
+
+def ungroup_symbols(extended, group_size=2):
+    extended = np.asarray(extended, dtype=np.int64)
+    is_group = extended >= GROUP_BASE
+    lengths = np.where(is_group, group_size, 1)
+    starts = np.cumsum(lengths) - lengths
+
+    # Every group expands to all of its pixels at once
+    symbols = np.empty(int(lengths.sum()), dtype=np.int64)
+    symbols[starts[~is_group]] = extended[~is_group]
+    packed = extended[is_group] - GROUP_BASE
+    for offset in range(group_size):
+        shift = VALUE_BITS * (group_size - 1 - offset)
+        symbols[starts[is_group] + offset] = (packed >> shift) & (GROUP_BASE - 1)
+    return symbols
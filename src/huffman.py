@@ -1,6 +1,7 @@
 import heapq
+import os
 from collections import Counter
-from PIL import Image
+import numpy as np
 import math
 
 
@@ -77,7 +78,21 @@ def huffman_encode(data):
     return huffman_codes, huffman_tree, frequencies, steps, encoded_data
 
 
-def huffman_decode(encoded_data, huffman_tree, image_size):
+def jit_kernels():
+    # The compiled kernels when they are enabled, else None for pure Python
+    import kernels
+
+    return kernels if kernels.ENABLED else None
+
+
+def walk_tree(encoded_data, huffman_tree):
+    kernels = jit_kernels()
+    if kernels is not None:
+        left, right, leaves, symbols = kernels.tree_arrays(huffman_tree)
+        bits = np.frombuffer(encoded_data.encode("ascii"), np.uint8) - ord("0")
+        decoded = kernels.walk_tree_kernel(bits, left, right, leaves)
+        return [symbols[leaf] for leaf in decoded.tolist()]
+
     decoded_pixels = []
     node = huffman_tree
     for bit in encoded_data:
@@ -89,6 +104,11 @@ def huffman_decode(encoded_data, huffman_tree, image_size):
         if node.symbol is not None:
             decoded_pixels.append(node.symbol)
             node = huffman_tree
+    return decoded_pixels
+
+
+def huffman_decode(encoded_data, huffman_tree, image_size):
+    decoded_pixels = walk_tree(encoded_data, huffman_tree)
 
     expected_size = image_size[0] * image_size[1]
     decoded_size = len(decoded_pixels)
@@ -103,23 +123,15 @@ def huffman_decode(encoded_data, huffman_tree, image_size):
         )  # Print last 100 decoded pixels for debugging
         raise ValueError("Decoded data does not match the expected image size")
 
+    from PIL import Image
+
     decoded_image = Image.new("L", image_size)
     decoded_image.putdata(decoded_pixels)
     return decoded_image
 
 
 def tuple_huffman_decode(encoded_data, huffman_tree, image_size):
-    decoded_pixels = []
-    node = huffman_tree
-    for bit in encoded_data:
-        if bit == "0":
-            node = node.left
-        else:
-            node = node.right
-
-        if node.symbol is not None:
-            decoded_pixels.append(node.symbol)
-            node = huffman_tree
+    decoded_pixels = walk_tree(encoded_data, huffman_tree)
 
     expected_size = image_size[0] * image_size[1]
     decoded_size = len(decoded_pixels)
@@ -162,3 +174,398 @@ def calculate_efficiency(frequencies, code_map):
     avg_length = calculate_average_length(code_map, frequencies, total_symbols)
     efficiency = entropy / avg_length if avg_length != 0 else 0
     return entropy, avg_length, efficiency
+
+
+def calculate_sampling_penalty(frequencies, code_map):
+    # Extra bits per symbol of a code built from approximate counts, against
+    # the code the exact counts would give
+    total_symbols = sum(frequencies.values())
+    exact_map = build_codes(build_huffman_tree(frequencies), "", {})
+    return calculate_average_length(
+        code_map, frequencies, total_symbols
+    ) - calculate_average_length(exact_map, frequencies, total_symbols)
+
+
+# Pixels per histogram chunk when counting in parallel
+HISTOGRAM_CHUNK_SIZE = 1 << 24
+
+
+def histogram_arrays(symbols):
+    # A dense count covers 8-bit channels and packed 24-bit tuples alike
+    if symbols.size and symbols.max() < 1 << 24:
+        counts = np.bincount(symbols)
+        values = np.nonzero(counts)[0]
+        return values, counts[values]
+    return np.unique(symbols, return_counts=True)
+
+
+def count_chunk(name, size, dtype, start, stop):
+    from multiprocessing import shared_memory
+
+    memory = shared_memory.SharedMemory(name=name)
+    symbols = np.ndarray(size, dtype, buffer=memory.buf)
+    try:
+        return histogram_arrays(symbols[start:stop])
+    finally:
+        del symbols
+        memory.close()
+
+
+# Worker pools are started once per worker count and reused by later calls
+histogram_pools = {}
+
+
+def histogram_pool(workers):
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers not in histogram_pools:
+        histogram_pools[workers] = ProcessPoolExecutor(workers)
+    return histogram_pools[workers]
+
+
+def histogram_workers(workers):
+    # More workers than cores only adds start-up and copying costs
+    return min(workers or 1, os.cpu_count() or 1)
+
+
+def parallel_histogram(symbols, workers=None, chunk_size=HISTOGRAM_CHUNK_SIZE):
+    # Process pools and shared memory are only imported when they are used,
+    # so the codec core stays quick to import
+    from multiprocessing import shared_memory
+
+    # Workers count slices of one shared buffer, so the pixels are never
+    # pickled; only the small partial histograms come back. The copy into it
+    # uses the narrowest type that holds the values
+    if symbols.size and symbols.min() >= 0:
+        dtype = np.min_scalar_type(int(symbols.max()))
+    else:
+        dtype = symbols.dtype
+    memory = shared_memory.SharedMemory(
+        create=True, size=max(symbols.size * dtype.itemsize, 1)
+    )
+    try:
+        shared = np.ndarray(symbols.size, dtype, buffer=memory.buf)
+        shared[:] = symbols
+        del shared
+        executor = histogram_pool(workers)
+        futures = [
+            executor.submit(
+                count_chunk,
+                memory.name,
+                symbols.size,
+                dtype.str,
+                start,
+                start + chunk_size,
+            )
+            for start in range(0, symbols.size, chunk_size)
+        ]
+        partials = [future.result() for future in futures]
+    finally:
+        memory.close()
+        memory.unlink()
+
+    # Partial histograms are merged by symbol
+    values, inverse = np.unique(
+        np.concatenate([values for values, _ in partials]), return_inverse=True
+    )
+    counts = np.zeros(values.size, dtype=np.int64)
+    np.add.at(counts, inverse, np.concatenate([counts for _, counts in partials]))
+    return values, counts
+
+
+def count_frequencies(symbols, workers=None):
+    symbols = np.ascontiguousarray(symbols).ravel()
+    workers = histogram_workers(workers)
+    if workers > 1 and symbols.size > HISTOGRAM_CHUNK_SIZE:
+        values, counts = parallel_histogram(symbols, workers)
+    else:
+        values, counts = histogram_arrays(symbols)
+    return Counter(dict(zip(values.tolist(), counts.tolist())))
+
+
+def pack_tuples(pixels):
+    pixels = np.asarray(pixels, dtype=np.uint32).reshape(-1, 3)
+    return (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+
+
+def tuple_frequencies(image, workers=None):
+    # RGB tuples are counted as packed 24-bit integers and unpacked at the end
+    packed = pack_tuples(np.asarray(image.convert("RGB")))
+    return Counter(
+        {
+            (value >> 16, (value >> 8) & 0xFF, value & 0xFF): count
+            for value, count in count_frequencies(packed, workers).items()
+        }
+    )
+
+
+def build_code_lengths(frequencies):
+    huffman_tree = build_huffman_tree(frequencies)
+    code_map = build_codes(huffman_tree, "", {})
+    # A single-symbol alphabet still needs one bit per symbol to be decodable
+    return {symbol: max(len(code), 1) for symbol, code in code_map.items()}
+
+
+def canonical_codes(code_lengths):
+    codes = {}
+    code = 0
+    previous_length = 0
+    for symbol, length in sorted(code_lengths.items(), key=lambda x: (x[1], x[0])):
+        code <<= length - previous_length
+        codes[symbol] = (code, length)
+        code += 1
+        previous_length = length
+    return codes
+
+
+def encode_symbols(symbols, codes, chunk_size=1 << 20):
+    symbols = np.asarray(symbols).ravel()
+    table_symbols = np.array(sorted(codes), dtype=np.int64)
+    table_values = np.array([codes[s][0] for s in sorted(codes)], dtype=np.uint64)
+    table_lengths = np.array([codes[s][1] for s in sorted(codes)], dtype=np.int64)
+    max_length = int(table_lengths.max())
+    kernels = jit_kernels()
+    if kernels is not None:
+        index = np.searchsorted(table_symbols, symbols)
+        nbits = int(table_lengths[index].sum())
+        payload = kernels.encode_kernel(
+            index, table_values.astype(np.int64), table_lengths, nbits
+        )
+        return payload.tobytes(), nbits
+    positions = np.arange(max_length)
+
+    bit_chunks = []
+    for start in range(0, symbols.size, chunk_size):
+        index = np.searchsorted(table_symbols, symbols[start : start + chunk_size])
+        values = table_values[index][:, None]
+        shifts = table_lengths[index][:, None] - 1 - positions
+        valid = shifts >= 0
+        bits = (values >> np.maximum(shifts, 0).astype(np.uint64)) & np.uint64(1)
+        bit_chunks.append(bits[valid].astype(np.uint8))
+
+    bits = np.concatenate(bit_chunks) if bit_chunks else np.zeros(0, np.uint8)
+    return np.packbits(bits).tobytes(), int(bits.size)
+
+
+def build_decode_table(codes, table_bits=None):
+    max_length = max(length for _, length in codes.values())
+    if table_bits is None:
+        table_bits = min(max_length, 16)
+    table_symbols = [None] * (1 << table_bits)
+    table_lengths = [0] * (1 << table_bits)
+    for symbol, (code, length) in codes.items():
+        if length > table_bits:
+            continue
+        start = code << (table_bits - length)
+        for window in range(start, start + (1 << (table_bits - length))):
+            table_symbols[window] = symbol
+            table_lengths[window] = length
+    return table_symbols, table_lengths, table_bits
+
+
+def read_bits(buffer, position, length):
+    start = position >> 3
+    end = (position + length + 7) >> 3
+    value = int.from_bytes(buffer[start:end], "big")
+    value <<= 8 * (end - start) - len(buffer[start:end]) * 8
+    return (value >> (end * 8 - position - length)) & ((1 << length) - 1)
+
+
+def build_symbol_decoder(codes, max_table_bits=16):
+    max_length = max(length for _, length in codes.values())
+    table_symbols, table_lengths, table_bits = build_decode_table(
+        codes, min(max_length, max_table_bits)
+    )
+    long_codes = {
+        (code, length): symbol
+        for symbol, (code, length) in codes.items()
+        if length > table_bits
+    }
+    long_lengths = sorted({length for _, length in long_codes})
+    return table_symbols, table_lengths, table_bits, long_codes, long_lengths
+
+
+def decode_symbol_at(buffer, position, decoder):
+    table_symbols, table_lengths, table_bits, long_codes, long_lengths = decoder
+    window = read_bits(buffer, position, table_bits)
+    length = table_lengths[window]
+    if length:
+        return table_symbols[window], length
+    for length in long_lengths:
+        key = (read_bits(buffer, position, length), length)
+        if key in long_codes:
+            return long_codes[key], length
+    raise ValueError("Invalid code in the encoded data")
+
+
+def iter_symbols(payload, nbits, codes, count, chunk_size):
+    # Yields the decoded symbols chunk_size at a time, so a caller can consume
+    # a long stream without holding all of it
+    table_symbols, table_lengths, table_bits = build_decode_table(codes)
+    kernels = jit_kernels()
+    if kernels is not None:
+        arrays = kernels.decode_arrays(codes, table_symbols, table_lengths)
+        data = np.frombuffer(payload, np.uint8)
+        position = 0
+        for start in range(0, count, chunk_size):
+            decoded, position = kernels.decode_kernel(
+                data,
+                nbits,
+                position,
+                min(chunk_size, count - start),
+                arrays[0],
+                arrays[1],
+                table_bits,
+                *arrays[2:],
+            )
+            yield decoded
+        return
+
+    # Codes longer than the table are resolved bit by bit through this map
+    long_codes = {
+        (code, length): symbol
+        for symbol, (code, length) in codes.items()
+        if length > table_bits
+    }
+    mask = (1 << table_bits) - 1
+
+    buffer = 0
+    buffered = 0
+    position = 0
+    consumed = 0
+    for start in range(0, count, chunk_size):
+        target = min(chunk_size, count - start)
+        decoded = []
+        while len(decoded) < target:
+            while buffered < table_bits and position < len(payload):
+                buffer = (buffer << 8) | payload[position]
+                position += 1
+                buffered += 8
+            if buffered >= table_bits:
+                window = (buffer >> (buffered - table_bits)) & mask
+            else:
+                window = (buffer << (table_bits - buffered)) & mask
+            length = table_lengths[window]
+            if length:
+                decoded.append(table_symbols[window])
+            else:
+                code, length = window, table_bits
+                while (code, length) not in long_codes:
+                    length += 1
+                    while buffered < length and position < len(payload):
+                        buffer = (buffer << 8) | payload[position]
+                        position += 1
+                        buffered += 8
+                    if buffered < length:
+                        raise ValueError("Encoded data ended in the middle of a symbol")
+                    code = (buffer >> (buffered - length)) & ((1 << length) - 1)
+                decoded.append(long_codes[(code, length)])
+            consumed += length
+            if consumed > nbits:
+                raise ValueError("Decoded data does not match the expected image size")
+            buffered -= length
+            buffer &= (1 << buffered) - 1
+
+        yield decoded
+
+
+def decode_symbols(payload, nbits, codes, count):
+    return next(iter_symbols(payload, nbits, codes, count, max(count, 1)), [])
+
+
+# Below this many substreams, decoding them one after the other beats
+# advancing them in lockstep with NumPy
+LOCKSTEP_MIN_STREAMS = 64
+
+
+def encode_interleaved(symbols, codes, streams):
+    # Symbol i goes to substream i % streams
+    symbols = np.asarray(symbols).ravel()
+    encoded = [
+        encode_symbols(symbols[stream::streams], codes) for stream in range(streams)
+    ]
+    return [payload for payload, _ in encoded], [nbits for _, nbits in encoded]
+
+
+def decode_lockstep(payloads, nbits, codes, count):
+    streams = len(payloads)
+    ordered = sorted(codes, key=lambda symbol: (codes[symbol][1], symbol))
+    max_length = codes[ordered[-1]][1]
+    if max_length > 56:
+        raise ValueError("Codes are too long for lockstep decoding")
+
+    table_symbols, table_lengths, table_bits = build_decode_table(codes)
+    symbol_index = {symbol: index for index, symbol in enumerate(ordered)}
+    table_index = np.array(
+        [-1 if symbol is None else symbol_index[symbol] for symbol in table_symbols]
+    )
+    table_lengths = np.array(table_lengths)
+
+    # Canonical ranges resolve the codes that do not fit in the table
+    long_ranges = []
+    for length in sorted({length for _, length in codes.values()}):
+        if length > table_bits:
+            members = [s for s in ordered if codes[s][1] == length]
+            first = codes[members[0]][0]
+            long_ranges.append((length, first, len(members), symbol_index[members[0]]))
+
+    buffer = np.frombuffer(b"".join(payloads) + bytes(8), dtype=np.uint8)
+    buffer = buffer.astype(np.uint64)
+    starts = np.cumsum([0] + [len(payload) * 8 for payload in payloads[:-1]])
+    positions = np.array(starts, dtype=np.int64)
+    byte_shifts = np.arange(56, -8, -8, dtype=np.uint64)
+
+    decoded = np.empty(count, dtype=np.int64)
+    for step in range(-(-count // streams)):
+        active = min(streams, count - step * streams)
+        position = positions[:active]
+        byte_positions = (position >> 3)[:, None] + np.arange(8)
+        window = np.bitwise_or.reduce(buffer[byte_positions] << byte_shifts, axis=1)
+        window <<= (position & 7).astype(np.uint64)
+
+        slots = (window >> np.uint64(64 - table_bits)).astype(np.int64)
+        index = table_index[slots]
+        length = table_lengths[slots]
+        for code_length, first, size, first_index in long_ranges:
+            code = (window >> np.uint64(64 - code_length)).astype(np.int64) - first
+            hit = (length == 0) & (code >= 0) & (code < size)
+            index[hit] = first_index + code[hit]
+            length[hit] = code_length
+
+        decoded[step * streams : step * streams + active] = index
+        positions[:active] += length
+
+    if not np.array_equal(positions - starts, nbits):
+        raise ValueError("Decoded data does not match the expected image size")
+    return np.array(ordered)[decoded]
+
+
+def decode_interleaved(payloads, nbits, codes, count, workers=None):
+    streams = len(payloads)
+    if workers is None and streams >= LOCKSTEP_MIN_STREAMS:
+        return decode_lockstep(payloads, nbits, codes, count)
+
+    counts = [len(range(stream, count, streams)) for stream in range(streams)]
+    if workers is None:
+        parts = map(decode_symbols, payloads, nbits, [codes] * streams, counts)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(
+                pool.map(decode_symbols, payloads, nbits, [codes] * streams, counts)
+            )
+
+    decoded = np.empty(count, dtype=np.int64)
+    for stream, part in enumerate(parts):
+        decoded[stream::streams] = part
+    return decoded
+
+
+def encoded_bits(frequencies, code_lengths):
+    bits = 0
+    for symbol, freq in frequencies.items():
+        if symbol not in code_lengths:
+            return math.inf
+        bits += freq * code_lengths[symbol]
+    return bits
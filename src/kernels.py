@@ -0,0 +1,162 @@
+import os
+import numpy as np
+
+# Numba is optional: without it, or with HUFFMAN_JIT=0, callers keep their pure
+# Python loops, and the kernels below stay plain (slow) Python functions that
+# the jit benchmark can still check against those loops
+try:
+    if os.environ.get("HUFFMAN_JIT", "1") == "0":
+        raise ImportError
+    import numba
+except ImportError:
+    numba = None
+
+JIT_AVAILABLE = numba is not None
+# Callers use the kernels while this is set; the jit benchmark flips it to
+# compare both paths
+ENABLED = JIT_AVAILABLE
+
+
+def jit(function):
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+@jit
+def peek_bits(payload, position, width):
+    # Up to 25 bits from any bit position, reading zeros past the end
+    start = position >> 3
+    value = np.int64(0)
+    for offset in range(4):
+        value <<= 8
+        if start + offset < payload.size:
+            value |= np.int64(payload[start + offset])
+    return (value >> (32 - (position & 7) - width)) & ((1 << width) - 1)
+
+
+@jit
+def decode_kernel(
+    payload,
+    nbits,
+    position,
+    count,
+    table_symbols,
+    table_lengths,
+    table_bits,
+    first_codes,
+    first_indices,
+    length_counts,
+    sorted_symbols,
+):
+    # Short codes come from the lookup table; longer ones are walked one bit at
+    # a time through the canonical code ranges of each length
+    decoded = np.empty(count, dtype=np.int64)
+    max_length = length_counts.size - 1
+    for index in range(count):
+        window = peek_bits(payload, position, table_bits)
+        length = table_lengths[window]
+        if length:
+            symbol = table_symbols[window]
+        else:
+            code = window
+            length = table_bits
+            symbol = -1
+            while symbol < 0:
+                length += 1
+                if length > max_length:
+                    raise ValueError("Invalid code in the encoded data")
+                code = (code << 1) | peek_bits(payload, position + length - 1, 1)
+                offset = code - first_codes[length]
+                if 0 <= offset and offset < length_counts[length]:
+                    symbol = sorted_symbols[first_indices[length] + offset]
+        position += length
+        if position > nbits:
+            raise ValueError("Decoded data does not match the expected image size")
+        decoded[index] = symbol
+    return decoded, position
+
+
+@jit
+def encode_kernel(indices, code_values, code_lengths, nbits):
+    # Packs the code of every symbol MSB first, as np.packbits would
+    payload = np.zeros((nbits + 7) >> 3, dtype=np.uint8)
+    buffer = np.int64(0)
+    buffered = 0
+    written = 0
+    for index in indices:
+        length = code_lengths[index]
+        buffer = (buffer << length) | code_values[index]
+        buffered += length
+        while buffered >= 8:
+            buffered -= 8
+            payload[written] = (buffer >> buffered) & 0xFF
+            written += 1
+        buffer &= (np.int64(1) << buffered) - 1
+    if buffered:
+        payload[written] = (buffer << (8 - buffered)) & 0xFF
+    return payload
+
+
+@jit
+def walk_tree_kernel(bits, left, right, leaves):
+    # Tree walk over 0/1 bytes; returns the leaf number of every symbol
+    decoded = np.empty(bits.size, dtype=np.int64)
+    count = 0
+    node = 0
+    for bit in bits:
+        node = right[node] if bit else left[node]
+        if leaves[node] >= 0:
+            decoded[count] = leaves[node]
+            count += 1
+            node = 0
+    return decoded[:count]
+
+
+def decode_arrays(codes, table_symbols, table_lengths):
+    # Array form of a canonical code for decode_kernel
+    max_length = max(length for _, length in codes.values())
+    ordered = sorted(codes, key=lambda symbol: (codes[symbol][1], symbol))
+    first_codes = np.zeros(max_length + 1, dtype=np.int64)
+    first_indices = np.zeros(max_length + 1, dtype=np.int64)
+    length_counts = np.zeros(max_length + 1, dtype=np.int64)
+    for index, symbol in enumerate(ordered):
+        code, length = codes[symbol]
+        if length_counts[length] == 0:
+            first_codes[length] = code
+            first_indices[length] = index
+        length_counts[length] += 1
+    return (
+        np.array([-1 if s is None else s for s in table_symbols], dtype=np.int64),
+        np.array(table_lengths, dtype=np.int64),
+        first_codes,
+        first_indices,
+        length_counts,
+        np.array(ordered, dtype=np.int64),
+    )
+
+
+def tree_arrays(huffman_tree):
+    # Node 0 is the root; leaves hold the index of their symbol, inner nodes -1
+    left, right, leaves, symbols = [], [], [], []
+    stack = [(huffman_tree, None, None)]
+    while stack:
+        node, parent, side = stack.pop()
+        number = len(left)
+        left.append(0)
+        right.append(0)
+        if parent is not None:
+            (left if side == 0 else right)[parent] = number
+        if node.symbol is not None:
+            leaves.append(len(symbols))
+            symbols.append(node.symbol)
+        else:
+            leaves.append(-1)
+            stack.append((node.right, number, 1))
+            stack.append((node.left, number, 0))
+    return (
+        np.array(left, dtype=np.int64),
+        np.array(right, dtype=np.int64),
+        np.array(leaves, dtype=np.int64),
+        symbols,
+    )
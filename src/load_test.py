@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import time
+from service import percentile
+
+
+async def post(reader, writer, path, body):
+    writer.write(
+        (
+            f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, value = line.decode("latin-1").split(":", 1)
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(args, bodies, counter, results):
+    if args.unix is not None:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        while counter[0] < args.requests:
+            body = bodies[counter[0] % len(bodies)]
+            counter[0] += 1
+            start = time.perf_counter()
+            status, _ = await post(reader, writer, args.path, body)
+            results.append((status, time.perf_counter() - start))
+    finally:
+        writer.close()
+
+
+async def run(args):
+    bodies = []
+    for path in args.files:
+        with open(path, "rb") as f:
+            bodies.append(f.read())
+    counter = [0]
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[client(args, bodies, counter, results) for _ in range(args.concurrency)]
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for status, latency in results if status == 200]
+    rejected = sum(1 for status, _ in results if status == 503)
+    failed = len(results) - len(latencies) - rejected
+    print(
+        f"{len(results)} requests in {elapsed:.2f} s "
+        f"({len(latencies) / elapsed:.1f} requests/s), "
+        f"{rejected} rejected, {failed} failed"
+    )
+    print(
+        f"Latency p50 {percentile(latencies, 0.50) * 1000:.1f} ms, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load test the codec service")
+    parser.add_argument(
+        "files", nargs="+", help="Images to encode, or containers to decode"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None)
+    parser.add_argument(
+        "--path",
+        default="/encode",
+        help="Endpoint with its query, for example /encode?predictor=auto",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(run(build_parser().parse_args()))
@@ -0,0 +1,184 @@
+import numpy as np
+
+MIN_MATCH = 3
+MAX_MATCH = 258
+# Match lengths up to this are measured for every candidate at once; the few
+# matches that reach it are extended one by one while parsing
+SHORT_MATCH = 32
+
+
+def bucket_codes(values):
+    # Deflate-style buckets: values below 4 have their own code, larger ones
+    # share a code per half power of two plus extra bits for the offset
+    values = np.asarray(values, dtype=np.int64)
+    bits = np.frexp(np.maximum(values, 1))[1].astype(np.int64) - 1
+    large = values >= 4
+    widths = np.where(large, bits - 1, 0)
+    codes = np.where(large, 2 * bits + ((values >> np.maximum(widths, 0)) & 1), values)
+    return codes, widths, values & ((1 << widths) - 1)
+
+
+def bucket_widths(codes):
+    return np.where(codes >= 4, codes // 2 - 1, 0)
+
+
+def bucket_values(codes, extras):
+    widths = bucket_widths(codes)
+    bases = (2 | (codes & 1)) << np.maximum(widths, 0)
+    return np.where(codes >= 4, bases + extras, codes)
+
+
+def pack_bits(values, widths):
+    widths = np.asarray(widths, dtype=np.int64)
+    owners = np.repeat(np.arange(widths.size), widths)
+    starts = np.cumsum(widths) - widths
+    shifts = widths[owners] - 1 - (np.arange(owners.size) - starts[owners])
+    bits = (np.asarray(values, dtype=np.int64)[owners] >> shifts) & 1
+    return np.packbits(bits.astype(np.uint8)).tobytes()
+
+
+def unpack_bits(payload, widths):
+    widths = np.asarray(widths, dtype=np.int64)
+    owners = np.repeat(np.arange(widths.size), widths)
+    starts = np.cumsum(widths) - widths
+    shifts = widths[owners] - 1 - (np.arange(owners.size) - starts[owners])
+    bits = np.unpackbits(np.frombuffer(payload, np.uint8))[: owners.size]
+    weights = bits.astype(np.int64) << shifts
+    return np.bincount(owners, weights, minlength=widths.size).astype(np.int64)
+
+
+def match_lengths(symbols, positions, distances):
+    lengths = np.full(positions.size, MIN_MATCH, dtype=np.int64)
+    limit = np.minimum(symbols.size - positions, SHORT_MATCH)
+    active = np.flatnonzero(lengths < limit)
+    for offset in range(MIN_MATCH, SHORT_MATCH):
+        if active.size == 0:
+            break
+        ahead = positions[active] + offset
+        active = active[symbols[ahead] == symbols[ahead - distances[active]]]
+        lengths[active] += 1
+        active = active[lengths[active] < limit[active]]
+    return lengths
+
+
+def match_candidates(symbols, window, effort):
+    # A stable sort groups the positions that start with the same MIN_MATCH
+    # symbols in increasing order, like a hash chain; the `effort` nearest
+    # earlier positions within the window are tried for every position
+    base = int(symbols.max()) + 1 if symbols.size else 1
+    keys = (symbols[:-2] * base + symbols[1:-1]) * base + symbols[2:]
+    order = np.argsort(keys, kind="stable")
+    ordered_keys = keys[order]
+    best_length = np.zeros(symbols.size, dtype=np.int64)
+    best_distance = np.zeros(symbols.size, dtype=np.int64)
+    for depth in range(1, effort + 1):
+        same = ordered_keys[depth:] == ordered_keys[:-depth]
+        positions = order[depth:][same]
+        distances = positions - order[:-depth][same]
+        # Positions that already reached SHORT_MATCH cannot do better here
+        keep = (distances <= window) & (best_length[positions] < SHORT_MATCH)
+        positions, distances = positions[keep], distances[keep]
+        lengths = match_lengths(symbols, positions, distances)
+        # Ties keep the nearer match found at a smaller depth
+        better = lengths > best_length[positions]
+        best_length[positions[better]] = lengths[better]
+        best_distance[positions[better]] = distances[better]
+    return best_length, best_distance
+
+
+def extend_match(symbols, start, distance, length):
+    end = min(symbols.size, start + MAX_MATCH)
+    same = (
+        symbols[start + length : end]
+        == symbols[start + length - distance : end - distance]
+    )
+    mismatches = np.flatnonzero(~same)
+    return length + (int(mismatches[0]) if mismatches.size else same.size)
+
+
+def lz77_parse(symbols, window=32768, effort=4):
+    # Greedy parse: take the best match at each position, literals elsewhere
+    best_length, best_distance = match_candidates(symbols, window, effort)
+    candidates = np.flatnonzero(best_length >= MIN_MATCH)
+    starts, lengths, distances = [], [], []
+    position = index = 0
+    while index < candidates.size:
+        start = int(candidates[index])
+        if start < position:
+            index = int(np.searchsorted(candidates, position))
+            continue
+        length, distance = int(best_length[start]), int(best_distance[start])
+        # Lazy matching as in deflate: a longer match one position later wins,
+        # and this position becomes a literal
+        if length < SHORT_MATCH and start + 1 < symbols.size:
+            if best_length[start + 1] > length:
+                index += 1
+                continue
+        if length == SHORT_MATCH:
+            length = extend_match(symbols, start, distance, length)
+        starts.append(start)
+        lengths.append(length)
+        distances.append(distance)
+        position = start + length
+        index += 1
+    return (
+        np.array(starts, dtype=np.int64),
+        np.array(lengths, dtype=np.int64),
+        np.array(distances, dtype=np.int64),
+    )
+
+
+def lz77_encode(symbols, window=32768, effort=4):
+    symbols = np.asarray(symbols, dtype=np.int64).ravel()
+    starts, lengths, distances = lz77_parse(symbols, window, effort)
+
+    # Symbols inside a match are dropped; its first position becomes the
+    # length code, placed after the literal alphabet as in deflate
+    marks = np.zeros(symbols.size + 1, dtype=np.int64)
+    marks[starts] += 1
+    marks[starts + lengths] -= 1
+    is_start = np.zeros(symbols.size, dtype=bool)
+    is_start[starts] = True
+    positions = np.flatnonzero((np.cumsum(marks)[:-1] == 0) | is_start)
+    literals = int(symbols.max()) + 1 if symbols.size else 1
+    length_codes, length_widths, length_extras = bucket_codes(lengths - MIN_MATCH)
+    distance_codes, distance_widths, distance_extras = bucket_codes(distances - 1)
+    tokens = symbols[positions]
+    tokens[is_start[positions]] = literals + length_codes
+
+    # Extra bits follow each match in order: length first, then distance
+    extras = pack_bits(
+        np.column_stack([length_extras, distance_extras]).ravel(),
+        np.column_stack([length_widths, distance_widths]).ravel(),
+    )
+    return tokens, literals, distance_codes, extras
+
+
+def lz77_decode(tokens, literals, distance_codes, extras, count):
+    tokens = np.asarray(tokens, dtype=np.int64)
+    distance_codes = np.asarray(distance_codes, dtype=np.int64)
+    is_match = tokens >= literals
+    length_codes = tokens[is_match] - literals
+    widths = np.column_stack(
+        [bucket_widths(length_codes), bucket_widths(distance_codes)]
+    ).ravel()
+    extra_values = unpack_bits(extras, widths).reshape(-1, 2)
+    lengths = bucket_values(length_codes, extra_values[:, 0]) + MIN_MATCH
+    distances = bucket_values(distance_codes, extra_values[:, 1]) + 1
+
+    token_lengths = np.ones(tokens.size, dtype=np.int64)
+    token_lengths[is_match] = lengths
+    starts = np.cumsum(token_lengths) - token_lengths
+    symbols = np.zeros(count, dtype=np.int64)
+    symbols[starts[~is_match]] = tokens[~is_match]
+    # Matches may copy from earlier matches, so they are filled in order
+    for start, length, distance in zip(
+        starts[is_match].tolist(), lengths.tolist(), distances.tolist()
+    ):
+        source = start - distance
+        if distance >= length:
+            symbols[start : start + length] = symbols[source : source + length]
+        else:
+            # An overlapping copy repeats the last `distance` symbols
+            symbols[start : start + length] = np.resize(symbols[source:start], length)
+    return symbols
@@ -1,3 +1,4 @@
+import argparse
 import os
 from PIL import Image
 from huffman import (
@@ -8,10 +9,13 @@ from huffman import (
     HuffmanNode,
     build_huffman_tree,
     tuple_huffman_decode,
+    tuple_frequencies,
 )
 from utils import split_image_channels, merge_image_channels, save_image
+from codec import encode_image
+from cache import ResultCache, save_frequencies, load_frequencies
+from output import OutputStage, write_file
 from visualization import save_huffman_tree_graph, print_huffman_tree_graphviz
-from tkinter import Tk, filedialog
 from datetime import datetime
 from PyQt5.QtWidgets import (
     QApplication,
@@ -34,22 +38,9 @@ from PyQt5.QtGui import QPixmap, QImage, QWheelEvent, QPainter, QPen
 from PyQt5.QtCore import QTimer, Qt, QRectF
 import sys
 import heapq
-import graphviz
 from collections import Counter
 
 
-class HuffmanNode:
-    def __init__(self, symbol=None, weight=0, word=None, left=None, right=None):
-        self.symbol = symbol
-        self.weight = weight
-        self.word = word
-        self.left = left
-        self.right = right
-
-    def __lt__(self, other):
-        return self.weight < other.weight
-
-
 class ImageWindow(QWidget):
     def __init__(self, title, pixmap, info, stacked_widget):
         super().__init__()
@@ -334,11 +325,13 @@ class StepByStepGraphWindow(QWidget):
             )
 
 
-def main():
+def main(restored_format="png"):
     # Clear the terminal
     os.system("cls" if os.name == "nt" else "clear")
 
     # Open file dialog to select an image
+    from tkinter import Tk, filedialog
+
     Tk().withdraw()  # We don't want a full GUI, so keep the root window from appearing
     initial_dir = os.path.join(os.getcwd(), "huffman_rgb_project", "ImágenesPrueba")
     image_path = filedialog.askopenfilename(
@@ -351,7 +344,26 @@ def main():
         return
 
     print("Loading image...")
-    image = Image.open(image_path).convert("RGB")
+    source = Image.open(image_path)
+    # The channel views below are RGB; the container keeps the native mode
+    image = source.convert("RGB")
+
+    # Reuse the results of a previous run on the same image content; the key
+    # covers the native image, which is what the container is encoded from
+    cache = ResultCache(os.path.join("huffman_rgb_project", "cache"))
+    cache_key = cache.key(source, pipeline="main", restored_format=restored_format)
+    cached_path = cache.get(cache_key)
+    if cached_path is not None:
+        print(f"Found cached results in {cached_path}, skipping encoding...")
+        frequencies = load_frequencies(os.path.join(cached_path, "frequencies.json"))
+        create_gui(
+            cached_path,
+            image_path,
+            frequencies["red"],
+            frequencies["green"],
+            frequencies["blue"],
+        )
+        return
 
     # Split the image into RGB channels
     print("Splitting image into RGB channels...")
@@ -383,173 +395,198 @@ def main():
     rgb_codes_path = os.path.join(subfolder_path, "rgb_codes")
     os.makedirs(rgb_codes_path, exist_ok=True)
 
-    # Save the Huffman tree graphs for each channel
-    print("Saving Huffman tree graphs...")
-    code_map_r = build_codes(huffman_tree_r)
-    code_map_g = build_codes(huffman_tree_g)
-    code_map_b = build_codes(huffman_tree_b)
-    save_huffman_tree_graph(
-        huffman_tree_r,
-        frequencies_r,
-        os.path.join(rgb_graphs_path, "Red_Channel_Huffman_Tree"),
-        code_map_r,
-    )
-    save_huffman_tree_graph(
-        huffman_tree_g,
-        frequencies_g,
-        os.path.join(rgb_graphs_path, "Green_Channel_Huffman_Tree"),
-        code_map_g,
-    )
-    save_huffman_tree_graph(
-        huffman_tree_b,
-        frequencies_b,
-        os.path.join(rgb_graphs_path, "Blue_Channel_Huffman_Tree"),
-        code_map_b,
-    )
+    # Artifacts are written in the background while decoding goes on; they
+    # are all flushed before the results are cached and shown
+    with OutputStage() as output:
+        # The container is encoded in the background too, alongside the
+        # channel views below
+        container_path = os.path.join(subfolder_path, "encoded_image.huf")
+        output.submit(container_path, save_container, source, container_path)
+
+        # Save the Huffman tree graphs for each channel
+        print("Saving Huffman tree graphs...")
+        code_map_r = build_codes(huffman_tree_r)
+        code_map_g = build_codes(huffman_tree_g)
+        code_map_b = build_codes(huffman_tree_b)
+        output.submit(
+            "Red channel graph",
+            save_huffman_tree_graph,
+            huffman_tree_r,
+            frequencies_r,
+            os.path.join(rgb_graphs_path, "Red_Channel_Huffman_Tree"),
+            code_map_r,
+        )
+        output.submit(
+            "Green channel graph",
+            save_huffman_tree_graph,
+            huffman_tree_g,
+            frequencies_g,
+            os.path.join(rgb_graphs_path, "Green_Channel_Huffman_Tree"),
+            code_map_g,
+        )
+        output.submit(
+            "Blue channel graph",
+            save_huffman_tree_graph,
+            huffman_tree_b,
+            frequencies_b,
+            os.path.join(rgb_graphs_path, "Blue_Channel_Huffman_Tree"),
+            code_map_b,
+        )
 
-    # Save each channel image
-    print("Saving each channel image...")
-    r_image = Image.merge(
-        "RGB",
-        (r_channel, Image.new("L", r_channel.size), Image.new("L", r_channel.size)),
-    )
-    g_image = Image.merge(
-        "RGB",
-        (Image.new("L", g_channel.size), g_channel, Image.new("L", g_channel.size)),
-    )
-    b_image = Image.merge(
-        "RGB",
-        (Image.new("L", b_channel.size), Image.new("L", b_channel.size), b_channel),
-    )
-    r_image.save(os.path.join(splitted_images_path, "Red_Channel.jpg"))
-    g_image.save(os.path.join(splitted_images_path, "Green_Channel.jpg"))
-    b_image.save(os.path.join(splitted_images_path, "Blue_Channel.jpg"))
-
-    # Generate encoded words and save the encoded image text for each channel as a .txt file
-    print("Generating encoded words...")
-    pixels_r = list(r_channel.getdata())
-    encoded_words_r = [code_map_r[pixel] for pixel in pixels_r]
-    separated_code_r = "-".join(encoded_words_r)
-    print("Separated code for Red channel by dash...")
-
-    pixels_g = list(g_channel.getdata())
-    encoded_words_g = [code_map_g[pixel] for pixel in pixels_g]
-    separated_code_g = "-".join(encoded_words_g)
-    print("Separated code for Green channel by dash...")
-
-    pixels_b = list(b_channel.getdata())
-    encoded_words_b = [code_map_b[pixel] for pixel in pixels_b]
-    separated_code_b = "-".join(encoded_words_b)
-    print("Separated code for Blue channel by dash...")
+        # Save each channel image
+        print("Saving each channel image...")
+        r_image = Image.merge(
+            "RGB",
+            (r_channel, Image.new("L", r_channel.size), Image.new("L", r_channel.size)),
+        )
+        g_image = Image.merge(
+            "RGB",
+            (Image.new("L", g_channel.size), g_channel, Image.new("L", g_channel.size)),
+        )
+        b_image = Image.merge(
+            "RGB",
+            (Image.new("L", b_channel.size), Image.new("L", b_channel.size), b_channel),
+        )
+        output.save_image(
+            r_image, os.path.join(splitted_images_path, "Red_Channel.jpg")
+        )
+        output.save_image(
+            g_image, os.path.join(splitted_images_path, "Green_Channel.jpg")
+        )
+        output.save_image(
+            b_image, os.path.join(splitted_images_path, "Blue_Channel.jpg")
+        )
 
-    print("Creating text file for encoded text...")
-    encoded_text_file_name_r = os.path.join(
-        rgb_codes_path,
-        f"Codigo_Red_{os.path.splitext(os.path.basename(image_path))[0]}.txt",
-    )
-    with open(encoded_text_file_name_r, "w") as f:
-        f.write(separated_code_r)
-    encoded_text_file_name_g = os.path.join(
-        rgb_codes_path,
-        f"Codigo_Green_{os.path.splitext(os.path.basename(image_path))[0]}.txt",
-    )
-    with open(encoded_text_file_name_g, "w") as f:
-        f.write(separated_code_g)
-    encoded_text_file_name_b = os.path.join(
-        rgb_codes_path,
-        f"Codigo_Blue_{os.path.splitext(os.path.basename(image_path))[0]}.txt",
-    )
-    with open(encoded_text_file_name_b, "w") as f:
-        f.write(separated_code_b)
+        # Generate encoded words and save the encoded image text for each channel as a .txt file
+        print("Generating encoded words...")
+        pixels_r = list(r_channel.getdata())
+        encoded_words_r = [code_map_r[pixel] for pixel in pixels_r]
+        separated_code_r = "-".join(encoded_words_r)
+        print("Separated code for Red channel by dash...")
+
+        pixels_g = list(g_channel.getdata())
+        encoded_words_g = [code_map_g[pixel] for pixel in pixels_g]
+        separated_code_g = "-".join(encoded_words_g)
+        print("Separated code for Green channel by dash...")
+
+        pixels_b = list(b_channel.getdata())
+        encoded_words_b = [code_map_b[pixel] for pixel in pixels_b]
+        separated_code_b = "-".join(encoded_words_b)
+        print("Separated code for Blue channel by dash...")
+
+        print("Creating text file for encoded text...")
+        encoded_text_file_name_r = os.path.join(
+            rgb_codes_path,
+            f"Codigo_Red_{os.path.splitext(os.path.basename(image_path))[0]}.txt",
+        )
+        output.write_text(encoded_text_file_name_r, separated_code_r)
+        encoded_text_file_name_g = os.path.join(
+            rgb_codes_path,
+            f"Codigo_Green_{os.path.splitext(os.path.basename(image_path))[0]}.txt",
+        )
+        output.write_text(encoded_text_file_name_g, separated_code_g)
+        encoded_text_file_name_b = os.path.join(
+            rgb_codes_path,
+            f"Codigo_Blue_{os.path.splitext(os.path.basename(image_path))[0]}.txt",
+        )
+        output.write_text(encoded_text_file_name_b, separated_code_b)
 
-    # Calculate and print Huffman's coding efficiency for each channel
-    entropy_r, avg_length_r, efficiency_r = calculate_efficiency(
-        frequencies_r, code_map_r
-    )
-    entropy_g, avg_length_g, efficiency_g = calculate_efficiency(
-        frequencies_g, code_map_g
-    )
-    entropy_b, avg_length_b, efficiency_b = calculate_efficiency(
-        frequencies_b, code_map_b
-    )
-    print(
-        f"Red channel - Entropy: {entropy_r:.4f}, Average length: {avg_length_r:.4f}, Efficiency: {efficiency_r:.4f}"
-    )
-    print(
-        f"Green channel - Entropy: {entropy_g:.4f}, Average length: {avg_length_g:.4f}, Efficiency: {efficiency_g:.4f}"
-    )
-    print(
-        f"Blue channel - Entropy: {entropy_b:.4f}, Average length: {avg_length_b:.4f}, Efficiency: {efficiency_b:.4f}"
-    )
+        # Calculate and print Huffman's coding efficiency for each channel
+        entropy_r, avg_length_r, efficiency_r = calculate_efficiency(
+            frequencies_r, code_map_r
+        )
+        entropy_g, avg_length_g, efficiency_g = calculate_efficiency(
+            frequencies_g, code_map_g
+        )
+        entropy_b, avg_length_b, efficiency_b = calculate_efficiency(
+            frequencies_b, code_map_b
+        )
+        print(
+            f"Red channel - Entropy: {entropy_r:.4f}, Average length: {avg_length_r:.4f}, Efficiency: {efficiency_r:.4f}"
+        )
+        print(
+            f"Green channel - Entropy: {entropy_g:.4f}, Average length: {avg_length_g:.4f}, Efficiency: {efficiency_g:.4f}"
+        )
+        print(
+            f"Blue channel - Entropy: {entropy_b:.4f}, Average length: {avg_length_b:.4f}, Efficiency: {efficiency_b:.4f}"
+        )
 
-    # Find and print the longest encoded word for each channel
-    max_word_length_r = max(len(word) for word in encoded_words_r)
-    max_word_length_g = max(len(word) for word in encoded_words_g)
-    max_word_length_b = max(len(word) for word in encoded_words_b)
-    longest_word_r = max(encoded_words_r, key=len)
-    longest_word_g = max(encoded_words_g, key=len)
-    longest_word_b = max(encoded_words_b, key=len)
-    print(f"Red channel - Longest encoded word length: {max_word_length_r}")
-    print(f"Green channel - Longest encoded word length: {max_word_length_g}")
-    print(f"Blue channel - Longest encoded word length: {max_word_length_b}")
-
-    # Save the average length, entropy, efficiency, and longest word length to a file for each channel
-    huffman_coding_info_r = (
-        f"Red channel:\n"
-        f"Average length of the encoded symbols: {avg_length_r:.4f}\n"
-        f"Entropy of the source: {entropy_r:.4f}\n"
-        f"Huffman's coding efficiency: {efficiency_r:.4f}\n"
-        f"Longest encoded word: {longest_word_r} (length: {max_word_length_r})\n"
-    )
-    huffman_coding_file_path_r = os.path.join(
-        rgb_graphs_path, "Huffmans_Coding_Red.txt"
-    )
-    with open(huffman_coding_file_path_r, "w") as f:
-        f.write(huffman_coding_info_r)
-
-    huffman_coding_info_g = (
-        f"Green channel:\n"
-        f"Average length of the encoded symbols: {avg_length_g:.4f}\n"
-        f"Entropy of the source: {entropy_g:.4f}\n"
-        f"Huffman's coding efficiency: {efficiency_g:.4f}\n"
-        f"Longest encoded word: {longest_word_g} (length: {max_word_length_g})\n"
-    )
-    huffman_coding_file_path_g = os.path.join(
-        rgb_graphs_path, "Huffmans_Coding_Green.txt"
-    )
-    with open(huffman_coding_file_path_g, "w") as f:
-        f.write(huffman_coding_info_g)
-
-    huffman_coding_info_b = (
-        f"Blue channel:\n"
-        f"Average length of the encoded symbols: {avg_length_b:.4f}\n"
-        f"Entropy of the source: {entropy_b:.4f}\n"
-        f"Huffman's coding efficiency: {efficiency_b:.4f}\n"
-        f"Longest encoded word: {longest_word_b} (length: {max_word_length_b})\n"
-    )
-    huffman_coding_file_path_b = os.path.join(
-        rgb_graphs_path, "Huffmans_Coding_Blue.txt"
-    )
-    with open(huffman_coding_file_path_b, "w") as f:
-        f.write(huffman_coding_info_b)
-
-    # Decode each channel
-    print("Decoding RGB channels...")
-    decoded_r = huffman_decode(encoded_data_r, huffman_tree_r, r_channel.size)
-    decoded_g = huffman_decode(encoded_data_g, huffman_tree_g, g_channel.size)
-    decoded_b = huffman_decode(encoded_data_b, huffman_tree_b, b_channel.size)
-
-    # Merge the decoded channels back into a single image
-    print("Merging decoded channels back into a single image...")
-    restored_image = merge_image_channels(decoded_r, decoded_g, decoded_b)
-
-    # Save the restored image
-    output_path = os.path.join(subfolder_path, "restored_image.jpg")
-    save_image(restored_image, output_path)
+        # Find and print the longest encoded word for each channel
+        max_word_length_r = max(len(word) for word in encoded_words_r)
+        max_word_length_g = max(len(word) for word in encoded_words_g)
+        max_word_length_b = max(len(word) for word in encoded_words_b)
+        longest_word_r = max(encoded_words_r, key=len)
+        longest_word_g = max(encoded_words_g, key=len)
+        longest_word_b = max(encoded_words_b, key=len)
+        print(f"Red channel - Longest encoded word length: {max_word_length_r}")
+        print(f"Green channel - Longest encoded word length: {max_word_length_g}")
+        print(f"Blue channel - Longest encoded word length: {max_word_length_b}")
+
+        # Save the average length, entropy, efficiency, and longest word length to a file for each channel
+        huffman_coding_info_r = (
+            f"Red channel:\n"
+            f"Average length of the encoded symbols: {avg_length_r:.4f}\n"
+            f"Entropy of the source: {entropy_r:.4f}\n"
+            f"Huffman's coding efficiency: {efficiency_r:.4f}\n"
+            f"Longest encoded word: {longest_word_r} (length: {max_word_length_r})\n"
+        )
+        huffman_coding_file_path_r = os.path.join(
+            rgb_graphs_path, "Huffmans_Coding_Red.txt"
+        )
+        output.write_text(huffman_coding_file_path_r, huffman_coding_info_r)
+
+        huffman_coding_info_g = (
+            f"Green channel:\n"
+            f"Average length of the encoded symbols: {avg_length_g:.4f}\n"
+            f"Entropy of the source: {entropy_g:.4f}\n"
+            f"Huffman's coding efficiency: {efficiency_g:.4f}\n"
+            f"Longest encoded word: {longest_word_g} (length: {max_word_length_g})\n"
+        )
+        huffman_coding_file_path_g = os.path.join(
+            rgb_graphs_path, "Huffmans_Coding_Green.txt"
+        )
+        output.write_text(huffman_coding_file_path_g, huffman_coding_info_g)
+
+        huffman_coding_info_b = (
+            f"Blue channel:\n"
+            f"Average length of the encoded symbols: {avg_length_b:.4f}\n"
+            f"Entropy of the source: {entropy_b:.4f}\n"
+            f"Huffman's coding efficiency: {efficiency_b:.4f}\n"
+            f"Longest encoded word: {longest_word_b} (length: {max_word_length_b})\n"
+        )
+        huffman_coding_file_path_b = os.path.join(
+            rgb_graphs_path, "Huffmans_Coding_Blue.txt"
+        )
+        output.write_text(huffman_coding_file_path_b, huffman_coding_info_b)
+
+        # Decode each channel
+        print("Decoding RGB channels...")
+        decoded_r = huffman_decode(encoded_data_r, huffman_tree_r, r_channel.size)
+        decoded_g = huffman_decode(encoded_data_g, huffman_tree_g, g_channel.size)
+        decoded_b = huffman_decode(encoded_data_b, huffman_tree_b, b_channel.size)
+
+        # Merge the decoded channels back into a single image
+        print("Merging decoded channels back into a single image...")
+        restored_image = merge_image_channels(decoded_r, decoded_g, decoded_b)
+
+        # Save the restored image; PNG keeps it lossless and skips the JPEG
+        # re-encode
+        output_path = os.path.join(subfolder_path, f"restored_image.{restored_format}")
+        output.submit(output_path, save_image, restored_image, output_path)
+
+        # Save a copy of the original image in the subfolder
+        output.save_image(image, os.path.join(subfolder_path, "Original.jpg"))
+
+        # Save the frequencies, then cache the results
+        output.submit(
+            "frequencies.json",
+            save_frequencies,
+            os.path.join(subfolder_path, "frequencies.json"),
+            {"red": frequencies_r, "green": frequencies_g, "blue": frequencies_b},
+        )
+        print("Waiting for the remaining files to be written...")
     print(f"Restored image saved as {output_path}")
-
-    # Save a copy of the original image in the subfolder
-    image.save(os.path.join(subfolder_path, "Original.jpg"))
+    cache.put_directory(cache_key, subfolder_path)
 
     print("Process completed successfully.")
 
@@ -557,6 +594,19 @@ def main():
     create_gui(subfolder_path, image_path, frequencies_r, frequencies_g, frequencies_b)
 
 
+def save_container(image, path):
+    write_file(path, encode_image(image), "wb")
+
+
+def restored_image_path(subfolder_path):
+    # Older results only have the JPEG version
+    for name in ("restored_image.png", "restored_image.jpg"):
+        path = os.path.join(subfolder_path, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No restored image in {subfolder_path}")
+
+
 def create_gui(
     subfolder_path, original_image_path, frequencies_r, frequencies_g, frequencies_b
 ):
@@ -573,7 +623,7 @@ def create_gui(
     blue_image = Image.open(
         os.path.join(subfolder_path, "splitted_images", "Blue_Channel.jpg")
     )
-    restored_image = Image.open(os.path.join(subfolder_path, "restored_image.jpg"))
+    restored_image = Image.open(restored_image_path(subfolder_path))
 
     # Load Huffman tree graphs
     red_graph = Image.open(
@@ -791,6 +841,8 @@ def generate_steps_for_graph(frequencies, output_dir):
     total_weight = sum(frequencies.values())
 
     # Initial step: show all words with their frequencies
+    import graphviz
+
     initial_dot = graphviz.Digraph()
     added_edges = set()
     for node in sorted(nodes, key=lambda x: x.weight):
@@ -969,7 +1021,7 @@ def read_file(filename, subfolder_path):
 def tuple_encode(image):
     # Example tuple encoding process
     pixels = list(image.getdata())
-    frequencies = Counter(pixels)
+    frequencies = tuple_frequencies(image)
     huffman_tree = build_huffman_tree(frequencies)
     codebook = build_codes(huffman_tree)
     encoded_image = "".join(codebook[pixel] for pixel in pixels)
@@ -1051,4 +1103,11 @@ def show_tuple_encoding(
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Huffman RGB project")
+    parser.add_argument(
+        "--restored-format",
+        choices=("png", "jpg"),
+        default="png",
+        help="Save the restored image losslessly as PNG or, as before, as JPEG",
+    )
+    main(parser.parse_args().restored_format)
@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OutputStage:
+    # Writes and renders run on a few background threads while the pipeline
+    # goes on; PIL encoders, file I/O and the graphviz subprocess all release
+    # the GIL
+    def __init__(self, max_workers=4, max_pending=16):
+        self.executor = ThreadPoolExecutor(max_workers)
+        # Submitting blocks once max_pending artifacts are queued, so large
+        # images cannot pile up in memory waiting to be written
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.futures = []
+
+    def submit(self, description, function, *args):
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append((description, future))
+        return future
+
+    def write_text(self, path, text):
+        return self.submit(path, write_file, path, text, "w")
+
+    def write_bytes(self, path, data):
+        return self.submit(path, write_file, path, data, "wb")
+
+    def save_image(self, image, path):
+        return self.submit(path, image.save, path)
+
+    def join(self):
+        # Waits for every artifact and reports all failures at once
+        errors = []
+        for description, future in self.futures:
+            error = future.exception()
+            if error is not None:
+                errors.append(f"{description}: {error}")
+        self.futures = []
+        if errors:
+            raise RuntimeError("Writing artifacts failed:\n" + "\n".join(errors))
+
+    def close(self):
+        try:
+            self.join()
+        finally:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # The pipeline already failed; still wait for the writes in flight
+            self.executor.shutdown()
+
+
+def write_file(path, data, mode):
+    with open(path, mode) as f:
+        f.write(data)
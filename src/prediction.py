@@ -0,0 +1,141 @@
+import numpy as np
+
+PREDICTORS = ("none", "left", "up", "average", "paeth", "med")
+
+
+def predict(predictor_id, a, b, c):
+    # a = left, b = up, c = upper-left neighbour (zero outside the image)
+    if predictor_id == 0:
+        return np.zeros_like(a)
+    if predictor_id == 1:
+        return a
+    if predictor_id == 2:
+        return b
+    if predictor_id == 3:
+        return (a + b) // 2
+    if predictor_id == 4:
+        p = a + b - c
+        pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+        return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+    if predictor_id == 5:
+        low, high = np.minimum(a, b), np.maximum(a, b)
+        return np.where(c >= high, low, np.where(c <= low, high, a + b - c))
+    raise ValueError(f"Unknown predictor: {predictor_id}")
+
+
+def neighbours(pixels):
+    padded = np.pad(pixels.astype(np.int64), ((1, 0), (1, 0)))
+    return padded[1:, :-1], padded[:-1, 1:], padded[:-1, :-1]
+
+
+def expand_choices(choices, shape, tile_size=None, top=0):
+    # Choice of every pixel in `shape` rows starting at row `top`
+    height, width = shape
+    rows = np.arange(top, top + height)
+    if tile_size is None:
+        return np.broadcast_to(choices[rows, None], shape)
+    return np.repeat(choices[rows // tile_size], tile_size, axis=1)[:, :width]
+
+
+def block_costs(costs, tile_size=None):
+    if tile_size is None:
+        return costs.sum(axis=1)
+    height, width = costs.shape
+    rows = np.add.reduceat(costs, np.arange(0, height, tile_size), axis=0)
+    return np.add.reduceat(rows, np.arange(0, width, tile_size), axis=1)
+
+
+def apply_prediction(pixels, predictor="auto", tile_size=None, modulus=256):
+    pixels = np.asarray(pixels).astype(np.int64)
+    a, b, c = neighbours(pixels)
+
+    if predictor == "auto":
+        # Pick the predictor with the smallest sum of absolute residuals per block
+        costs = []
+        for predictor_id in range(len(PREDICTORS)):
+            residuals = (pixels - predict(predictor_id, a, b, c)) % modulus
+            residuals = np.minimum(residuals, modulus - residuals)
+            costs.append(block_costs(residuals, tile_size))
+        choices = np.argmin(np.stack(costs), axis=0).astype(np.uint8)
+    else:
+        block_shape = block_costs(np.zeros_like(pixels), tile_size).shape
+        choices = np.full(block_shape, PREDICTORS.index(predictor), dtype=np.uint8)
+
+    choice_map = expand_choices(choices, pixels.shape, tile_size)
+    residuals = np.zeros(pixels.shape, dtype=np.int64)
+    for predictor_id in np.unique(choices):
+        mask = choice_map == predictor_id
+        residuals[mask] = (pixels - predict(predictor_id, a, b, c))[mask] % modulus
+    return residuals, choices
+
+
+def diagonal_predictions(padded, choice_map, ys, xs):
+    a, b, c = padded[ys + 1, xs], padded[ys, xs + 1], padded[ys, xs]
+    ids = choice_map[ys, xs]
+    prediction = np.zeros(ys.size, dtype=np.int64)
+    for predictor_id in np.unique(ids):
+        mask = ids == predictor_id
+        prediction[mask] = predict(predictor_id, a[mask], b[mask], c[mask])
+    return prediction
+
+
+def quantization_range(modulus, max_error):
+    # Number of quantized residuals needed to cover every pixel value
+    return (modulus - 1 + 2 * max_error) // (2 * max_error + 1) + 1
+
+
+def quantize_prediction(pixels, choices, tile_size=None, modulus=256, max_error=1):
+    # Near-lossless coding in the style of JPEG-LS: residuals are quantized in
+    # steps of 2 * max_error + 1, and predictions come from the reconstructed
+    # pixels, so quantization errors never add up across the image
+    pixels = np.asarray(pixels).astype(np.int64)
+    height, width = pixels.shape
+    step = 2 * max_error + 1
+    levels = quantization_range(modulus, max_error)
+    choice_map = expand_choices(choices, pixels.shape, tile_size)
+    padded = np.zeros((height + 1, width + 1), dtype=np.int64)
+    symbols = np.zeros(pixels.shape, dtype=np.int64)
+
+    for diagonal in range(height + width - 1):
+        ys = np.arange(max(0, diagonal - width + 1), min(height - 1, diagonal) + 1)
+        xs = diagonal - ys
+        prediction = diagonal_predictions(padded, choice_map, ys, xs)
+        error = pixels[ys, xs] - prediction
+        quantized = np.sign(error) * ((np.abs(error) + max_error) // step)
+        symbols[ys, xs] = quantized % levels
+        padded[ys + 1, xs + 1] = np.clip(prediction + quantized * step, 0, modulus - 1)
+
+    return symbols, padded[1:, 1:]
+
+
+def reconstruct_rows(residuals, choice_map, above=None, modulus=256, max_error=0):
+    # Reconstructs a strip of rows; `above` is the row before the strip, so a
+    # tall image can be restored a few rows at a time
+    height, width = residuals.shape
+    padded = np.zeros((height + 1, width + 1), dtype=np.int64)
+    if above is not None:
+        padded[0, 1:] = above
+    step = 2 * max_error + 1
+    period = quantization_range(modulus, max_error) * step
+
+    # Every pixel only depends on its left, up and upper-left neighbours, so a
+    # whole anti-diagonal can be reconstructed at once
+    for diagonal in range(height + width - 1):
+        ys = np.arange(max(0, diagonal - width + 1), min(height - 1, diagonal) + 1)
+        xs = diagonal - ys
+        prediction = diagonal_predictions(padded, choice_map, ys, xs)
+        if max_error:
+            value = prediction + residuals[ys, xs] * step
+            # Quantized residuals are stored modulo their range; the value
+            # within max_error of a valid pixel is the one the encoder meant
+            value = np.where(value > modulus - 1 + max_error, value - period, value)
+            padded[ys + 1, xs + 1] = np.clip(value, 0, modulus - 1)
+        else:
+            padded[ys + 1, xs + 1] = (residuals[ys, xs] + prediction) % modulus
+
+    return padded[1:, 1:]
+
+
+def reconstruct(residuals, choices, tile_size=None, modulus=256, max_error=0):
+    choice_map = expand_choices(choices, residuals.shape, tile_size)
+    return reconstruct_rows(residuals, choice_map, None, modulus, max_error)
@@ -0,0 +1,66 @@
+import math
+import numpy as np
+
+
+def zigzag(values):
+    # Signed details become non-negative symbols: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+    return np.where(values >= 0, 2 * values, -2 * values - 1)
+
+
+def unzigzag(symbols):
+    return np.where(symbols & 1, -((symbols + 1) >> 1), symbols >> 1)
+
+
+def s_transform(values, axis):
+    # Reversible integer Haar: the floor average of each pair and its difference
+    values = np.moveaxis(values, axis, 0)
+    if values.shape[0] % 2:
+        values = np.concatenate([values, values[-1:]])
+    even, odd = values[0::2], values[1::2]
+    high = even - odd
+    low = odd + (high >> 1)
+    return np.moveaxis(low, 0, axis), np.moveaxis(high, 0, axis)
+
+
+def inverse_s_transform(low, high, size, axis):
+    low = np.moveaxis(low, axis, 0)
+    high = np.moveaxis(high, axis, 0)
+    odd = low - (high >> 1)
+    values = np.empty((2 * low.shape[0],) + low.shape[1:], dtype=np.int64)
+    values[0::2] = high + odd
+    values[1::2] = odd
+    return np.moveaxis(values[:size], 0, axis)
+
+
+def max_levels(shape):
+    return max(int(math.log2(min(shape))), 0)
+
+
+def level_sizes(shape, levels):
+    # Sizes from the coarsest level up to the full image
+    sizes = [list(shape)]
+    for _ in range(levels):
+        height, width = sizes[0]
+        sizes.insert(0, [-(-height // 2), -(-width // 2)])
+    return sizes
+
+
+def decompose(pixels, levels):
+    # Returns the coarsest approximation and the detail bands of every
+    # level, coarsest first
+    low = np.asarray(pixels, dtype=np.int64)
+    details = []
+    for _ in range(levels):
+        rows_low, rows_high = s_transform(low, 1)
+        low, low_high = s_transform(rows_low, 0)
+        high_low, high_high = s_transform(rows_high, 0)
+        details.insert(0, (low_high, high_low, high_high))
+    return low, details
+
+
+def recompose_level(low, bands, size):
+    height, width = size
+    low_high, high_low, high_high = bands
+    rows_low = inverse_s_transform(low, low_high, height, 0)
+    rows_high = inverse_s_transform(high_low, high_high, height, 0)
+    return inverse_s_transform(rows_low, rows_high, width, 1)
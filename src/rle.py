@@ -0,0 +1,24 @@
+import numpy as np
+
+MAX_RUN = 1 << 16
+
+
+def run_length_encode(symbols, max_run=MAX_RUN):
+    symbols = np.asarray(symbols).ravel()
+    if symbols.size == 0:
+        return symbols[:0], np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(symbols[1:] != symbols[:-1]) + 1))
+    lengths = np.diff(np.append(starts, symbols.size))
+    values = symbols[starts]
+
+    # Split long runs so the run-length alphabet stays bounded
+    parts = -(-lengths // max_run)
+    values = np.repeat(values, parts)
+    run_lengths = np.full(values.size, max_run, dtype=np.int64)
+    last_parts = np.cumsum(parts) - 1
+    run_lengths[last_parts] = lengths - (parts - 1) * max_run
+    return values, run_lengths
+
+
+def run_length_decode(values, run_lengths):
+    return np.repeat(np.asarray(values), np.asarray(run_lengths))
@@ -0,0 +1,41 @@
+import math
+import numpy as np
+from codebooks import smoothed_frequencies
+from huffman import count_frequencies
+
+SAMPLE_METHODS = ("stride", "random")
+# Smaller samples give histograms too noisy to build a code from
+MIN_SAMPLE_SIZE = 1 << 16
+
+
+def sample_symbols(symbols, rate, method="stride", width=None, seed=0):
+    if not 0 < rate <= 1:
+        raise ValueError("Sample rate must be above 0 and at most 1")
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Unknown sample method: {method}")
+    symbols = np.asarray(symbols).ravel()
+    size = max(int(symbols.size * rate), MIN_SAMPLE_SIZE)
+    if size >= symbols.size:
+        return symbols
+
+    if method == "random":
+        # A fixed seed keeps the codebook, and so the output, reproducible
+        rng = np.random.default_rng(seed)
+        return symbols[rng.integers(0, symbols.size, size)]
+    step = symbols.size // size
+    # A step sharing a factor with the row width would keep revisiting the
+    # same columns
+    while width and math.gcd(step, width) > 1:
+        step += 1
+    return symbols[::step]
+
+
+def approximate_frequencies(
+    symbols, rate, method="stride", width=None, alphabet_size=256
+):
+    sample = sample_symbols(symbols, rate, method, width)
+    frequencies = count_frequencies(sample)
+    if max(frequencies) >= alphabet_size:
+        raise ValueError("Sampled histograms need values inside the alphabet")
+    # Symbols missing from the sample still need a code for the full pass
+    return smoothed_frequencies(frequencies, alphabet_size)
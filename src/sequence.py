@@ -0,0 +1,207 @@
+import itertools
+import json
+import struct
+import numpy as np
+from PIL import Image, ImageSequence
+from huffman import (
+    count_frequencies,
+    build_code_lengths,
+    canonical_codes,
+    encode_symbols,
+    decode_symbols,
+    encoded_bits,
+)
+from container import (
+    MAGIC,
+    add_section,
+    write_container,
+    read_container,
+    pack_code_lengths,
+    unpack_code_lengths,
+)
+from codebooks import smoothed_frequencies
+from prediction import apply_prediction, reconstruct
+from utils import (
+    split_image_channels,
+    merge_image_channels,
+    native_image,
+    mode_bit_depth,
+)
+
+
+def load_frames(paths):
+    # Each path is a still image or a multi-frame file such as a GIF or TIFF
+    for path in paths:
+        with Image.open(path) as image:
+            for frame in ImageSequence.Iterator(image):
+                yield frame.copy()
+
+
+def sequence_frame(frame, mode, size):
+    frame = native_image(frame)
+    if frame.mode != mode:
+        frame = frame.convert(mode)
+    if list(frame.size) != size:
+        raise ValueError("Every frame of a sequence must have the same size")
+    return [
+        np.asarray(channel, dtype=np.int64) for channel in split_image_channels(frame)
+    ]
+
+
+def choose_codebook(frequencies, carried, alphabet_size, min_gain):
+    # Codebooks are smoothed so a carried one can code any later frame; it is
+    # only replaced when a new one saves more than min_gain of its bits,
+    # counting the cost of storing the new one
+    fresh = build_code_lengths(smoothed_frequencies(frequencies, alphabet_size))
+    if carried is None:
+        return fresh
+    carried_bits = encoded_bits(frequencies, carried)
+    fresh_bits = encoded_bits(frequencies, fresh) + len(pack_code_lengths(fresh)) * 8
+    if carried_bits - fresh_bits > min_gain * carried_bits:
+        return fresh
+    return None
+
+
+def encode_sequence(frames, keyframe_interval=30, min_gain=0.01, predictor="auto"):
+    if keyframe_interval < 1:
+        raise ValueError("The keyframe interval must be at least 1")
+    frames = iter(frames)
+    first = native_image(next(frames))
+    if first.mode == "P":
+        first = first.convert("RGBA" if "transparency" in first.info else "RGB")
+    modulus = 1 << mode_bit_depth(first.mode)
+    header = {
+        "kind": "sequence",
+        "mode": first.mode,
+        "size": list(first.size),
+        "keyframe_interval": keyframe_interval,
+        "predictor": predictor,
+        "frames": [],
+    }
+    sections = []
+    carried = {}
+    previous = None
+
+    for number, frame in enumerate(itertools.chain([first], frames)):
+        planes = sequence_frame(frame, header["mode"], header["size"])
+        # Keyframes only use spatial prediction, so decoding can start there
+        keyframe = number % keyframe_interval == 0
+        entries = []
+        for index, pixels in enumerate(planes):
+            entry = {}
+            if keyframe:
+                residuals, choices = apply_prediction(pixels, predictor, None, modulus)
+                entry["choices"] = add_section(sections, choices.tobytes())
+            else:
+                residuals = (pixels - previous[index]) % modulus
+
+            key = ("key" if keyframe else "delta", index)
+            frequencies = count_frequencies(residuals)
+            code_lengths = choose_codebook(
+                frequencies, carried.get(key, (None, None))[1], modulus, min_gain
+            )
+            if code_lengths is not None:
+                carried[key] = (
+                    add_section(sections, pack_code_lengths(code_lengths)),
+                    code_lengths,
+                )
+            entry["codebook"], code_lengths = carried[key]
+            payload, entry["nbits"] = encode_symbols(
+                residuals.ravel(), canonical_codes(code_lengths)
+            )
+            entry["data"] = add_section(sections, payload)
+            entries.append(entry)
+        header["frames"].append({"keyframe": keyframe, "channels": entries})
+        previous = planes
+
+    return write_container(header, sections)
+
+
+def decode_frame_planes(header, sections, entries, previous, keyframe, codes):
+    width, height = header["size"]
+    modulus = 1 << mode_bit_depth(header["mode"])
+    planes = []
+    for index, entry in enumerate(entries):
+        if entry["codebook"] not in codes:
+            codes[entry["codebook"]] = canonical_codes(
+                unpack_code_lengths(sections[entry["codebook"]])
+            )
+        residuals = np.array(
+            decode_symbols(
+                sections[entry["data"]],
+                entry["nbits"],
+                codes[entry["codebook"]],
+                width * height,
+            ),
+            dtype=np.int64,
+        ).reshape(height, width)
+        if keyframe:
+            choices = np.frombuffer(sections[entry["choices"]], np.uint8)
+            planes.append(reconstruct(residuals, choices, None, modulus))
+        else:
+            planes.append((previous[index] + residuals) % modulus)
+    return planes
+
+
+def frame_image(header, planes):
+    dtype = np.uint16 if mode_bit_depth(header["mode"]) > 8 else np.uint8
+    return merge_image_channels(
+        *[Image.fromarray(plane.astype(dtype)) for plane in planes],
+        mode=header["mode"],
+    )
+
+
+def decode_sequence(data):
+    header, sections = read_container(data)
+    codes = {}
+    previous = None
+    for frame in header["frames"]:
+        previous = decode_frame_planes(
+            header, sections, frame["channels"], previous, frame["keyframe"], codes
+        )
+        yield frame_image(header, previous)
+
+
+def frame_range(header, number):
+    if not 0 <= number < len(header["frames"]):
+        raise IndexError(f"Sequence has no frame {number}")
+    if header["keyframe_interval"] < 1:
+        raise ValueError("Invalid keyframe interval in the sequence header")
+    return range(number - number % header["keyframe_interval"], number + 1)
+
+
+def decode_frame(header, sections, number):
+    # A frame needs the frames back to the keyframe before it
+    codes = {}
+    previous = None
+    for index in frame_range(header, number):
+        frame = header["frames"][index]
+        previous = decode_frame_planes(
+            header, sections, frame["channels"], previous, frame["keyframe"], codes
+        )
+    return frame_image(header, previous)
+
+
+def read_frame(path, number):
+    # Only the header and the sections the frame needs are read from disk
+    with open(path, "rb") as f:
+        prefix = f.read(8)
+        if prefix[:4] != MAGIC:
+            raise ValueError("Not a Huffman container")
+        (header_length,) = struct.unpack("<I", prefix[4:])
+        header = json.loads(f.read(header_length).decode("utf-8"))
+        offsets = 8 + header_length + np.cumsum([0] + header["sections"])
+
+        needed = set()
+        for index in frame_range(header, number):
+            for entry in header["frames"][index]["channels"]:
+                needed.update(
+                    entry[key]
+                    for key in ("choices", "codebook", "data")
+                    if key in entry
+                )
+        sections = {}
+        for index in sorted(needed):
+            f.seek(int(offsets[index]))
+            sections[index] = f.read(header["sections"][index])
+    return decode_frame(header, sections, number)
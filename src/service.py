@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from PIL import Image
+from codec import encode_image, decode_image
+from codebooks import CodebookStore
+
+# Query parameters accepted by each endpoint and how to parse them
+ENCODE_PARAMS = {
+    "predictor": str,
+    "tile_size": int,
+    "mode": str,
+    "streams": int,
+    "group_size": int,
+    "contexts": int,
+    "tile_codebooks": int,
+    "codebook_tile_size": int,
+    "sample_rate": float,
+    "sample_method": str,
+    "levels": int,
+    "max_error": int,
+    "lz_window": int,
+    "lz_effort": int,
+}
+DECODE_PARAMS = {"level": int}
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    503: "Service Unavailable",
+}
+LATENCY_WINDOW = 1000
+
+# Each worker process keeps its own codebook store, so codebooks stay cached
+# in memory between requests
+codebook_store = None
+
+
+def init_worker(codebook_root):
+    global codebook_store
+    if codebook_root is not None:
+        codebook_store = CodebookStore(codebook_root)
+
+
+def worker_stats():
+    if codebook_store is None:
+        return os.getpid(), 0, 0
+    return os.getpid(), codebook_store.reused, codebook_store.built
+
+
+def encode_job(data, params):
+    image = Image.open(io.BytesIO(data))
+    return encode_image(image, codebook_store=codebook_store, **params), worker_stats()
+
+
+def decode_job(data, params):
+    image = decode_image(data, codebook_store=codebook_store, **params)
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue(), worker_stats()
+
+
+ENDPOINTS = {
+    "encode": (encode_job, ENCODE_PARAMS, "application/octet-stream"),
+    "decode": (decode_job, DECODE_PARAMS, "image/png"),
+}
+
+
+def parse_params(query, allowed):
+    params = {}
+    for name, values in parse_qs(query).items():
+        if name not in allowed:
+            raise ValueError(f"Unknown parameter: {name}")
+        params[name] = allowed[name](values[-1])
+    return params
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class CodecService:
+    def __init__(self, workers=None, queue_size=64, codebook_root=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.pool = ProcessPoolExecutor(
+            self.workers, initializer=init_worker, initargs=(codebook_root,)
+        )
+        self.queue = None
+        # The event loop only keeps weak references to tasks, so the
+        # dispatchers are held here while they run
+        self.dispatchers = set()
+        self.started = time.time()
+        self.requests = {"encode": 0, "decode": 0, "stats": 0}
+        self.rejected = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.codebooks = {}
+
+    async def start(self):
+        # The queue bounds the work waiting for the pool; a full queue turns
+        # new requests away instead of letting latency grow without limit
+        self.queue = asyncio.Queue(self.queue_size)
+        loop = asyncio.get_running_loop()
+        # Start every worker process up front, so the first requests do not
+        # pay for the imports
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(self.pool, worker_stats)
+                for _ in range(self.workers)
+            ]
+        )
+        for _ in range(self.workers):
+            task = asyncio.create_task(self.dispatch())
+            self.dispatchers.add(task)
+            task.add_done_callback(self.dispatchers.discard)
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, data, params, future = await self.queue.get()
+            try:
+                result, (pid, reused, built) = await loop.run_in_executor(
+                    self.pool, job, data, params
+                )
+                self.codebooks[pid] = (reused, built)
+                future.set_result(result)
+            except Exception as error:
+                future.set_exception(error)
+            finally:
+                self.queue.task_done()
+
+    async def submit(self, job, data, params):
+        if self.queue.full():
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((job, data, params, future))
+        return await future
+
+    def stats(self):
+        return {
+            "uptime": round(time.time() - self.started, 3),
+            "workers": self.workers,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "queued": self.queue.qsize(),
+            "latency_ms": {
+                "p50": round(percentile(self.latencies, 0.50) * 1000, 3),
+                "p99": round(percentile(self.latencies, 0.99) * 1000, 3),
+            },
+            "codebooks": {
+                "reused": sum(reused for reused, _ in self.codebooks.values()),
+                "built": sum(built for _, built in self.codebooks.values()),
+            },
+        }
+
+    async def respond(self, method, target, body):
+        url = urlsplit(target)
+        if method == "GET" and url.path == "/stats":
+            self.requests["stats"] += 1
+            return 200, "application/json", json.dumps(self.stats()).encode("utf-8")
+        name = url.path[1:]
+        if method != "POST" or name not in ENDPOINTS:
+            return 404, "text/plain", b"Unknown endpoint"
+
+        self.requests[name] += 1
+        job, allowed, content_type = ENDPOINTS[name]
+        start = time.perf_counter()
+        try:
+            result = await self.submit(job, body, parse_params(url.query, allowed))
+        except Exception as error:
+            self.failed += 1
+            return 400, "text/plain", str(error).encode("utf-8")
+        if result is None:
+            self.rejected += 1
+            return 503, "text/plain", b"Queue is full, retry later"
+        self.latencies.append(time.perf_counter() - start)
+        return 200, content_type, result
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: one request line, headers and a
+        # body of Content-Length bytes
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, content_type, payload = await self.respond(method, target, body)
+                close = headers.get("connection", "").lower() == "close"
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                        f"Content-Type: {content_type}\r\n"
+                        f"Content-Length: {len(payload)}\r\n"
+                        f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+                    ).encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_path=None):
+        await self.start()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, unix_path)
+            print(f"Serving on {unix_path} with {self.workers} workers")
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f"Serving on http://{host}:{port} with {self.workers} workers")
+        async with server:
+            await server.serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local Huffman codec service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--unix", default=None, help="Listen on this Unix socket instead of TCP"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=64,
+        help="Requests waiting for a worker before new ones get a 503",
+    )
+    parser.add_argument(
+        "--codebook-store",
+        default=None,
+        help="Directory of shared codebooks, kept cached in every worker",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    service = CodecService(args.workers, args.queue_size, args.codebook_store)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.pool.shutdown()
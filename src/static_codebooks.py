@@ -0,0 +1,123 @@
+import hashlib
+import numpy as np
+from collections import Counter
+from PIL import Image
+from huffman import (
+    count_frequencies,
+    build_code_lengths,
+    canonical_codes,
+    encoded_bits,
+)
+from container import (
+    add_section,
+    write_container,
+    read_container,
+    pack_code_lengths,
+    unpack_code_lengths,
+)
+from codebooks import smoothed_frequencies
+from prediction import apply_prediction
+from utils import split_image_channels
+
+STATIC_VERSION = 1
+CHANNEL_NAMES = ("red", "green", "blue")
+
+
+def transform_name(predictor):
+    return "raw" if predictor is None else predictor
+
+
+def transformed_channels(image, predictor=None, tile_size=None):
+    for name, channel in zip(CHANNEL_NAMES, split_image_channels(image.convert("RGB"))):
+        pixels = np.asarray(channel, dtype=np.int64)
+        if predictor is not None:
+            pixels, _ = apply_prediction(pixels, predictor, tile_size)
+        yield name, pixels.ravel()
+
+
+def train_static_codebooks(image_paths, predictors=(None,), alphabet_size=256):
+    totals = {}
+    for image_path in image_paths:
+        print(f"Counting {image_path}...")
+        image = Image.open(image_path)
+        for predictor in predictors:
+            for name, symbols in transformed_channels(image, predictor):
+                key = f"{transform_name(predictor)}:{name}"
+                totals.setdefault(key, Counter()).update(count_frequencies(symbols))
+
+    # Smoothing keeps every symbol codable, even if the corpus never used it
+    return {
+        key: build_code_lengths(smoothed_frequencies(frequencies, alphabet_size))
+        for key, frequencies in totals.items()
+    }
+
+
+def save_static_codebooks(codebooks, path):
+    sections = []
+    header = {
+        "kind": "static_codebooks",
+        "static_version": STATIC_VERSION,
+        "codebooks": {
+            key: add_section(sections, pack_code_lengths(code_lengths))
+            for key, code_lengths in sorted(codebooks.items())
+        },
+    }
+    with open(path, "wb") as f:
+        f.write(write_container(header, sections))
+
+
+class StaticCodebooks:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        header, sections = read_container(data)
+        if header.get("kind") != "static_codebooks":
+            raise ValueError(f"{path} does not contain static codebooks")
+        if header["static_version"] != STATIC_VERSION:
+            raise ValueError(
+                f"Unsupported static codebook version: {header['static_version']}"
+            )
+        # Containers refer to codebooks through the hash of the whole set, so a
+        # retrained file can never be mistaken for the one used when encoding
+        self.set_id = hashlib.sha256(data).hexdigest()[:12]
+        self.code_lengths = {
+            key: unpack_code_lengths(sections[index])
+            for key, index in header["codebooks"].items()
+        }
+        self.codes = {}
+
+    def lookup(self, predictor, channel_name):
+        key = f"{transform_name(predictor)}:{channel_name}"
+        if key not in self.code_lengths:
+            raise KeyError(f"No static codebook was trained for {key}")
+        if key not in self.codes:
+            self.codes[key] = canonical_codes(self.code_lengths[key])
+        return f"{self.set_id}/{key}", self.codes[key]
+
+    def load(self, codebook_id):
+        set_id, key = codebook_id.split("/", 1)
+        if set_id != self.set_id:
+            raise ValueError("The container was encoded with other static codebooks")
+        return self.code_lengths[key]
+
+
+def evaluate_static_codebooks(static_codebooks, image_paths, predictor=None):
+    # Compare the static codebooks with the per-image optimum, header included
+    for image_path in image_paths:
+        image = Image.open(image_path)
+        static_bits = optimal_bits = 0
+        for name, symbols in transformed_channels(image, predictor):
+            frequencies = count_frequencies(symbols)
+            _, codes = static_codebooks.lookup(predictor, name)
+            static_bits += encoded_bits(
+                frequencies, {symbol: length for symbol, (_, length) in codes.items()}
+            )
+            code_lengths = build_code_lengths(frequencies)
+            optimal_bits += encoded_bits(frequencies, code_lengths)
+            optimal_bits += len(pack_code_lengths(code_lengths)) * 8
+        total_pixels = image.size[0] * image.size[1]
+        print(
+            f"{image_path}: static {static_bits / total_pixels:.4f} bits/pixel, "
+            f"per-image optimum {optimal_bits / total_pixels:.4f} bits/pixel, "
+            f"efficiency {optimal_bits / static_bits:.4f}"
+        )
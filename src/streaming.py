@@ -0,0 +1,280 @@
+import mmap
+import os
+import struct
+import zlib
+import numpy as np
+from huffman import canonical_codes, iter_symbols
+from container import read_container
+from codec import (
+    CHANNEL_CODERS,
+    load_code_lengths,
+    decode_options,
+    predictor_choices,
+)
+from prediction import expand_choices, reconstruct_rows
+from utils import mode_bit_depth
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_TYPES = {"L": 0, "I;16": 0, "RGB": 2, "P": 3, "LA": 4, "RGBA": 6}
+# Compressed image data is written out in chunks of about this size
+PNG_CHUNK_SIZE = 1 << 16
+PAM_TUPLE_TYPES = {
+    "L": "GRAYSCALE",
+    "I;16": "GRAYSCALE",
+    "LA": "GRAYSCALE_ALPHA",
+    "RGB": "RGB",
+    "RGBA": "RGB_ALPHA",
+}
+
+
+def channel_strips(entry, sections, options, size, modulus, strip_height):
+    # Yields the channel strip_height rows at a time; huffman channels are
+    # decoded incrementally, other coders decode their values in one piece
+    height, width = size
+    if entry["coder"] == "huffman" and "streams" not in entry:
+        codes = canonical_codes(load_code_lengths(entry, sections, options))
+        strips = (
+            np.array(chunk, dtype=np.int64).reshape(-1, width)
+            for chunk in iter_symbols(
+                sections[entry["data"]],
+                entry["nbits"],
+                codes,
+                entry["count"],
+                strip_height * width,
+            )
+        )
+    else:
+        _, decode = CHANNEL_CODERS[entry["coder"]]
+        values = decode(entry, sections, dict(options, width=width))
+        values = values.reshape(height, width)
+        strips = (
+            values[top : top + strip_height] for top in range(0, height, strip_height)
+        )
+
+    if "predictor" not in entry:
+        yield from strips
+        return
+    tile_size = entry["predictor"]["tile_size"]
+    choices = predictor_choices(entry, sections, height)
+    max_error = entry["predictor"].get("max_error", 0)
+    above = None
+    top = 0
+    for residuals in strips:
+        choice_map = expand_choices(choices, residuals.shape, tile_size, top)
+        pixels = reconstruct_rows(residuals, choice_map, above, modulus, max_error)
+        above = pixels[-1]
+        top += len(pixels)
+        yield pixels
+
+
+def decode_strips(header, sections, strip_height=256, options=None):
+    # Yields (rows, width, channels) arrays from the top of the image down;
+    # only one strip of every channel is held at a time
+    if header.get("kind") == "sequence":
+        raise ValueError("Sequence containers are decoded with decode_sequence")
+    if header.get("kind") == "batch":
+        raise ValueError("Batch containers are decoded with decode_batch")
+    if "pyramid" in header:
+        raise ValueError("Containers with resolution levels cannot be streamed")
+    width, height = header["size"]
+    modulus = 1 << mode_bit_depth(header["mode"])
+    channels = [
+        (
+            None
+            if "same_as" in entry
+            else channel_strips(
+                entry, sections, options, (height, width), modulus, strip_height
+            )
+        )
+        for entry in header["channels"]
+    ]
+    for _ in range(0, height, strip_height):
+        planes = []
+        for entry, strips in zip(header["channels"], channels):
+            if strips is None:
+                planes.append(planes[entry["same_as"]])
+            else:
+                planes.append(next(strips))
+        yield np.stack(planes, axis=-1)
+
+
+def png_chunk(kind, data):
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def palette_alpha(header, sections):
+    # Alpha of every palette entry, from an RGBA palette or the transparency
+    palette = np.frombuffer(sections[header["palette"]], np.uint8)
+    if header["palette_mode"] == "RGBA":
+        return palette.reshape(-1, 4)[:, 3].tobytes()
+    transparency = header.get("transparency")
+    if isinstance(transparency, list):
+        return bytes(transparency)
+    if transparency is not None:
+        return bytes([255] * transparency + [0])
+    return None
+
+
+class PngWriter:
+    # Rows are filtered with the PNG "up" filter and compressed as they
+    # arrive, so only the previous row is kept between strips
+    def __init__(self, path, header, sections):
+        self.file = open(path, "wb")
+        width, height = header["size"]
+        mode = header["mode"]
+        self.dtype = ">u2" if mode_bit_depth(mode) > 8 else "u1"
+        self.file.write(PNG_SIGNATURE)
+        self.file.write(
+            png_chunk(
+                b"IHDR",
+                struct.pack(
+                    ">IIBBBBB",
+                    width,
+                    height,
+                    16 if self.dtype == ">u2" else 8,
+                    PNG_COLOR_TYPES[mode],
+                    0,
+                    0,
+                    0,
+                ),
+            )
+        )
+        if mode == "P":
+            palette = np.frombuffer(sections[header["palette"]], np.uint8)
+            channels = len(header["palette_mode"])
+            rgb = palette.reshape(-1, channels)[:, :3]
+            self.file.write(png_chunk(b"PLTE", rgb.tobytes()))
+            alpha = palette_alpha(header, sections)
+            if alpha is not None:
+                self.file.write(png_chunk(b"tRNS", alpha))
+        self.compressor = zlib.compressobj()
+        self.pending = b""
+        self.previous = None
+
+    def write(self, strip):
+        rows = strip.astype(self.dtype).reshape(len(strip), -1).view(np.uint8)
+        if self.previous is None:
+            self.previous = np.zeros(rows.shape[1], dtype=np.uint8)
+        above = np.vstack([self.previous, rows[:-1]])
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[:, 1:] = rows - above
+        self.previous = rows[-1].copy()
+        self.pending += self.compressor.compress(filtered.tobytes())
+        self.flush(PNG_CHUNK_SIZE)
+
+    def flush(self, minimum):
+        if len(self.pending) >= minimum:
+            self.file.write(png_chunk(b"IDAT", self.pending))
+            self.pending = b""
+
+    def close(self):
+        self.pending += self.compressor.flush()
+        self.flush(1)
+        self.file.write(png_chunk(b"IEND", b""))
+        self.file.close()
+
+
+class PnmWriter:
+    # Binary PGM/PPM, or PAM for images with alpha; palette images are
+    # written as the colours of their palette, with their transparency as alpha
+    def __init__(self, path, header, sections):
+        width, height = header["size"]
+        mode = header["mode"]
+        self.palette = None
+        if mode == "P":
+            mode = header["palette_mode"]
+            palette = np.frombuffer(sections[header["palette"]], np.uint8)
+            self.palette = palette.reshape(-1, len(mode))
+            alpha = palette_alpha(header, sections)
+            if alpha is not None and "A" not in mode:
+                alphas = np.full(len(self.palette), 255, dtype=np.uint8)
+                alpha = np.frombuffer(alpha, np.uint8)[: len(alphas)]
+                alphas[: len(alpha)] = alpha
+                self.palette = np.column_stack([self.palette, alphas])
+                mode += "A"
+        if "A" in mode and not path.lower().endswith(".pam"):
+            raise ValueError(f"{mode} images keep their alpha only in .pam files")
+        self.dtype = ">u2" if mode_bit_depth(mode) > 8 else "u1"
+        maxval = 65535 if self.dtype == ">u2" else 255
+        if path.lower().endswith(".pam"):
+            depth = 1 if mode == "I;16" else len(mode)
+            head = (
+                f"P7\nWIDTH {width}\nHEIGHT {height}\nDEPTH {depth}\n"
+                f"MAXVAL {maxval}\nTUPLTYPE {PAM_TUPLE_TYPES[mode]}\nENDHDR\n"
+            )
+        else:
+            magic = "P6" if mode == "RGB" else "P5"
+            head = f"{magic}\n{width} {height}\n{maxval}\n"
+        self.file = open(path, "wb")
+        self.file.write(head.encode("ascii"))
+
+    def write(self, strip):
+        if self.palette is not None:
+            strip = self.palette[strip[..., 0]]
+        self.file.write(strip.astype(self.dtype).tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+class ArrayWriter:
+    # A memory-mapped .npy file; pages are flushed by the OS as strips land
+    def __init__(self, path, header, sections):
+        width, height = header["size"]
+        dtype = np.uint16 if mode_bit_depth(header["mode"]) > 8 else np.uint8
+        self.array = np.lib.format.open_memmap(
+            path, mode="w+", dtype=dtype, shape=(height, width, len(header["channels"]))
+        )
+        self.top = 0
+
+    def write(self, strip):
+        self.array[self.top : self.top + len(strip)] = strip
+        self.top += len(strip)
+
+    def close(self):
+        self.array.flush()
+        del self.array
+
+
+WRITERS = {
+    ".png": PngWriter,
+    ".pgm": PnmWriter,
+    ".ppm": PnmWriter,
+    ".pnm": PnmWriter,
+    ".pam": PnmWriter,
+    ".npy": ArrayWriter,
+}
+
+
+def stream_container(
+    data, output, strip_height=256, codebook_store=None, static_codebooks=None
+):
+    header, sections = read_container(data)
+    extension = os.path.splitext(output)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Cannot stream to {extension or 'a file without extension'}")
+    options = decode_options(header, codebook_store, static_codebooks, None)
+    writer = WRITERS[extension](output, header, sections)
+    try:
+        for strip in decode_strips(header, sections, strip_height, options):
+            writer.write(strip)
+    finally:
+        writer.close()
+
+
+def decode_to_file(
+    path, output, strip_height=256, codebook_store=None, static_codebooks=None
+):
+    # The container is memory-mapped and the image written strip by strip, so
+    # neither has to fit in memory; the mapping closes with its last view
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    stream_container(
+        memoryview(mapped), output, strip_height, codebook_store, static_codebooks
+    )
@@ -0,0 +1,137 @@
+import numpy as np
+from huffman import (
+    build_code_lengths,
+    canonical_codes,
+    encode_symbols,
+    decode_symbols,
+)
+
+# Tile histograms are counted densely while that takes at most this many
+# counters per pixel
+DENSE_HISTOGRAM_RATIO = 4
+# Tile choices are stored in one byte
+MAX_TILE_CODEBOOKS = 256
+
+
+def check_tile_options(tile_size, codebooks):
+    if tile_size < 1:
+        raise ValueError("The codebook tile size must be at least 1")
+    if not 1 <= codebooks <= MAX_TILE_CODEBOOKS:
+        raise ValueError(
+            f"Tile choices are stored in one byte, so 1-{MAX_TILE_CODEBOOKS} codebooks"
+        )
+
+
+def tile_map(shape, tile_size):
+    height, width = shape
+    tiles_x = -(-width // tile_size)
+    rows = np.arange(height) // tile_size
+    columns = np.arange(width) // tile_size
+    return rows[:, None] * tiles_x + columns[None, :]
+
+
+def tile_histograms(values, tiles):
+    # Sparse histograms: one (tile, symbol, count) entry per symbol a tile
+    # uses, with symbols numbered among the values the channel uses, so a
+    # 16-bit channel never costs tiles x 65536 counts
+    values = values.ravel()
+    present = np.bincount(values) > 0
+    used = np.flatnonzero(present)
+    combined = tiles.ravel() * used.size + (np.cumsum(present) - 1)[values]
+    dense_size = (int(tiles.max()) + 1) * used.size
+    if dense_size <= DENSE_HISTOGRAM_RATIO * values.size:
+        counts = np.bincount(combined, minlength=dense_size)
+        pairs = np.flatnonzero(counts)
+        counts = counts[pairs]
+    else:
+        pairs, counts = np.unique(combined, return_counts=True)
+    return used, (pairs // used.size, pairs % used.size, counts)
+
+
+def cluster_histogram(histogram, tiles, size):
+    pair_tiles, pair_symbols, counts = histogram
+    selected = np.zeros(int(pair_tiles.max()) + 1, dtype=bool)
+    selected[tiles] = True
+    members = selected[pair_tiles]
+    return np.bincount(pair_symbols[members], counts[members], minlength=size)
+
+
+def lengths_matrix(histogram, members, size):
+    # Every codebook covers all symbols of the channel, so any tile may switch
+    # to any codebook during clustering
+    matrix = np.zeros((len(members), size), dtype=np.int64)
+    for cluster, tiles in enumerate(members):
+        counts = cluster_histogram(histogram, tiles, size).astype(np.int64) + 1
+        code_lengths = build_code_lengths(dict(enumerate(counts.tolist())))
+        matrix[cluster, list(code_lengths)] = list(code_lengths.values())
+    return matrix
+
+
+def cluster_tiles(histogram, tile_count, size, codebooks, iterations=8):
+    pair_tiles, pair_symbols, counts = histogram
+    # Start from tiles ranked by entropy, so flat and busy tiles begin apart
+    totals = np.bincount(pair_tiles, counts, minlength=tile_count)
+    probabilities = counts / totals[pair_tiles]
+    entropies = np.bincount(
+        pair_tiles, -probabilities * np.log2(probabilities), minlength=tile_count
+    )
+    ranks = np.empty(tile_count, dtype=np.int64)
+    ranks[np.argsort(entropies, kind="stable")] = np.arange(tile_count)
+    assignment = ranks * codebooks // tile_count
+
+    for _ in range(iterations):
+        members = [np.flatnonzero(assignment == k) for k in np.unique(assignment)]
+        # Estimated bits of every tile under every codebook, from the symbols
+        # each tile uses
+        matrix = lengths_matrix(histogram, members, size)
+        costs = np.column_stack(
+            [
+                np.bincount(pair_tiles, counts * lengths[pair_symbols], tile_count)
+                for lengths in matrix
+            ]
+        )
+        # Renumber so codebooks left without tiles disappear
+        new_assignment = np.unique(np.argmin(costs, axis=1), return_inverse=True)[1]
+        if np.array_equal(new_assignment, assignment):
+            break
+        assignment = new_assignment
+    return assignment
+
+
+def encode_tiles(values, tile_size, codebooks):
+    check_tile_options(tile_size, codebooks)
+    values = np.asarray(values, dtype=np.int64)
+    tiles = tile_map(values.shape, tile_size)
+    used, histogram = tile_histograms(values, tiles)
+    tile_count = int(tiles.max()) + 1
+    assignment = cluster_tiles(histogram, tile_count, used.size, codebooks)
+
+    # Pixels are coded codebook by codebook, so each stream decodes with a
+    # single table
+    pixel_clusters = assignment[tiles].ravel()
+    code_lengths, payloads, nbits = [], [], []
+    for cluster in range(int(assignment.max()) + 1):
+        symbols = values.ravel()[pixel_clusters == cluster]
+        counts = cluster_histogram(
+            histogram, np.flatnonzero(assignment == cluster), used.size
+        ).astype(np.int64)
+        present = np.nonzero(counts)[0]
+        lengths = build_code_lengths(
+            dict(zip(used[present].tolist(), counts[present].tolist()))
+        )
+        payload, bits = encode_symbols(symbols, canonical_codes(lengths))
+        code_lengths.append(lengths)
+        payloads.append(payload)
+        nbits.append(bits)
+    return assignment.astype(np.uint8), code_lengths, payloads, nbits
+
+
+def decode_tiles(choices, code_lengths, payloads, nbits, shape, tile_size):
+    pixel_clusters = choices.astype(np.int64)[tile_map(shape, tile_size)].ravel()
+    values = np.empty(pixel_clusters.size, dtype=np.int64)
+    for cluster, lengths in enumerate(code_lengths):
+        mask = pixel_clusters == cluster
+        values[mask] = decode_symbols(
+            payloads[cluster], nbits[cluster], canonical_codes(lengths), int(mask.sum())
+        )
+    return values
@@ -1,13 +1,42 @@
-from PIL import Image
+# Pillow and NumPy are imported inside the functions that use them, so this
+# module loads without them; huffman.py and the codec still need NumPy
+
+# Modes the codec stores without converting them first
+NATIVE_MODES = ("L", "LA", "RGB", "RGBA", "P", "I;16")
+
+
+def native_image(image):
+    if image.mode in NATIVE_MODES:
+        return image
+    if image.mode == "1":
+        return image.convert("L")
+    if image.mode in ("I", "I;16L", "I;16B", "I;16N"):
+        import numpy as np
+        from PIL import Image
+
+        pixels = np.asarray(image)
+        if pixels.min() < 0 or pixels.max() >= 1 << 16:
+            raise ValueError("Only 16-bit integer images are supported")
+        return Image.fromarray(pixels.astype(np.uint16))
+    if "A" in image.getbands() or "transparency" in image.info:
+        return image.convert("RGBA")
+    return image.convert("RGB")
+
+
+def mode_bit_depth(mode):
+    return 16 if mode.startswith("I;16") else 8
 
 
 def split_image_channels(image):
-    r, g, b = image.split()
-    return r, g, b
+    return image.split()
+
 
+def merge_image_channels(*channels, mode="RGB"):
+    from PIL import Image
 
-def merge_image_channels(r, g, b):
-    return Image.merge("RGB", (r, g, b))
+    if len(channels) == 1:
+        return channels[0]
+    return Image.merge(mode, channels)
 
 
 def save_image(image, path):
@@ -1,4 +1,3 @@
-import graphviz
 import os
 
 
@@ -28,6 +27,9 @@ def print_huffman_tree_graphviz(node, total_pixels, code_map=None):
         if parent:
             graph.edge(str(id(parent)), str(id(node)), label=edge_label)
 
+    # graphviz is only needed to draw trees, so it is imported on first use
+    import graphviz
+
     graph = graphviz.Digraph(format="png")
     add_nodes_edges(node, graph)
     return graph
@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+
+# The modules live flat in src/ and import each other by name
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+IMAGES = os.path.join(os.path.dirname(SRC), "ImágenesPrueba")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-slow", action="store_true", help="Also run the full-size image checks"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: full-size checks on the large images")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="needs --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from PIL import Image
+from batch import encode_batch, decode_batch, decode_batch_image
+from codec import decode_image
+
+
+def random_images(mode, sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    channels = len(mode)
+    images = []
+    for width, height in sizes:
+        # Few distinct values, so some lanes have a single symbol
+        pixels = rng.integers(0, rng.integers(1, 257), (height, width, channels))
+        pixels = pixels.astype(np.uint8)
+        images.append(
+            Image.fromarray(pixels[..., 0] if channels == 1 else pixels, mode)
+        )
+    return images
+
+
+@pytest.mark.parametrize("mode", ["L", "LA", "RGB", "RGBA"])
+def test_batch_round_trip(mode):
+    images = random_images(mode, [(1, 1), (17, 1), (1, 9), (32, 32), (5, 7)] * 3)
+    data = encode_batch(images)
+    decoded = decode_batch(data)
+    assert len(decoded) == len(images)
+    for image, restored in zip(images, decoded):
+        assert restored.mode == mode
+        assert restored.size == image.size
+        assert restored.tobytes() == image.tobytes()
+    for index in (0, 1, 2, len(images) - 1):
+        assert decode_batch_image(data, index).tobytes() == images[index].tobytes()
+
+
+def test_stacked_round_trip():
+    rng = np.random.default_rng(1)
+    stacked = rng.integers(0, 256, (20, 8, 12, 3), dtype=np.uint8)
+    decoded = decode_batch(encode_batch(stacked))
+    assert np.array_equal(np.stack([np.asarray(image) for image in decoded]), stacked)
+
+
+def test_palette_images_are_expanded():
+    image = random_images("RGB", [(9, 4)])[0].convert("P")
+    (restored,) = decode_batch(encode_batch([image]))
+    assert restored.tobytes() == image.convert("RGB").tobytes()
+
+
+@pytest.mark.parametrize(
+    "images",
+    [
+        [Image.new("L", (4, 4), 3), Image.new("RGB", (4, 4), (255, 0, 0))],
+        [Image.new("RGB", (4, 4)), Image.new("RGBA", (4, 4))],
+    ],
+    ids=["L+RGB", "RGB+RGBA"],
+)
+def test_mixed_modes_are_rejected(images):
+    with pytest.raises(ValueError, match="same mode"):
+        encode_batch(images)
+
+
+def test_16_bit_images_are_rejected():
+    image = Image.fromarray(np.full((4, 4), 1000, dtype=np.uint16))
+    with pytest.raises(ValueError, match="8-bit"):
+        encode_batch([image, image])
+    with pytest.raises(ValueError, match="8-bit"):
+        encode_batch([Image.new("RGB", (4, 4)), image])
+
+
+def test_single_image_decoders_reject_batches():
+    data = encode_batch(random_images("L", [(4, 4)]))
+    with pytest.raises(ValueError, match="decode_batch"):
+        decode_image(data)
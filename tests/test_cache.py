@@ -0,0 +1,26 @@
+import numpy as np
+from PIL import Image
+from cache import ResultCache
+from codec import encode_image
+
+
+def test_distinct_16_bit_images_get_distinct_keys(tmp_path):
+    # Both images convert to the same all-white RGB image
+    first = Image.fromarray(np.full((8, 8), 1000, dtype=np.uint16))
+    second = Image.fromarray(np.full((8, 8), 2000, dtype=np.uint16))
+    assert first.convert("RGB").tobytes() == second.convert("RGB").tobytes()
+    assert encode_image(first) != encode_image(second)
+
+    cache = ResultCache(str(tmp_path))
+    assert cache.key(first, pipeline="main") != cache.key(second, pipeline="main")
+
+
+def test_palette_images_with_the_same_indices_get_distinct_keys(tmp_path):
+    indices = np.zeros((4, 4), dtype=np.uint8)
+    first = Image.fromarray(indices, "P")
+    first.putpalette([255, 0, 0] * 256)
+    second = Image.fromarray(indices, "P")
+    second.putpalette([0, 0, 255] * 256)
+
+    cache = ResultCache(str(tmp_path))
+    assert cache.key(first) != cache.key(second)
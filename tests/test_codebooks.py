@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codebooks import CodebookStore
+from codec import encode_image, decode_image, release_codebooks
+from container import read_container
+
+
+def test_referenced_codebooks_survive_eviction(tmp_path):
+    store = CodebookStore(str(tmp_path))
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 64, (64, 64), dtype=np.uint8))
+    encode_image(image, codebook_store=store)
+    # The second encoding reuses the codebook stored by the first
+    data = encode_image(image, codebook_store=store)
+    header, _ = read_container(data)
+    assert "codebook_id" in header["channels"][0]
+
+    # A store that never reuses fills the directory with new codebooks
+    flooding = CodebookStore(str(tmp_path), max_loss=float("-inf"))
+    for seed in range(store.max_codebooks + 10):
+        rng = np.random.default_rng(seed + 1)
+        high = int(rng.integers(2, 256))
+        noise = rng.integers(0, high, (32, 32), dtype=np.uint8)
+        encode_image(Image.fromarray(noise), codebook_store=flooding)
+    assert flooding.built > store.max_codebooks
+    assert len(flooding.entries()) <= store.max_codebooks + 1
+
+    decoded = decode_image(data, codebook_store=CodebookStore(str(tmp_path)))
+    assert np.array_equal(np.asarray(decoded), np.asarray(image))
+
+
+def distinct_images(count):
+    for seed in range(count):
+        rng = np.random.default_rng(seed + 100)
+        high = int(rng.integers(2, 256))
+        yield Image.fromarray(rng.integers(0, high, (32, 32), dtype=np.uint8))
+
+
+def test_store_stays_bounded(tmp_path):
+    store = CodebookStore(str(tmp_path), max_codebooks=4, max_pinned=3)
+    containers = []
+    for image in distinct_images(12):
+        for _ in range(2):
+            containers.append(encode_image(image, codebook_store=store))
+        assert len(store.pinned()) <= store.max_pinned
+        assert len(store.entries()) <= store.max_codebooks + store.max_pinned
+    # Once the pinned limit is reached, images embed their own codebooks
+    headers = [read_container(data)[0] for data in containers]
+    referenced = {h["channels"][0].get("codebook_id") for h in headers}
+    assert len(referenced - {None}) == store.max_pinned
+    assert None in referenced
+    for data, image in zip(containers[1::2], distinct_images(12)):
+        decoded = decode_image(data, codebook_store=store)
+        assert np.array_equal(np.asarray(decoded), np.asarray(image))
+
+    for data in containers:
+        release_codebooks(data, store)
+    assert not store.pinned()
+    assert len(store.entries()) <= store.max_codebooks
+
+
+def test_codebooks_stay_pinned_until_every_container_is_released(tmp_path):
+    store = CodebookStore(str(tmp_path), max_codebooks=1)
+    image = next(distinct_images(1))
+    encode_image(image, codebook_store=store)
+    # Unpinned codebooks are now evicted as soon as possible
+    store.max_codebooks = 0
+    first = encode_image(image, codebook_store=store)
+    second = encode_image(image, codebook_store=store)
+    assert store.reused == 2
+
+    release_codebooks(first, store)
+    decoded = decode_image(second, codebook_store=CodebookStore(str(tmp_path)))
+    assert np.array_equal(np.asarray(decoded), np.asarray(image))
+    release_codebooks(second, store)
+    assert not store.entries()
+    with pytest.raises(KeyError):
+        release_codebooks(second, store)
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from PIL import Image
+from cli import build_parser
+from codec import encode_image, decode_image
+
+
+@pytest.mark.parametrize("contexts", [1, 2, 8])
+@pytest.mark.parametrize("shape", [(40, 30), (1, 1), (1, 50), (40, 30, 3)])
+def test_context_round_trip(contexts, shape):
+    rng = np.random.default_rng(contexts)
+    pixels = rng.integers(0, 64, shape, dtype=np.uint8)
+    data = encode_image(Image.fromarray(pixels), mode="context", contexts=contexts)
+    assert np.array_equal(np.asarray(decode_image(data)), pixels)
+
+
+@pytest.mark.parametrize("contexts", [0, -1])
+def test_bad_context_counts_are_rejected(contexts):
+    with pytest.raises(ValueError, match="contexts"):
+        encode_image(Image.new("L", (8, 8)), mode="context", contexts=contexts)
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(
+            ["encode", "in.png", "out.huf", "--contexts", str(contexts)]
+        )
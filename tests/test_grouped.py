@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codec import encode_image, decode_image
+from extended import MAX_GROUP_SIZE
+
+
+@pytest.mark.parametrize("group_size", range(1, MAX_GROUP_SIZE + 1))
+def test_grouped_round_trip(group_size):
+    rng = np.random.default_rng(group_size)
+    pixels = np.full((64, 64), 7, dtype=np.uint8)
+    pixels[::3] = rng.integers(0, 256, (22, 64), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    data = encode_image(image, mode="grouped", group_size=group_size)
+    assert np.array_equal(np.asarray(decode_image(data)), pixels)
+
+
+@pytest.mark.parametrize("group_size", [0, MAX_GROUP_SIZE + 1, 9])
+def test_out_of_range_group_sizes_are_rejected(group_size):
+    image = Image.new("L", (64, 64), 7)
+    with pytest.raises(ValueError, match="group size"):
+        encode_image(image, mode="grouped", group_size=group_size)
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from huffman import histogram_arrays, parallel_histogram, count_frequencies
+
+
+@pytest.mark.parametrize(
+    "high, dtype", [(256, np.uint8), (256, np.int64), (1 << 24, np.int64)]
+)
+def test_parallel_histogram_matches_serial(high, dtype):
+    rng = np.random.default_rng(0)
+    symbols = rng.integers(0, high, 100_000).astype(dtype)
+    values, counts = parallel_histogram(symbols, 2, chunk_size=30_000)
+    expected_values, expected_counts = histogram_arrays(symbols)
+    assert np.array_equal(values, expected_values)
+    assert np.array_equal(counts, expected_counts)
+
+
+def test_workers_never_change_the_counts():
+    symbols = np.random.default_rng(1).integers(0, 256, 50_000)
+    assert count_frequencies(symbols, 4) == count_frequencies(symbols)
@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from PIL import Image
+from conftest import IMAGES, SRC
+import kernels
+from huffman import (
+    count_frequencies,
+    tuple_frequencies,
+    pack_tuples,
+    build_code_lengths,
+    canonical_codes,
+    build_huffman_tree,
+    build_codes,
+    encode_symbols,
+    decode_symbols,
+    iter_symbols,
+    huffman_decode,
+    tuple_huffman_decode,
+)
+
+# Without Numba the kernels run uncompiled, which is slow, so inputs are small
+SYMBOLS = 20000
+
+
+def channel():
+    image = Image.open(os.path.join(IMAGES, "11.jpg"))
+    values = np.asarray(image.getchannel(0), dtype=np.int64).ravel()
+    return values[values.size // 2 :][:SYMBOLS]
+
+
+def long_codes():
+    # Fibonacci-like counts give codes longer than the 16-bit decode table
+    counts = [1, 1]
+    while len(counts) < 24:
+        counts.append(counts[-1] + counts[-2])
+    return np.repeat(np.arange(len(counts)), counts)[:SYMBOLS]
+
+
+CASES = {
+    "channel": channel,
+    "long codes": long_codes,
+    "single symbol": lambda: np.full(1000, 42, dtype=np.int64),
+}
+
+
+def table_round_trip(symbols):
+    codes = canonical_codes(build_code_lengths(count_frequencies(symbols)))
+    payload, nbits = encode_symbols(symbols, codes)
+    decoded = np.asarray(decode_symbols(payload, nbits, codes, symbols.size))
+    chunks = [
+        np.asarray(chunk)
+        for chunk in iter_symbols(payload, nbits, codes, symbols.size, 777)
+    ]
+    return payload, nbits, decoded.tolist(), np.concatenate(chunks).tolist()
+
+
+def both_paths(monkeypatch, function, *args):
+    monkeypatch.setattr(kernels, "ENABLED", False)
+    python = function(*args)
+    # Without Numba the kernels are the same functions, run uncompiled
+    monkeypatch.setattr(kernels, "ENABLED", True)
+    return python, function(*args)
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_table_coder_matches_pure_python(monkeypatch, case):
+    symbols = CASES[case]()
+    python, jit = both_paths(monkeypatch, table_round_trip, symbols)
+    assert python == jit
+    assert python[2] == python[3] == symbols.tolist()
+
+
+def test_tree_walk_matches_pure_python(monkeypatch):
+    symbols = channel()
+    huffman_tree = build_huffman_tree(count_frequencies(symbols))
+    code_map = build_codes(huffman_tree, "", {})
+    bits = "".join(code_map[symbol] for symbol in symbols.tolist())
+    python, jit = both_paths(
+        monkeypatch, huffman_decode, bits, huffman_tree, (symbols.size, 1)
+    )
+    assert python.tobytes() == jit.tobytes() == symbols.astype(np.uint8).tobytes()
+
+
+def test_tuple_tree_walk_matches_pure_python(monkeypatch):
+    image = Image.open(os.path.join(IMAGES, "22.jpg"))
+    pixels = [tuple(p) for p in np.asarray(image).reshape(-1, 3).tolist()]
+    assert image.mode == "RGB"
+    huffman_tree = build_huffman_tree(tuple_frequencies(image))
+    code_map = build_codes(huffman_tree, "", {})
+    bits = "".join(code_map[pixel] for pixel in pixels)
+    python, jit = both_paths(
+        monkeypatch, tuple_huffman_decode, bits, huffman_tree, image.size
+    )
+    assert python == jit == pixels
+
+
+def test_environment_disables_the_kernels():
+    result = subprocess.run(
+        [sys.executable, "-c", "import kernels; print(kernels.ENABLED)"],
+        cwd=SRC,
+        env=dict(os.environ, HUFFMAN_JIT="0"),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codec import CHANNEL_CODERS, encode_image, decode_image
+from lz77 import lz77_encode, lz77_decode
+
+STREAMS = {
+    "empty": [],
+    "one": [5],
+    "two": [1, 2],
+    "run": [3] * 1000,
+    "overlap": [1, 2] * 300,
+    "random": np.random.default_rng(0).integers(0, 256, 2000).tolist(),
+    "long": (np.random.default_rng(1).integers(0, 4, 50).tolist() * 20),
+}
+
+
+@pytest.mark.parametrize("name", STREAMS)
+def test_lz77_round_trip(name):
+    symbols = np.array(STREAMS[name], dtype=np.int64)
+    tokens, literals, distance_codes, extras = lz77_encode(symbols, 64, 2)
+    decoded = lz77_decode(tokens, literals, distance_codes, extras, symbols.size)
+    assert np.array_equal(decoded, symbols)
+
+
+def test_empty_channel_round_trip():
+    encode, decode = CHANNEL_CODERS["lz77"]
+    sections = []
+    entry = encode(np.zeros(0, dtype=np.int64), sections, {})
+    assert decode(entry, sections, {}).size == 0
+
+
+@pytest.mark.parametrize(
+    "mode,shape,dtype",
+    [
+        ("L", (40, 30), np.uint8),
+        ("RGB", (40, 30, 3), np.uint8),
+        ("RGBA", (40, 30, 4), np.uint8),
+        ("I;16", (40, 30), np.uint16),
+        ("L", (1, 1), np.uint8),
+        ("RGB", (1, 50, 3), np.uint8),
+    ],
+)
+@pytest.mark.parametrize("predictor", [None, "auto"])
+def test_lz77_image_round_trip(mode, shape, dtype, predictor):
+    rng = np.random.default_rng(2)
+    # Repeated rows give the matcher something to find
+    pixels = rng.integers(0, 1000 if dtype == np.uint16 else 256, shape).astype(dtype)
+    pixels[shape[0] // 2 :] = pixels[: shape[0] - shape[0] // 2]
+    image = Image.fromarray(pixels)
+    assert image.mode == mode
+    decoded = decode_image(encode_image(image, predictor, mode="lz77"))
+    assert decoded.mode == mode
+    assert np.array_equal(np.asarray(decoded), pixels)
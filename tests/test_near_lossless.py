@@ -0,0 +1,39 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from conftest import IMAGES
+from codec import encode_image, decode_image
+from prediction import PREDICTORS
+
+MAX_ERRORS = [1, 2, 4]
+# Larger images take seconds per case, so they only run with --run-slow
+SLOW_PIXELS = 500_000
+
+
+def image_params():
+    params = []
+    for name in sorted(os.listdir(IMAGES)):
+        with Image.open(os.path.join(IMAGES, name)) as image:
+            slow = image.size[0] * image.size[1] > SLOW_PIXELS
+        params.append(pytest.param(name, marks=[pytest.mark.slow] if slow else []))
+    return params
+
+
+@pytest.mark.parametrize("predictor", ("auto",) + PREDICTORS)
+@pytest.mark.parametrize("max_error", MAX_ERRORS)
+@pytest.mark.parametrize("name", image_params())
+def test_error_bound(name, max_error, predictor):
+    image = Image.open(os.path.join(IMAGES, name))
+    original = np.asarray(image).astype(np.int64)
+    # Interleaved streams only make decoding faster; the bound is the same
+    data = encode_image(image, predictor=predictor, max_error=max_error, streams=64)
+    decoded = np.asarray(decode_image(data)).astype(np.int64)
+    assert decoded.shape == original.shape
+    assert np.abs(decoded - original).max() <= max_error
+
+
+def test_palette_images_are_rejected():
+    image = Image.new("P", (8, 8))
+    with pytest.raises(ValueError, match="Palette images cannot be coded"):
+        encode_image(image, max_error=1)
@@ -0,0 +1,30 @@
+import threading
+import pytest
+from output import OutputStage
+
+
+def test_queued_writes_finish_when_the_pipeline_fails(tmp_path):
+    release = threading.Event()
+    with pytest.raises(KeyError):
+        with OutputStage(max_workers=1) as output:
+            output.submit("blocker", release.wait)
+            for index in range(4):
+                output.write_text(str(tmp_path / f"{index}.txt"), str(index))
+            # The writes are still queued behind the blocker when the
+            # pipeline fails
+            threading.Timer(0.05, release.set).start()
+            raise KeyError("pipeline failed")
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        f"{index}.txt" for index in range(4)
+    ]
+    # The worker threads are gone
+    with pytest.raises(RuntimeError):
+        output.write_text(str(tmp_path / "late.txt"), "late")
+
+
+def test_failed_writes_are_reported(tmp_path):
+    with pytest.raises(RuntimeError, match="missing"):
+        with OutputStage() as output:
+            output.write_text(str(tmp_path / "missing" / "file.txt"), "text")
+            output.write_text(str(tmp_path / "file.txt"), "text")
+    assert (tmp_path / "file.txt").read_text() == "text"
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codec import encode_image, decode_image, available_level
+from pyramid import decompose
+
+rng = np.random.default_rng(0)
+IMAGES = {
+    "L": rng.integers(0, 256, (30, 21), dtype=np.uint8),
+    "RGB": rng.integers(0, 256, (30, 21, 3), dtype=np.uint8),
+    "RGBA": rng.integers(0, 256, (30, 21, 4), dtype=np.uint8),
+    "I;16": rng.integers(0, 1 << 16, (30, 21)).astype(np.uint16),
+    "1x1": np.full((1, 1), 7, dtype=np.uint8),
+    "row": rng.integers(0, 256, (1, 40, 3), dtype=np.uint8),
+}
+
+
+@pytest.mark.parametrize("name", IMAGES)
+@pytest.mark.parametrize("predictor", [None, "auto"])
+@pytest.mark.parametrize("levels", [1, 3])
+def test_pyramid_round_trip(name, predictor, levels):
+    pixels = IMAGES[name]
+    data = encode_image(Image.fromarray(pixels), predictor, levels=levels)
+    decoded = decode_image(data)
+    assert decoded.mode == Image.fromarray(pixels).mode
+    assert np.array_equal(np.asarray(decoded), pixels)
+
+
+@pytest.mark.parametrize("name", ["L", "I;16"])
+def test_levels_decode_to_the_approximations(name):
+    pixels = IMAGES[name]
+    data = encode_image(Image.fromarray(pixels), levels=3)
+    for level in range(4):
+        expected, _ = decompose(pixels, 3 - level)
+        assert np.array_equal(np.asarray(decode_image(data, level=level)), expected)
+
+
+def test_prefixes_decode_to_previews():
+    pixels = IMAGES["RGB"]
+    data = encode_image(Image.fromarray(pixels), "auto", levels=3)
+    previews = set()
+    # Shorter prefixes do not hold the whole header of this small image
+    for end in range(len(data) // 2, len(data) + 1, len(data) // 32):
+        level = available_level(data[:end])
+        preview = decode_image(data[:end], level=level)
+        assert preview.tobytes() == decode_image(data, level=level).tobytes()
+        previews.add(level)
+    assert len(previews) > 1
+    assert available_level(data) == 3
+
+
+def test_palette_images_are_rejected():
+    image = Image.fromarray(IMAGES["RGB"]).convert("P")
+    with pytest.raises(ValueError, match="Palette"):
+        encode_image(image, levels=2)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from PIL import Image
+from ans import scale_bits_for, normalize_frequencies
+from codec import encode_image, decode_image
+
+rng = np.random.default_rng(0)
+IMAGES = {
+    "L": rng.integers(0, 256, (30, 20), dtype=np.uint8),
+    "RGB": rng.integers(0, 256, (30, 20, 3), dtype=np.uint8),
+    "RGBA": rng.integers(0, 256, (30, 20, 4), dtype=np.uint8),
+    "I;16": rng.integers(0, 1 << 16, (30, 20)).astype(np.uint16),
+    "1x1": np.full((1, 1), 7, dtype=np.uint8),
+    "row": rng.integers(0, 256, (1, 40, 3), dtype=np.uint8),
+    "flat": np.full((9, 9), 5, dtype=np.uint8),
+    # Spans several lanes, with a skewed histogram
+    "large": np.minimum(rng.geometric(0.3, (200, 150)), 255).astype(np.uint8),
+}
+
+
+@pytest.mark.parametrize("name", IMAGES)
+@pytest.mark.parametrize("predictor", [None, "auto"])
+def test_rans_round_trip(name, predictor):
+    pixels = IMAGES[name]
+    decoded = decode_image(
+        encode_image(Image.fromarray(pixels), predictor, mode="rans")
+    )
+    assert np.array_equal(np.asarray(decoded), pixels)
+
+
+@pytest.mark.parametrize("alphabet_size", [1, 2, 600, 5000, 1 << 16])
+def test_normalized_frequencies_fill_the_scale(alphabet_size):
+    # Many equally rare symbols round up past the total
+    counts = np.random.default_rng(alphabet_size).integers(1, 3, alphabet_size)
+    scale_bits = scale_bits_for(alphabet_size)
+    normalized = normalize_frequencies(dict(enumerate(counts.tolist())), scale_bits)
+    values = np.array(list(normalized.values()))
+    assert values.sum() == 1 << scale_bits
+    assert values.min() >= 1
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from PIL import Image
+from sequence import encode_sequence, decode_sequence
+
+
+def frames(count=5):
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, (16, 16), dtype=np.uint8)
+    return [Image.fromarray(np.roll(base, shift, axis=1)) for shift in range(count)]
+
+
+@pytest.mark.parametrize("keyframe_interval", [1, 2, 30])
+def test_sequence_round_trip(keyframe_interval):
+    data = encode_sequence(frames(), keyframe_interval=keyframe_interval)
+    decoded = list(decode_sequence(data))
+    assert [frame.tobytes() for frame in decoded] == [
+        frame.tobytes() for frame in frames()
+    ]
+
+
+@pytest.mark.parametrize("keyframe_interval", [0, -3])
+def test_keyframe_interval_below_one_is_rejected(keyframe_interval):
+    with pytest.raises(ValueError, match="keyframe interval"):
+        encode_sequence(frames(), keyframe_interval=keyframe_interval)
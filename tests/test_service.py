@@ -0,0 +1,37 @@
+import asyncio
+import gc
+import io
+import numpy as np
+from PIL import Image
+from service import CodecService
+
+
+def test_dispatchers_survive_garbage_collection():
+    pixels = np.random.default_rng(0).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+
+    async def run():
+        service = CodecService(workers=1)
+        try:
+            await service.start()
+            gc.collect()
+            assert len(service.dispatchers) == 1
+            status, _, data = await service.respond(
+                "POST", "/encode", buffer.getvalue()
+            )
+            assert status == 200
+            status, _, png = await service.respond("POST", "/decode", data)
+            assert status == 200
+            assert np.array_equal(np.asarray(Image.open(io.BytesIO(png))), pixels)
+            tasks = list(service.dispatchers)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Done callbacks run on the next pass of the loop
+            await asyncio.sleep(0)
+            assert not service.dispatchers
+        finally:
+            service.pool.shutdown()
+
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+import subprocess
+import sys
+import pytest
+from conftest import SRC
+
+CORE_MODULES = ["huffman", "utils"]
+BUDGET_MS = 300
+RUNS = 5
+# Modules the codec core must never load at import time
+FORBIDDEN_MODULES = (
+    "PyQt5",
+    "tkinter",
+    "graphviz",
+    "matplotlib",
+    "concurrent",
+    "multiprocessing",
+)
+
+
+def import_times(module):
+    # -X importtime prints "self | cumulative | name" in microseconds for
+    # every module a fresh interpreter loads
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", CORE_MODULES)
+def test_import_time_budget(module):
+    runs = [import_times(module) for _ in range(RUNS)]
+    elapsed = sorted(times[module] for times in runs)[RUNS // 2] / 1000
+    assert elapsed <= BUDGET_MS, f"{module} takes {elapsed:.1f} ms to import"
+
+
+@pytest.mark.parametrize("module", CORE_MODULES)
+def test_no_heavy_modules_at_import(module):
+    loaded = [
+        name for name in import_times(module) if name.split(".")[0] in FORBIDDEN_MODULES
+    ]
+    assert not loaded, f"{module} loads {', '.join(sorted(loaded))}"
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codec import encode_image, decode_image
+from static_codebooks import (
+    StaticCodebooks,
+    train_static_codebooks,
+    save_static_codebooks,
+)
+
+
+@pytest.fixture(scope="module")
+def static_codebooks(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("static")
+    rng = np.random.default_rng(0)
+    corpus = directory / "corpus.png"
+    Image.fromarray(rng.integers(0, 256, (32, 32, 3), dtype=np.uint8)).save(corpus)
+    path = directory / "static.huc"
+    save_static_codebooks(train_static_codebooks([corpus], (None, "auto")), path)
+    return StaticCodebooks(path)
+
+
+@pytest.mark.parametrize("predictor", [None, "auto"])
+def test_rgb_round_trip(static_codebooks, predictor):
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 256, (17, 23, 3), dtype=np.uint8)
+    data = encode_image(
+        Image.fromarray(pixels), predictor, static_codebooks=static_codebooks
+    )
+    image = decode_image(data, static_codebooks=static_codebooks)
+    assert image.mode == "RGB"
+    assert np.array_equal(np.asarray(image), pixels)
+
+
+@pytest.mark.parametrize(
+    "image",
+    [
+        Image.new("L", (8, 8), 100),
+        Image.new("LA", (8, 8), (100, 20)),
+        Image.new("RGBA", (8, 8), (10, 20, 30, 40)),
+        Image.new("RGB", (8, 8)).convert("P"),
+        Image.fromarray(np.full((8, 8), 1000, dtype=np.uint16)),
+    ],
+    ids=["L", "LA", "RGBA", "P", "I;16"],
+)
+def test_other_modes_are_rejected(static_codebooks, image):
+    with pytest.raises(ValueError, match="8-bit RGB"):
+        encode_image(image, static_codebooks=static_codebooks)
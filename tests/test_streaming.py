@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codec import encode_image, decode_image
+from streaming import decode_to_file
+
+rng = np.random.default_rng(0)
+PIXELS = {
+    "L": rng.integers(0, 256, (30, 20), dtype=np.uint8),
+    "LA": rng.integers(0, 256, (30, 20, 2), dtype=np.uint8),
+    "RGB": rng.integers(0, 256, (30, 20, 3), dtype=np.uint8),
+    "RGBA": rng.integers(0, 256, (30, 20, 4), dtype=np.uint8),
+    "I;16": rng.integers(0, 1 << 16, (30, 20)).astype(np.uint16),
+    "1x1": np.full((1, 1, 3), 7, dtype=np.uint8),
+    "row": rng.integers(0, 256, (1, 40, 3), dtype=np.uint8),
+}
+
+
+def source_image(name):
+    if name == "P":
+        return Image.fromarray(PIXELS["RGB"]).quantize(16)
+    if name == "P+transparency":
+        image = Image.fromarray(PIXELS["RGB"]).quantize(16)
+        image.info["transparency"] = 3
+        return image
+    mode = "LA" if name == "LA" else None
+    return Image.fromarray(PIXELS[name], mode)
+
+
+def pnm_pixels(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(b"P7"):
+        end = data.index(b"ENDHDR\n") + len(b"ENDHDR\n")
+        fields = dict(
+            line.split(" ", 1) for line in data[3:end].decode().split("\n")[:-2]
+        )
+        maxval = int(fields["MAXVAL"])
+    else:
+        magic, size, maxval, _ = data.split(b"\n", 3)
+        end = len(magic) + len(size) + len(maxval) + 3
+        maxval = int(maxval)
+    return data[:2], np.frombuffer(data[end:], ">u2" if maxval > 255 else "u1")
+
+
+NAMES = list(PIXELS) + ["P", "P+transparency"]
+OPTIONS = {
+    "huffman": {},
+    "auto": {"predictor": "auto", "tile_size": 8},
+    "rle": {"mode": "rle", "predictor": "paeth"},
+    "streams": {"streams": 3},
+    "near-lossless": {"predictor": "auto", "max_error": 2},
+}
+
+
+@pytest.mark.parametrize("name", NAMES)
+@pytest.mark.parametrize("options", OPTIONS)
+@pytest.mark.parametrize("strip_height", [1, 7, 256])
+def test_streamed_png_and_npy_match_decode(tmp_path, name, options, strip_height):
+    image = source_image(name)
+    if options == "near-lossless" and image.mode == "P":
+        pytest.skip("palette images are not coded near-losslessly")
+    path = tmp_path / "image.huf"
+    path.write_bytes(encode_image(image, **OPTIONS[options]))
+    expected = decode_image(path.read_bytes())
+
+    decode_to_file(str(path), str(tmp_path / "out.png"), strip_height)
+    streamed = Image.open(tmp_path / "out.png")
+    streamed.load()
+    assert streamed.size == expected.size
+    assert np.array_equal(np.asarray(streamed), np.asarray(expected))
+    if expected.mode == "P":
+        assert streamed.getpalette() == expected.getpalette()
+        assert streamed.info.get("transparency") == expected.info.get("transparency")
+
+    decode_to_file(str(path), str(tmp_path / "out.npy"), strip_height)
+    array = np.load(tmp_path / "out.npy")
+    assert np.array_equal(array.reshape(np.asarray(expected).shape), expected)
+
+
+@pytest.mark.parametrize(
+    "name, extension, magic",
+    [
+        ("L", ".pgm", b"P5"),
+        ("I;16", ".pgm", b"P5"),
+        ("RGB", ".ppm", b"P6"),
+        ("1x1", ".ppm", b"P6"),
+        ("row", ".pnm", b"P6"),
+        ("P", ".ppm", b"P6"),
+        ("L", ".pam", b"P7"),
+        ("LA", ".pam", b"P7"),
+        ("RGBA", ".pam", b"P7"),
+        ("P+transparency", ".pam", b"P7"),
+    ],
+)
+def test_streamed_pnm_matches_decode(tmp_path, name, extension, magic):
+    image = source_image(name)
+    path = tmp_path / "image.huf"
+    path.write_bytes(encode_image(image, "auto"))
+    expected = decode_image(path.read_bytes())
+    if expected.mode == "P":
+        expected = expected.convert("RGBA" if "transparency" in image.info else "RGB")
+    output = str(tmp_path / ("out" + extension))
+    decode_to_file(str(path), output, 7)
+    streamed_magic, values = pnm_pixels(output)
+    assert streamed_magic == magic
+    assert np.array_equal(values, np.asarray(expected).ravel())
+
+
+@pytest.mark.parametrize("name", ["LA", "RGBA", "P+transparency"])
+@pytest.mark.parametrize("extension", [".ppm", ".pgm", ".pnm"])
+def test_alpha_needs_pam(tmp_path, name, extension):
+    path = tmp_path / "image.huf"
+    path.write_bytes(encode_image(source_image(name)))
+    output = tmp_path / ("out" + extension)
+    with pytest.raises(ValueError, match=".pam"):
+        decode_to_file(str(path), str(output))
+    assert not output.exists()
+
+
+def test_progressive_containers_are_not_streamed(tmp_path):
+    path = tmp_path / "image.huf"
+    path.write_bytes(encode_image(source_image("RGB"), levels=2))
+    with pytest.raises(ValueError, match="resolution levels"):
+        decode_to_file(str(path), str(tmp_path / "out.png"))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codec import encode_image, decode_image
+
+rng = np.random.default_rng(0)
+IMAGES = {
+    "L": rng.integers(0, 256, (30, 20), dtype=np.uint8),
+    "RGB": rng.integers(0, 256, (30, 20, 3), dtype=np.uint8),
+    "RGBA": rng.integers(0, 256, (30, 20, 4), dtype=np.uint8),
+    "I;16": rng.integers(0, 1 << 16, (30, 20)).astype(np.uint16),
+    "1x1": np.full((1, 1), 7, dtype=np.uint8),
+    "row": rng.integers(0, 256, (1, 40, 3), dtype=np.uint8),
+}
+
+
+# 64 and more substreams decode in lockstep, fewer one after the other
+@pytest.mark.parametrize("streams", [2, 7, 64, 256])
+@pytest.mark.parametrize("name", IMAGES)
+def test_interleaved_round_trip(name, streams):
+    pixels = IMAGES[name]
+    data = encode_image(Image.fromarray(pixels), "auto", streams=streams)
+    assert np.array_equal(np.asarray(decode_image(data)), pixels)
+
+
+@pytest.mark.parametrize("streams", [3, 64])
+def test_grouped_interleaved_round_trip(streams):
+    pixels = IMAGES["RGB"]
+    data = encode_image(Image.fromarray(pixels), mode="grouped", streams=streams)
+    assert np.array_equal(np.asarray(decode_image(data)), pixels)
+
+
+def test_substreams_decode_in_workers():
+    pixels = IMAGES["RGBA"]
+    data = encode_image(Image.fromarray(pixels), streams=4)
+    decoded = decode_image(data, workers=2)
+    assert np.array_equal(np.asarray(decoded), pixels)
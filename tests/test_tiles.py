@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from PIL import Image
+from cli import build_parser
+from codec import encode_image, decode_image
+
+
+@pytest.mark.parametrize("dtype, high", [(np.uint8, 256), (np.uint16, 1 << 16)])
+def test_tiled_round_trip(dtype, high):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, high, (200, 150)).astype(dtype)
+    # A flat band gives the clustering tiles with very different histograms
+    pixels[:64] = high // 3
+    data = encode_image(Image.fromarray(pixels), mode="tiled", codebook_tile_size=32)
+    assert np.array_equal(np.asarray(decode_image(data)), pixels)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"codebook_tile_size": 0},
+        {"codebook_tile_size": -8},
+        {"tile_codebooks": 0},
+        {"tile_codebooks": 257},
+    ],
+)
+def test_bad_tile_options_are_rejected(options):
+    with pytest.raises(ValueError, match="tile size|codebooks"):
+        encode_image(Image.new("L", (16, 16)), mode="tiled", **options)
+
+
+@pytest.mark.parametrize(
+    "option, value",
+    [
+        ("--codebook-tile-size", "0"),
+        ("--tile-codebooks", "0"),
+        ("--tile-codebooks", "257"),
+    ],
+)
+def test_cli_rejects_bad_tile_options(option, value):
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(["encode", "in.png", "out.huf", option, value])
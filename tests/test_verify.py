@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from PIL import Image
+from codec import encode_image, verify_image
+from container import read_container, write_container
+
+rng = np.random.default_rng(0)
+IMAGES = {
+    "L": rng.integers(0, 256, (30, 20), dtype=np.uint8),
+    "RGB": rng.integers(0, 256, (30, 20, 3), dtype=np.uint8),
+    "RGBA": rng.integers(0, 256, (30, 20, 4), dtype=np.uint8),
+    "I;16": rng.integers(0, 1 << 16, (30, 20)).astype(np.uint16),
+    "1x1": np.full((1, 1), 7, dtype=np.uint8),
+    "row": rng.integers(0, 256, (1, 40, 3), dtype=np.uint8),
+}
+
+
+def rewritten(data, change):
+    # Changes the header or sections and writes fresh section checksums, so
+    # only the deep check can notice
+    header, sections = read_container(data)
+    sections = [bytes(section) for section in sections]
+    change(header, sections)
+    return write_container(header, sections)
+
+
+@pytest.mark.parametrize("name", IMAGES)
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"predictor": "auto", "mode": "rle"}, {"levels": 2}, {"max_error": 2}],
+    ids=["huffman", "rle", "levels", "near-lossless"],
+)
+def test_fresh_containers_verify(name, options):
+    data = encode_image(Image.fromarray(IMAGES[name]), **options)
+    assert verify_image(data) == []
+    assert verify_image(data, deep=True, workers=1) == []
+
+
+@pytest.mark.parametrize("workers", [1, None])
+def test_corrupt_pixel_checksums_are_rejected(workers):
+    data = encode_image(Image.fromarray(IMAGES["RGB"]))
+
+    def corrupt(header, sections):
+        header["pixel_checksums"][1] ^= 1
+
+    data = rewritten(data, corrupt)
+    assert verify_image(data) == []
+    assert verify_image(data, deep=True, workers=workers) == [
+        "channel 1 pixels do not match their checksum"
+    ]
+
+
+def test_corrupt_pixels_are_rejected():
+    data = encode_image(Image.fromarray(IMAGES["L"]))
+
+    def corrupt(header, sections):
+        index = header["channels"][0]["data"]
+        sections[index] = bytes([sections[index][0] ^ 0xFF]) + sections[index][1:]
+
+    problems = verify_image(rewritten(data, corrupt), deep=True, workers=1)
+    assert len(problems) == 1
+    assert problems[0].startswith("channel 0")
+
+
+def test_corrupt_sections_are_found_without_decoding():
+    data = bytearray(encode_image(Image.fromarray(IMAGES["L"])))
+    data[-1] ^= 0xFF
+    problems = verify_image(bytes(data))
+    assert len(problems) == 1
+    assert problems[0].endswith("is corrupt")